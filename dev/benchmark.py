@@ -0,0 +1,178 @@
+"""Offline benchmarks for Chester's library and audio hot paths
+
+Builds synthetic libraries of metadata/audio stubs in a temporary directory and times
+the cog against mocked discord contexts, so no Discord connection, network or ffmpeg
+is needed. Results are written as JSON so they can be compared across commits:
+
+    python dev/benchmark.py --save dev/baselines/local.json
+    python dev/benchmark.py --compare dev/baselines/local.json
+"""
+
+# first-party imports
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable
+from unittest.mock import MagicMock
+
+# local imports; fakes puts src/ on the path
+from fakes import OPUS_PACKET, REPO_ROOT, make_library, mock_context
+import musiccog # pylint: disable=wrong-import-position
+from audio import AudioSourceTracked, PacketSource # pylint: disable=wrong-import-position
+
+DEFAULT_SIZES = [100, 1000, 10000, 50000]
+# allowed slowdown before a result counts as a regression (0.25 = 25% slower)
+DEFAULT_TOLERANCE = 0.25
+# differences smaller than this many seconds are treated as timer noise
+NOISE_FLOOR = 1e-6
+
+
+def time_call(func: Callable[[], Any], repeat: int = 7, number: int = 1) -> float:
+    """Returns the fastest seconds per call of func over `repeat` batches of `number` calls
+
+    The minimum is the least noisy estimate on a shared machine; anything slower than it
+    is interference, not the code being measured."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return min(samples)
+
+
+def bench_size(size: int, results: dict[str, float]) -> None:
+    """Runs every library-dependent benchmark against a synthetic library of `size` tracks"""
+    with tempfile.TemporaryDirectory(prefix="chester-bench-") as root:
+        track_ids = make_library(root, size)
+        previous_cwd = os.getcwd()
+        os.chdir(root)
+        loop = asyncio.new_event_loop()
+        try:
+            start = time.perf_counter()
+            cog = musiccog.MusicCog(MagicMock())
+            cog.load_library()
+            results[f"load_library_cold[{size}]"] = time.perf_counter() - start
+            results[f"load_library_warm[{size}]"] = time_call(cog.load_library, repeat=3)
+
+            rng = random.Random(1)
+            lookups = [rng.choice(track_ids) for _ in range(1000)]
+            results[f"get_title_from_id[{size}]"] = time_call(
+                lambda: [cog.get_title_from_id(i) for i in lookups], number=1) / len(lookups)
+
+            ctx = mock_context()
+            library = cog.cmd_library.callback
+            results[f"cmd_library_first_page[{size}]"] = time_call(
+                lambda: loop.run_until_complete(library(cog, ctx)), number=20)
+            results[f"cmd_library_last_page[{size}]"] = time_call(
+                lambda: loop.run_until_complete(library(cog, ctx, str(size))), number=20)
+            results[f"cmd_library_filtered[{size}]"] = time_call(
+                lambda: loop.run_until_complete(library(cog, ctx, "min=3:00", "max=5:00")),
+                number=20)
+
+            def _render_uncached():
+                cog.library_pages = musiccog.LibraryPages(cog.truncate)
+                loop.run_until_complete(library(cog, ctx, "channel=Channel 0"))
+            results[f"cmd_library_uncached[{size}]"] = time_call(_render_uncached, number=5)
+
+            results[f"search[{size}]"] = time_call(
+                lambda: cog.library.search("synthetic lofi remix"), number=10)
+            cog.index.close()
+        finally:
+            loop.close()
+            os.chdir(previous_cwd)
+
+
+def bench_independent(results: dict[str, float]) -> None:
+    """Runs the benchmarks that don't depend on library size"""
+    cog = MagicMock()
+    cog.max_column_width = 30
+    strings = [f"A title of some length number {i}" * (i % 3 + 1) for i in range(1000)]
+    truncate = musiccog.MusicCog.truncate
+    results["truncate"] = time_call(
+        lambda: [truncate(cog, s) for s in strings]) / len(strings)
+
+    frames = 50 * 60 * 5 # five minutes of audio
+    packets = [OPUS_PACKET] * frames
+
+    def _drain(source):
+        while source.read():
+            pass
+    raw = time_call(lambda: _drain(PacketSource(packets))) / frames
+    tracked = time_call(lambda: _drain(AudioSourceTracked(PacketSource(packets)))) / frames
+    results["packet_source_read"] = raw
+    results["tracked_read"] = tracked
+
+
+def git_revision() -> str | None:
+    """Returns the current commit hash, if the repo is a git checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, check=True,
+            capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict[str, float], baseline_path: str, tolerance: float) -> list[str]:
+    """Returns a description of every result slower than the baseline by more than tolerance"""
+    with open(baseline_path, "r", encoding="utf-8") as file_handle:
+        baseline = json.load(file_handle)["results"]
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None or previous <= 0:
+            continue
+        change = seconds / previous - 1
+        print(f"{name:40} {previous * 1e6:12.2f}us -> {seconds * 1e6:12.2f}us ({change:+.0%})")
+        if change > tolerance and seconds - previous > NOISE_FLOOR:
+            regressions.append(f"{name} is {change:.0%} slower than baseline")
+    return regressions
+
+
+def main() -> int:
+    """Runs the benchmarks and saves or compares the results"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="synthetic library sizes to benchmark")
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare results to a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed fractional slowdown before failing a comparison")
+    args = parser.parse_args()
+
+    results: dict[str, float] = {}
+    bench_independent(results)
+    for size in args.sizes:
+        print(f"Benchmarking library of {size} tracks...", file=sys.stderr)
+        bench_size(size, results)
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as file_handle:
+            json.dump(report, file_handle, indent=2, sort_keys=True)
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""Stand-ins for Discord objects and library files, shared by the dev harnesses
+
+Nothing here talks to Discord: contexts record what would have been sent, and voice
+clients consume their audio source on a 20ms clock in a thread of their own, the way
+discord.py's audio player does, instead of sending packets anywhere."""
+
+# first-party imports
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable
+from unittest.mock import AsyncMock, MagicMock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+
+# local imports
+from audio import ( # pylint: disable=wrong-import-position
+    OGG_PAGE_HEADER,
+    OPUS_FRAME_MS,
+    build_seek_index,
+    seconds_to_frames
+)
+
+# a typical 128 kbps Opus packet for 20ms of audio
+OPUS_PACKET = bytes(320)
+# audio packets written per Ogg page of a synthetic rendition
+PACKETS_PER_PAGE = 50
+
+
+def make_library(root: str, size: int, seed: int = 0, opus_seconds: int = 0) -> list[str]:
+    """Writes `size` metadata JSON files and audio stubs under root/library
+
+    With `opus_seconds`, every track also gets a synthetic Opus rendition (and seek index)
+    of that length, and its metadata duration matches, so it can actually be played."""
+    rng = random.Random(seed)
+    for directory in ("library/audio", "library/metadata", "library/config"):
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+    channels = [f"Channel {i}" for i in range(max(1, size // 20))]
+    track_ids = []
+    for i in range(size):
+        track_id = f"{i:011d}"
+        track_ids.append(track_id)
+        if opus_seconds:
+            duration = f"{opus_seconds // 60}:{opus_seconds % 60:02d}"
+        else:
+            duration = f"{rng.randint(1, 9)}:{rng.randint(0, 59):02d}"
+        metadata = {
+            "id": track_id,
+            "title": f"Synthetic track {i} " + " ".join(
+                rng.choice(["lofi", "remix", "live", "official", "audio", "mix"])
+                for _ in range(rng.randint(1, 6))),
+            "channel": rng.choice(channels),
+            "upload_date": f"20{rng.randint(10, 24)}{rng.randint(1, 12):02d}01",
+            "duration_string": duration
+        }
+        path = os.path.join(root, "library/metadata", f"{track_id}.json")
+        with open(path, "w", encoding="utf-8") as file_handle:
+            json.dump(metadata, file_handle)
+        audio_path = os.path.join(root, "library/audio", track_id)
+        with open(audio_path + ".m4a", "wb") as file_handle:
+            file_handle.write(b"\0" * 64)
+        if opus_seconds:
+            write_ogg_opus(audio_path + ".opus", seconds_to_frames(opus_seconds))
+            build_seek_index(audio_path + ".opus", audio_path + ".seek")
+    return track_ids
+
+
+def ogg_page(packets: list[bytes], flags: int = 0) -> bytes:
+    """Returns one Ogg page holding the given packets; the checksum is left at zero"""
+    segments = bytearray()
+    for packet in packets:
+        segments += b"\xff" * (len(packet) // 255) + bytes([len(packet) % 255])
+    header = OGG_PAGE_HEADER.pack(b"OggS", 0, flags, 0, 1, 0, 0, len(segments))
+    return header + bytes(segments) + b"".join(packets)
+
+
+def write_ogg_opus(path: str, frames: int, packet: bytes = OPUS_PACKET) -> None:
+    """Writes an Ogg Opus file of `frames` identical packets
+
+    The packets aren't decodable audio, but Chester never decodes a rendition; it only
+    splits the file into packets and hands them to the voice gateway."""
+    with open(path, "wb") as file_handle:
+        file_handle.write(ogg_page([b"OpusHead" + b"\0" * 11]))
+        file_handle.write(ogg_page([b"OpusTags" + b"\0" * 8]))
+        for start in range(0, frames, PACKETS_PER_PAGE):
+            file_handle.write(ogg_page([packet] * min(PACKETS_PER_PAGE, frames - start)))
+
+
+def write_sine_m4a(path: str, seconds: int) -> None:
+    """Writes a real m4a of a sine tone with ffmpeg, for exercising the transcoding path"""
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-y", "-f", "lavfi",
+         "-i", f"sine=frequency=440:duration={seconds}", "-c:a", "aac", "-f", "mp4", path],
+        check=True)
+
+
+def mock_context() -> MagicMock:
+    """Returns a stand-in for commands.Context that records sent messages"""
+    ctx = MagicMock()
+    ctx.send = AsyncMock()
+    ctx.author.mention = "@benchmark"
+    ctx.author.id = 1
+    ctx.guild.id = 1
+    return ctx
+
+
+class FakeBot:
+    """The parts of commands.Bot the music cog uses"""
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.user = MagicMock(id=0)
+        self.voice_clients: list["FakeVoiceClient"] = []
+
+
+class FakeGuild:
+    """A guild with one voice channel"""
+    def __init__(self, bot: FakeBot, guild_id: int) -> None:
+        self.id = guild_id
+        self.voice_client: "FakeVoiceClient | None" = None
+        self.channel = FakeVoiceChannel(bot, self)
+
+
+class FakeVoiceChannel:
+    """A voice channel that connects by creating a FakeVoiceClient"""
+    def __init__(self, bot: FakeBot, guild: FakeGuild) -> None:
+        self.id = guild.id
+        self.guild = guild
+        self.bot = bot
+
+    async def connect(self) -> "FakeVoiceClient":
+        """Joins the channel, registering the new voice client with the guild and bot"""
+        voice = FakeVoiceClient(self)
+        self.guild.voice_client = voice
+        self.bot.voice_clients.append(voice)
+        return voice
+
+
+class FakeContext:
+    """A commands.Context for a member sitting in their guild's voice channel"""
+    def __init__(self, guild: FakeGuild, user_id: int) -> None:
+        self.guild = guild
+        self.author = MagicMock(
+            id=user_id, mention=f"@user{user_id}", display_name=f"user{user_id}")
+        self.author.voice.channel = guild.channel
+        self.message = MagicMock(author=self.author, content="")
+        self.sent: list[str] = []
+
+    @property
+    def voice_client(self) -> "FakeVoiceClient | None":
+        """Returns the guild's current voice client, as Context.voice_client does"""
+        return self.guild.voice_client
+
+    async def send(self, content: str = "", **_: Any) -> MagicMock:
+        """Records a message and returns a stand-in for it that can be edited"""
+        self.sent.append(content)
+        message = MagicMock()
+        message.edit = AsyncMock()
+        return message
+
+
+class FakePlayer(threading.Thread):
+    """Stands in for discord.py's AudioPlayer: reads a frame every 20ms and throws it away
+
+    Frames are paced against a clock started when playback starts (or resumes), the
+    source may be swapped while playing, and `after` runs in this thread when the source
+    runs dry or playback is stopped. Frames whose read returned after their send deadline
+    are counted in `late_frames`."""
+    def __init__(
+            self,
+            source: Any,
+            after: Callable[[Exception | None], None] | None,
+            frame_seconds: float = OPUS_FRAME_MS / 1000
+        ) -> None:
+        super().__init__(daemon=True)
+        self.source = source
+        self.after = after
+        self.frame_seconds = frame_seconds
+        self.frames = 0
+        self.late_frames = 0
+        self.end = threading.Event()
+        self.resumed = threading.Event()
+        self.resumed.set()
+
+    def run(self) -> None:
+        """Reads frames on the clock until the source runs dry or playback is stopped"""
+        delay = self.frame_seconds
+        start = time.perf_counter()
+        loops = 0
+        error = None
+        try:
+            while not self.end.is_set():
+                if not self.resumed.is_set():
+                    self.resumed.wait()
+                    start = time.perf_counter()
+                    loops = 0
+                    continue
+                loops += 1
+                data = self.source.read()
+                if not data:
+                    break
+                self.frames += 1
+                wait = start + delay * loops - time.perf_counter()
+                if wait < 0:
+                    self.late_frames += 1
+                time.sleep(max(0.0, wait))
+        except Exception as e: # pylint: disable=broad-exception-caught
+            error = e
+        finally:
+            self.stop()
+            if self.after is not None:
+                self.after(error)
+            self.source.cleanup()
+
+    def stop(self) -> None:
+        """Ends playback after the current frame"""
+        self.end.set()
+        self.resumed.set()
+
+    def is_playing(self) -> bool:
+        """Returns whether frames are being read"""
+        return self.resumed.is_set() and not self.end.is_set()
+
+
+class FakeVoiceClient:
+    """A connected voice client that plays through a FakePlayer instead of a gateway"""
+    # seconds between frame reads; tests shorten it so tracks finish quickly
+    frame_seconds = OPUS_FRAME_MS / 1000
+
+    def __init__(self, channel: FakeVoiceChannel) -> None:
+        self.channel = channel
+        self.guild = channel.guild
+        self._connected = True
+        self._player: FakePlayer | None = None
+        # frame counts of players that have finished
+        self.frames = 0
+        self.late_frames = 0
+
+    @property
+    def source(self) -> Any:
+        """Returns the source being played, if any"""
+        return self._player.source if self._player is not None else None
+
+    @source.setter
+    def source(self, value: Any) -> None:
+        """Swaps the source of the running player"""
+        if self._player is None:
+            raise ValueError("Not playing anything.")
+        self._player.source = value
+
+    def is_connected(self) -> bool:
+        """Returns whether the client is still connected"""
+        return self._connected
+
+    def is_playing(self) -> bool:
+        """Returns whether a player is running and not paused"""
+        return self._player is not None and self._player.is_playing()
+
+    def is_paused(self) -> bool:
+        """Returns whether a player is running but paused"""
+        return (self._player is not None and not self._player.end.is_set()
+                and not self._player.resumed.is_set())
+
+    def play(self, source: Any, after: Callable[[Exception | None], None] | None = None) -> None:
+        """Starts a new player for a source; raises if one is already playing"""
+        if self.is_playing():
+            raise RuntimeError("Already playing audio.")
+        self._retire_player()
+        self._player = FakePlayer(source, after, self.frame_seconds)
+        self._player.name = f"fake-player-{self.guild.id}"
+        self._player.start()
+
+    def pause(self) -> None:
+        """Pauses the player"""
+        if self._player is not None:
+            self._player.resumed.clear()
+
+    def resume(self) -> None:
+        """Resumes a paused player"""
+        if self._player is not None:
+            self._player.resumed.set()
+
+    def stop(self) -> None:
+        """Stops the player; its after callback still runs, in its own thread"""
+        if self._player is not None:
+            self._player.stop()
+        self._retire_player()
+
+    def frame_counts(self) -> tuple[int, int]:
+        """Returns the frames played and frames late across every player so far"""
+        frames, late = self.frames, self.late_frames
+        if self._player is not None:
+            frames += self._player.frames
+            late += self._player.late_frames
+        return frames, late
+
+    async def move_to(self, channel: FakeVoiceChannel) -> None:
+        """Moves to another channel"""
+        self.channel = channel
+
+    async def disconnect(self) -> None:
+        """Stops playback and unregisters the client from the guild and bot"""
+        self._connected = False
+        self.stop()
+        self.guild.voice_client = None
+        if self in self.channel.bot.voice_clients:
+            self.channel.bot.voice_clients.remove(self)
+
+    def _retire_player(self) -> None:
+        """Folds the current player's counts into the totals and forgets it"""
+        if self._player is not None:
+            self.frames += self._player.frames
+            self.late_frames += self._player.late_frames
+            self._player = None
@@ -0,0 +1,239 @@
+"""Offline load test for concurrent voice sessions
+
+Plays N guilds at once through the real music cog against the fake voice clients in
+fakes.py, whose player threads read a frame every 20ms as discord.py's would, and
+reports CPU, memory, ffmpeg processes and missed frame deadlines as N grows. Sessions
+cycle through plain playback with a queue, break music and looping. No Discord
+connection or network is used; the default synthetic Opus library doesn't need ffmpeg
+either, while `--audio ffmpeg` plays real m4a files through the transcoding fallback:
+
+    python dev/loadtest.py --sessions 1 10 50 100 --seconds 20
+    python dev/loadtest.py --audio ffmpeg --sessions 1 5 10 --json load.json
+"""
+
+# first-party imports
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+# local imports; fakes puts src/ on the path
+from fakes import FakeBot, FakeContext, FakeGuild, make_library, write_sine_m4a
+from benchmark import git_revision
+import musiccog # pylint: disable=wrong-import-position
+from audio import OPUS_FRAME_MS # pylint: disable=wrong-import-position
+from metrics import ( # pylint: disable=wrong-import-position
+    child_process_stats,
+    count_child_processes
+)
+
+DEFAULT_SESSIONS = [1, 10, 25, 50]
+DEFAULT_SECONDS = 15
+# distinct tracks played across sessions; fewer than sessions means shared streams
+DEFAULT_TRACKS = 20
+DEFAULT_TRACK_SECONDS = 30
+SCENARIOS = ("play", "break", "loop")
+# distinct break tracks, registered round-robin to the sessions running the break scenario
+BREAK_TRACKS = 2
+# seconds between samples of the ffmpeg process count
+SAMPLE_SECONDS = 0.5
+# a frame read that returns more than one frame late has missed its send deadline
+DEADLINE_SECONDS = OPUS_FRAME_MS / 1000
+
+
+def process_cpu_seconds() -> float:
+    """Returns the CPU time used by this process so far, across all its threads"""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def child_cpu_seconds(executable: str) -> float:
+    """Returns the CPU time used so far by this process's live children of an executable"""
+    children = child_process_stats(executable) or []
+    ticks = sum(int(fields[11]) + int(fields[12]) for fields in children if len(fields) > 12)
+    return ticks / os.sysconf("SC_CLK_TCK")
+
+
+def rss_mib() -> float:
+    """Returns this process's current resident set size in MiB"""
+    try:
+        with open("/proc/self/statm", "r", encoding="utf-8") as file_handle:
+            pages = int(file_handle.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1048576
+    except OSError:
+        # ru_maxrss is the peak, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build_library(root: str, tracks: int, track_seconds: int, audio: str) -> list[str]:
+    """Creates the library under root, with Opus renditions or real m4a files"""
+    if audio == "opus":
+        return make_library(root, tracks, opus_seconds=track_seconds)
+    track_ids = make_library(root, tracks)
+    for track_id in track_ids:
+        write_sine_m4a(os.path.join(root, "library/audio", f"{track_id}.m4a"), track_seconds)
+        path = os.path.join(root, "library/metadata", f"{track_id}.json")
+        with open(path, "r", encoding="utf-8") as file_handle:
+            metadata = json.load(file_handle)
+        metadata["duration_string"] = f"{track_seconds // 60}:{track_seconds % 60:02d}"
+        with open(path, "w", encoding="utf-8") as file_handle:
+            json.dump(metadata, file_handle)
+    return track_ids
+
+
+async def start_session(
+        cog: musiccog.MusicCog,
+        guild: FakeGuild,
+        scenario: str,
+        track_ids: list[str],
+        queued: int
+    ) -> None:
+    """Drives one guild's commands for a scenario, as a member in its voice channel would
+
+    The play scenario queues `queued` tracks behind the first."""
+    ctx = FakeContext(guild, user_id=guild.id)
+    track_id = track_ids[guild.id % len(track_ids)]
+    if scenario == "break":
+        await cog.cmd_registerbreak.callback(cog, ctx, track_ids[guild.id % BREAK_TRACKS])
+    await cog.cmd_play.callback(cog, ctx, track_id)
+    if scenario == "play":
+        for offset in range(1, queued + 1):
+            next_id = track_ids[(guild.id + offset) % len(track_ids)]
+            await cog.cmd_queue.callback(cog, ctx, next_id)
+    elif scenario == "loop":
+        await cog.cmd_loop.callback(cog, ctx)
+    elif scenario == "break":
+        await cog.cmd_break.callback(cog, ctx)
+
+
+async def run_step(
+        sessions: int,
+        seconds: float,
+        track_ids: list[str],
+        track_seconds: int
+    ) -> dict[str, float]:
+    """Runs `sessions` guilds for `seconds` against a fresh cog and returns the measurements"""
+    # enough queued tracks that no session runs out of music before the step ends
+    queued = math.ceil(seconds / track_seconds)
+    bot = FakeBot(asyncio.get_running_loop())
+    cog = musiccog.MusicCog(bot)
+    await cog.warm_up()
+    guilds = [FakeGuild(bot, guild_id) for guild_id in range(1, sessions + 1)]
+    for guild in guilds:
+        await start_session(
+            cog, guild, SCENARIOS[guild.id % len(SCENARIOS)], track_ids, queued)
+
+    def _late_sends() -> int:
+        return sum(guild.voice_client.frame_counts()[1] for guild in guilds
+                   if guild.voice_client is not None)
+
+    lateness = cog.frame_lateness
+    start_late = _late_sends()
+    start_frames, start_missed = lateness.count, lateness.count_above(DEADLINE_SECONDS)
+    start_cpu, start_ffmpeg_cpu = process_cpu_seconds(), child_cpu_seconds("ffmpeg")
+    start = time.perf_counter()
+    ffmpeg_peak = 0
+    while time.perf_counter() - start < seconds:
+        ffmpeg_peak = max(ffmpeg_peak, count_child_processes("ffmpeg") or 0)
+        await asyncio.sleep(SAMPLE_SECONDS)
+    elapsed = time.perf_counter() - start
+    result = {
+        "sessions": sessions,
+        "cpu_percent": (process_cpu_seconds() - start_cpu) / elapsed * 100,
+        "ffmpeg_cpu_percent": (child_cpu_seconds("ffmpeg") - start_ffmpeg_cpu) / elapsed * 100,
+        "rss_mib": rss_mib(),
+        "ffmpeg_peak": ffmpeg_peak,
+        "shared_streams": cog.broadcasts.stats()["streams"],
+        "frames": lateness.count - start_frames,
+        "expected_frames": sessions * elapsed * 1000 / OPUS_FRAME_MS,
+        "missed_deadlines": lateness.count_above(DEADLINE_SECONDS) - start_missed,
+        "late_sends": _late_sends() - start_late,
+        "lateness_p99_ms": (lateness.quantile(0.99) or 0.0) * 1000
+    }
+
+    for guild in guilds:
+        cog.end_session(guild.id)
+        if guild.voice_client is not None:
+            await guild.voice_client.disconnect()
+    await cog.cog_unload()
+    return result
+
+
+def print_row(result: dict[str, float]) -> None:
+    """Prints one step of the load test as a table row"""
+    print(
+        f"{result['sessions']:>8} {result['cpu_percent']:>6.1f}% "
+        f"{result['ffmpeg_cpu_percent']:>7.1f}% {result['rss_mib']:>8.1f} "
+        f"{result['ffmpeg_peak']:>6} {result['shared_streams']:>7} "
+        f"{result['frames']:>8}/{result['expected_frames']:<8.0f} "
+        f"{result['missed_deadlines']:>6} {result['late_sends']:>6} "
+        f"{result['lateness_p99_ms']:>7.2f}"
+    )
+
+
+async def run(args: argparse.Namespace) -> list[dict[str, float]]:
+    """Builds the library, then runs every step in turn"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="chester-load-") as root:
+        track_ids = build_library(root, args.tracks, args.track_seconds, args.audio)
+        previous_cwd = os.getcwd()
+        os.chdir(root)
+        try:
+            print(
+                f"{'sessions':>8} {'cpu':>7} {'ffmpeg':>8} {'rss MiB':>8} {'ffmpeg':>6} "
+                f"{'streams':>7} {'frames/expected':>17} {'missed':>6} {'late':>6} "
+                f"{'p99 ms':>7}")
+            for sessions in args.sessions:
+                result = await run_step(sessions, args.seconds, track_ids, args.track_seconds)
+                print_row(result)
+                results.append(result)
+        finally:
+            os.chdir(previous_cwd)
+    return results
+
+
+def main() -> int:
+    """Runs the load test and prints (and optionally saves) the results"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=DEFAULT_SESSIONS,
+                        help="numbers of concurrent voice sessions to run, in turn")
+    parser.add_argument("--seconds", type=float, default=DEFAULT_SECONDS,
+                        help="how long to measure each step for")
+    parser.add_argument("--tracks", type=int, default=DEFAULT_TRACKS,
+                        help="distinct tracks in the synthetic library")
+    parser.add_argument("--track-seconds", type=int, default=DEFAULT_TRACK_SECONDS,
+                        help="length of every synthetic track")
+    parser.add_argument("--audio", choices=("opus", "ffmpeg"), default="opus",
+                        help="play synthetic Opus renditions, or real m4a files through ffmpeg")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args()
+    if args.tracks < BREAK_TRACKS:
+        parser.error(f"--tracks must be at least {BREAK_TRACKS}")
+    if args.audio == "ffmpeg" and shutil.which("ffmpeg") is None:
+        parser.error("--audio ffmpeg needs ffmpeg on the PATH")
+    # keep the cog's own files (metrics, logs) out of the way of the measurements
+    os.environ.setdefault("CHESTER_METRICS_FILE", "")
+
+    results = asyncio.run(run(args))
+    if args.json:
+        report = {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "audio": args.audio,
+            "results": results
+        }
+        with open(args.json, "w", encoding="utf-8") as file_handle:
+            json.dump(report, file_handle, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
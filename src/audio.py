@@ -0,0 +1,364 @@
+"""Audio sources and ingest helpers for Chester"""
+# src/audio.py
+
+# first-party imports
+import logging
+import os
+import subprocess
+import json
+import math
+import struct
+import bisect
+import time
+from array import array
+from collections import deque
+from itertools import islice
+from math import floor
+from typing import IO, Callable, Iterator, NamedTuple, Protocol, Sequence
+
+# third-party imports
+import discord
+from discord.oggparse import OggStream
+
+logger = logging.getLogger("chester.audio")
+
+# every Opus packet Discord receives covers 20ms of audio
+OPUS_FRAME_MS = 20
+OPUS_BITRATE = "128k"
+# loudness normalisation target (EBU R128 integrated loudness) and true-peak ceiling
+TARGET_LOUDNESS_LUFS = -14.0
+TRUE_PEAK_CEILING_DBTP = -1.0
+# Ogg Opus header packets that must not be sent to the voice gateway
+OPUS_HEADER_MAGICS = (b"OpusHead", b"OpusTags")
+# capture pattern, version, flags, granule position, serial, page number, CRC, segment count
+OGG_PAGE_HEADER = struct.Struct("<4sBBQIIIB")
+OGG_CONTINUED_PACKET = 0x01
+# a read this far behind its deadline means playback was paused or stalled, so the
+# frame clock restarts rather than reporting every following frame as late
+FRAME_CLOCK_RESYNC_SECONDS = 1.0
+
+
+class FrameTimer(Protocol):
+    """Anything that can record a frame's lateness in seconds, e.g. a metrics Histogram"""
+    def observe(self, value: float) -> None:
+        """Records one frame's lateness in seconds"""
+
+
+def parse_timestamp(text: str) -> float:
+    """Parses "83", "83.5", "1:23" or "1:02:03" into seconds
+
+    Raises ValueError for anything else."""
+    parts = text.strip().split(":")
+    if not 1 <= len(parts) <= 3 or any(part == "" for part in parts):
+        raise ValueError(f"Could not parse timestamp {text!r}")
+    seconds = 0.0
+    for part in parts:
+        value = float(part)
+        if value < 0:
+            raise ValueError(f"Timestamp {text!r} must not be negative")
+        seconds = seconds * 60 + value
+    return seconds
+
+
+def seconds_to_frames(seconds: float) -> int:
+    """Returns the index of the 20ms frame containing the given time"""
+    return int(seconds * 1000) // OPUS_FRAME_MS
+
+
+def frames_to_seconds(frames: int) -> float:
+    """Returns the start time in seconds of the given 20ms frame"""
+    return frames * OPUS_FRAME_MS / 1000
+
+
+def analyse_loudness(source_path: str) -> tuple[float, float]:
+    """Measures EBU R128 integrated loudness (LUFS) and true peak (dBTP) of a file
+
+    Blocking; runs a single ffmpeg loudnorm analysis pass with no output file."""
+    logger.info("Analysing loudness of %s", source_path)
+    command = [
+        "ffmpeg", "-hide_banner", "-nostats",
+        "-i", source_path,
+        "-vn",
+        "-af", "loudnorm=print_format=json",
+        "-f", "null", "-"
+    ]
+    try:
+        result = subprocess.run(command, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(
+            f"ffmpeg failed to analyse {source_path}: {e.stderr.decode(errors='replace')}"
+        ) from e
+    # loudnorm prints its measurements as the last JSON object on stderr
+    stderr = result.stderr.decode(errors="replace")
+    try:
+        report = json.loads(stderr[stderr.rindex("{"):stderr.rindex("}") + 1])
+        return float(report["input_i"]), float(report["input_tp"])
+    except (ValueError, KeyError) as e:
+        raise RuntimeError(f"Could not read loudness report for {source_path}") from e
+
+
+def normalisation_gain(loudness_lufs: float, true_peak_dbtp: float) -> float:
+    """Returns the gain in dB that brings a track to the target loudness without clipping"""
+    if not math.isfinite(loudness_lufs) or not math.isfinite(true_peak_dbtp):
+        return 0.0
+    return round(min(
+        TARGET_LOUDNESS_LUFS - loudness_lufs,
+        TRUE_PEAK_CEILING_DBTP - true_peak_dbtp
+    ), 2)
+
+
+def transcode_to_opus(source_path: str, dest_path: str, gain_db: float = 0.0) -> None:
+    """Encodes an audio file into an Ogg Opus rendition suitable for packet passthrough
+
+    A non-zero `gain_db` is baked into the rendition, so loudness normalisation costs
+    nothing at playback. Blocking; the output is written to a temporary file and renamed
+    into place so a half-written rendition is never picked up by playback."""
+    logger.info("Transcoding %s to Opus at %s with %s dB gain", source_path, dest_path, gain_db)
+    temp_path = dest_path + ".part"
+    command = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-i", source_path,
+        "-vn",
+        *(["-af", f"volume={gain_db}dB"] if gain_db else []),
+        "-c:a", "libopus",
+        "-b:a", OPUS_BITRATE,
+        "-ar", "48000",
+        "-ac", "2",
+        "-frame_duration", str(OPUS_FRAME_MS),
+        "-application", "audio",
+        "-f", "ogg",
+        temp_path
+    ]
+    try:
+        subprocess.run(command, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise RuntimeError(
+            f"ffmpeg failed to transcode {source_path}: {e.stderr.decode(errors='replace')}"
+        ) from e
+    os.replace(temp_path, dest_path)
+
+
+class IngestResult(NamedTuple):
+    """Outcome of ingest_audio: metadata fields to store, and anything that went wrong"""
+    metadata: dict[str, float]
+    errors: list[str]
+
+
+def ingest_audio(source_path: str, opus_path: str, seek_index_path: str) -> IngestResult:
+    """Analyses loudness, then writes a normalised Opus rendition and its seek index
+
+    Blocking and self-contained so it can run in a worker process. Failures are returned
+    rather than raised: a track without loudness data is transcoded at unity gain, and a
+    track without a rendition falls back to transcoding on the fly at playback."""
+    metadata: dict[str, float] = {}
+    errors: list[str] = []
+    gain_db = 0.0
+    try:
+        loudness, peak = analyse_loudness(source_path)
+        gain_db = normalisation_gain(loudness, peak)
+        metadata = {"loudness_lufs": loudness, "true_peak_dbtp": peak, "gain_db": gain_db}
+    except (RuntimeError, OSError) as e:
+        errors.append(f"Could not analyse loudness: {e}")
+    try:
+        transcode_to_opus(source_path, opus_path, gain_db)
+        build_seek_index(opus_path, seek_index_path)
+    except (RuntimeError, ValueError, OSError) as e:
+        errors.append(f"Could not create Opus rendition: {e}")
+    return IngestResult(metadata, errors)
+
+
+def iter_opus_packets(stream: IO[bytes]) -> Iterator[bytes]:
+    """Yields the audio packets of an Ogg Opus stream, skipping the header packets"""
+    for packet in OggStream(stream).iter_packets():
+        if packet.startswith(OPUS_HEADER_MAGICS):
+            continue
+        yield packet
+
+
+def build_seek_index(opus_path: str, index_path: str) -> None:
+    """Writes a seek index for an Ogg Opus file
+
+    The index is a flat array of (audio packet number, byte offset) pairs, one for every
+    page that begins with a fresh packet, so a reader can jump to the page holding any
+    20ms frame and skip at most a page's worth of packets."""
+    logger.info("Building seek index for %s", opus_path)
+    entries = array("Q")
+    completed_packets = 0
+    with open(opus_path, "rb") as file_handle:
+        while True:
+            offset = file_handle.tell()
+            header = file_handle.read(OGG_PAGE_HEADER.size)
+            if len(header) < OGG_PAGE_HEADER.size:
+                break
+            magic, _, flags, _, _, _, _, segment_count = OGG_PAGE_HEADER.unpack(header)
+            if magic != b"OggS":
+                raise ValueError(f"Invalid Ogg page at byte {offset} of {opus_path}")
+            segment_table = file_handle.read(segment_count)
+            file_handle.seek(sum(segment_table), os.SEEK_CUR)
+            audio_packet = completed_packets - len(OPUS_HEADER_MAGICS)
+            if audio_packet >= 0 and not flags & OGG_CONTINUED_PACKET:
+                entries.extend((audio_packet, offset))
+            # every lacing value below 255 terminates a packet
+            completed_packets += sum(1 for lacing in segment_table if lacing < 255)
+    temp_path = index_path + ".part"
+    with open(temp_path, "wb") as file_handle:
+        entries.tofile(file_handle)
+    os.replace(temp_path, index_path)
+
+
+def load_seek_index(index_path: str) -> tuple[list[int], list[int]] | None:
+    """Reads a seek index into (packet numbers, byte offsets), or None if there isn't one"""
+    try:
+        with open(index_path, "rb") as file_handle:
+            entries = array("Q", file_handle.read())
+    except FileNotFoundError:
+        return None
+    return list(entries[0::2]), list(entries[1::2])
+
+
+def load_opus_packets(path: str) -> list[bytes]:
+    """Reads every audio packet of an Ogg Opus file into memory"""
+    with open(path, "rb") as file_handle:
+        return list(iter_opus_packets(file_handle))
+
+
+class PacketSource(discord.AudioSource):
+    """Replays Opus packets that are already in memory, e.g. from the frame cache"""
+    def __init__(self, packets: Sequence[bytes], start_frame: int = 0) -> None:
+        self._packets = packets
+        self._position = start_frame
+
+    def read(self) -> bytes:
+        if self._position >= len(self._packets):
+            return b""
+        packet = self._packets[self._position]
+        self._position += 1
+        return packet
+
+    def is_opus(self) -> bool:
+        return True
+
+
+class OggOpusSource(discord.AudioSource):
+    """Streams pre-encoded Opus packets straight from an Ogg file
+
+    No ffmpeg process is spawned and discord.py skips its own Opus encoder, since the
+    packets are already in the format the voice gateway expects. Given a seek index, a
+    non-zero `start_frame` jumps straight to the right page; without one the preceding
+    packets are read and skipped."""
+    def __init__(
+            self,
+            path: str,
+            start_frame: int = 0,
+            seek_index: tuple[list[int], list[int]] | None = None
+        ) -> None:
+        self.path = path
+        self._file = open(path, "rb") # pylint: disable=consider-using-with
+        skip = start_frame
+        if start_frame and seek_index:
+            packet_numbers, offsets = seek_index
+            page = bisect.bisect_right(packet_numbers, start_frame) - 1
+            if page >= 0:
+                self._file.seek(offsets[page])
+                skip = start_frame - packet_numbers[page]
+        self._packets = iter_opus_packets(self._file)
+        for _ in islice(self._packets, skip):
+            pass
+
+    def read(self) -> bytes:
+        if self._file.closed:
+            return b""
+        return next(self._packets, b"")
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self) -> None:
+        self._file.close()
+
+
+class AudioSourceTracked(discord.AudioSource):
+    """Class stolen from https://www.reddit.com/r/Discord_Bots/comments/q9jl5b/how_to_make_discordpy_bot_display_current_song/""" # pylint: disable=line-too-long
+    def __init__(self, source: discord.AudioSource, start_frame: int = 0):
+        self._source = source
+        self.count_20ms = 0
+        self.start_frame = start_frame
+        # frames read ahead of playback by prebuffer()
+        self._buffer: deque[bytes] = deque()
+        # optional hook fired once, from the player thread, when playback reaches a frame
+        self.near_end_frame: int | None = None
+        self.on_near_end: Callable[[], None] | None = None
+        self.near_end_fired = False
+        # optional per-frame timing: how late each read returns against a 20ms clock
+        self.frame_timer: FrameTimer | None = None
+        self._clock_start: float | None = None
+        self._clock_frames = 0
+        # sources this one replaced in a running player, cleaned up from the player thread
+        self._replaced: deque[discord.AudioSource] = deque()
+
+    def read(self) -> bytes:
+        self._cleanup_replaced()
+        data = self._buffer.popleft() if self._buffer else self._source.read()
+        if self.frame_timer is not None:
+            self._time_frame()
+        if data:
+            self.count_20ms += 1
+            if (self.on_near_end is not None and not self.near_end_fired
+                    and self.near_end_frame is not None and self.position >= self.near_end_frame):
+                self.near_end_fired = True
+                self.on_near_end()
+        return data
+
+    def _time_frame(self) -> None:
+        """Records how far past its 20ms deadline the current read is returning"""
+        now = time.perf_counter()
+        if self._clock_start is None:
+            self._clock_start = now
+            self._clock_frames = 0
+        lateness = now - (self._clock_start + self._clock_frames * OPUS_FRAME_MS / 1000)
+        if lateness > FRAME_CLOCK_RESYNC_SECONDS:
+            self._clock_start = now
+            self._clock_frames = 0
+            lateness = 0.0
+        self._clock_frames += 1
+        self.frame_timer.observe(max(0.0, lateness))
+
+    def replace(self, previous: discord.AudioSource) -> None:
+        """Takes over cleaning up the source this one is about to replace in a running player
+
+        The player thread may still be inside the previous source's read(), so it is only
+        cleaned up by this source's first read() (or its cleanup()), from that thread."""
+        self._replaced.append(previous)
+
+    def _cleanup_replaced(self) -> None:
+        """Cleans up every source this one replaced"""
+        while self._replaced:
+            self._replaced.popleft().cleanup()
+
+    def prebuffer(self, frames: int) -> None:
+        """Reads up to `frames` frames ahead so playback can start without waiting on I/O"""
+        while len(self._buffer) < frames:
+            data = self._source.read()
+            if not data:
+                break
+            self._buffer.append(data)
+
+    def is_opus(self) -> bool:
+        # must be forwarded, otherwise discord.py would re-encode passthrough packets
+        return self._source.is_opus()
+
+    def cleanup(self) -> None:
+        self._cleanup_replaced()
+        self._source.cleanup()
+
+    @property
+    def position(self) -> int:
+        """Returns the index of the next 20ms frame to be played"""
+        return self.start_frame + self.count_20ms
+
+    @property
+    def progress(self) -> int:
+        """Returns the progress of the tracked audio source in seconds"""
+        return floor(frames_to_seconds(self.position))
@@ -0,0 +1,145 @@
+"""Break track registry for Chester"""
+# src/breakstore.py
+
+# first-party imports
+import logging
+import os
+import asyncio
+import json
+import tempfile
+import threading
+
+logger = logging.getLogger("chester.breakstore")
+
+# scope for registrations made outside a guild, and for pre-guild break.json records;
+# it is used as the fallback when a user has no registration in the current guild
+DEFAULT_SCOPE = "default"
+DEFAULT_WRITE_DELAY = 2.0
+
+
+class BreakRegistry:
+    """In-memory break track registrations per guild with write-behind persistence
+
+    Reads never touch disk. Changes are batched and written out after `write_delay`
+    seconds of quiet, through a temporary file that is atomically renamed into place."""
+    def __init__(self, path: str, write_delay: float = DEFAULT_WRITE_DELAY) -> None:
+        self.path = path
+        self.write_delay = write_delay
+        self._scopes: dict[str, dict[str, str]] = self._load()
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._pending_write: asyncio.Future | None = None
+        # serialises writes from the executor; sequence numbers drop stale snapshots
+        self._write_lock = threading.Lock()
+        self._sequence = 0
+        self._written_sequence = 0
+
+
+    def get(self, scope: str, user_id: str) -> str | None:
+        """Returns a user's break track ID for a guild, falling back to the default scope"""
+        track_id = self._scopes.get(scope, {}).get(user_id)
+        if track_id is None:
+            track_id = self._scopes.get(DEFAULT_SCOPE, {}).get(user_id)
+        return track_id
+
+
+    def register(self, scope: str, user_id: str, track_id: str) -> None:
+        """Registers a user's break track for a guild and schedules a write"""
+        logger.info("Registering break track %s for user %s in %s", track_id, user_id, scope)
+        self._scopes.setdefault(scope, {})[user_id] = track_id
+        self._schedule_flush()
+
+
+    def clear(self) -> None:
+        """Drops every registration and schedules a write"""
+        logger.info("Clearing break registry")
+        self._scopes.clear()
+        self._schedule_flush()
+
+
+    def track_ids(self) -> set[str]:
+        """Returns the ID of every track registered as break music anywhere"""
+        return {track_id for users in self._scopes.values() for track_id in users.values()}
+
+
+    async def flush(self) -> None:
+        """Writes any pending changes immediately"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+            await self._write_snapshot()
+        elif self._pending_write is not None:
+            await self._pending_write
+
+
+    def _load(self) -> dict[str, dict[str, str]]:
+        """Reads the registry file, migrating the old flat user -> track format
+
+        An unreadable file is moved aside to `<path>.corrupt` and the registry starts
+        empty, rather than keeping the cog from loading."""
+        if not os.path.exists(self.path):
+            logger.info("Break record does not exist, starting new")
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as read_handle:
+                data = json.load(read_handle)
+            if not isinstance(data, dict):
+                raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+        except (ValueError, OSError) as e:
+            logger.error(
+                "Break record %s is unreadable (%s); moving it to %s.corrupt and starting new",
+                self.path, e, self.path)
+            try:
+                os.replace(self.path, self.path + ".corrupt")
+            except OSError as move_error:
+                logger.error("Could not move aside %s: %s", self.path, move_error)
+            return {}
+        if any(isinstance(value, str) for value in data.values()):
+            logger.info("Migrating flat break record into the default scope")
+            return {DEFAULT_SCOPE: {k: v for k, v in data.items() if isinstance(v, str)}}
+        return data
+
+
+    def _schedule_flush(self) -> None:
+        """(Re)starts the debounce timer for the next write"""
+        self._sequence += 1
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self._flush_handle = loop.call_later(
+            self.write_delay, lambda: loop.create_task(self._write_snapshot()))
+
+
+    async def _write_snapshot(self) -> None:
+        """Serialises the registry on the loop and writes it from the default executor"""
+        self._flush_handle = None
+        payload = json.dumps(self._scopes, ensure_ascii=False)
+        sequence = self._sequence
+        loop = asyncio.get_running_loop()
+        self._pending_write = loop.run_in_executor(None, self._write, payload, sequence)
+        try:
+            await self._pending_write
+        except OSError as e:
+            logger.error("Failed to write break record to %s: %s", self.path, e)
+        finally:
+            self._pending_write = None
+
+
+    def _write(self, payload: str, sequence: int) -> None:
+        """Atomically replaces the registry file; runs in a worker thread"""
+        with self._write_lock:
+            if sequence <= self._written_sequence:
+                return
+            directory = os.path.dirname(self.path) or "."
+            file_descriptor, temp_path = tempfile.mkstemp(
+                dir=directory, prefix=".break-", suffix=".tmp")
+            try:
+                with os.fdopen(file_descriptor, "w", encoding="utf-8") as write_handle:
+                    write_handle.write(payload)
+                    write_handle.flush()
+                    os.fsync(write_handle.fileno())
+                os.replace(temp_path, self.path)
+            except OSError:
+                os.remove(temp_path)
+                raise
+            self._written_sequence = sequence
+            logger.info("Wrote break record to %s", self.path)
@@ -0,0 +1,189 @@
+"""Shared decode/encode fan-out for Chester"""
+# src/broadcast.py
+
+# first-party imports
+import logging
+import threading
+from collections import deque
+from typing import Callable
+
+# third-party imports
+import discord
+
+logger = logging.getLogger("chester.broadcast")
+
+# encoded frames kept behind the newest one; a listener may join a running stream if
+# the frame it wants to start at is still in this window (500 frames is 10 seconds)
+DEFAULT_WINDOW_FRAMES = 500
+
+# opens the underlying decoder for a track at a given 20ms frame
+OpenSourceFunc = Callable[[str, int], discord.AudioSource]
+
+
+class BroadcastStream:
+    """One decoder (and Opus encoder, for PCM sources) shared by several listeners
+
+    Frames are produced on demand by whichever listener is furthest ahead, from its own
+    audio player thread, and kept in a ring buffer of `window` frames for the others."""
+    def __init__(
+            self,
+            track_id: str,
+            source: discord.AudioSource,
+            start_frame: int,
+            window: int
+        ) -> None:
+        self.track_id = track_id
+        self.window = window
+        self.subscribers = 0
+        self.finished = False
+        # absolute frame number of the oldest frame still in the ring
+        self.first_frame = start_frame
+        self._source = source
+        self._encoder: discord.opus.Encoder | None = None
+        self._ring: deque[bytes] = deque()
+        self._lock = threading.Lock()
+
+
+    @property
+    def next_frame(self) -> int:
+        """Returns the absolute frame number the decoder will produce next"""
+        return self.first_frame + len(self._ring)
+
+
+    def can_join(self, start_frame: int) -> bool:
+        """Returns whether a listener starting at the given frame can share this stream"""
+        return not self.finished and self.first_frame <= start_frame <= self.next_frame
+
+
+    def frame(self, index: int) -> bytes | None:
+        """Returns the encoded frame with the given number, b"" past the end of the track
+
+        Returns None if the frame has already dropped out of the ring, i.e. the caller
+        fell more than a window behind the listener driving the stream."""
+        with self._lock:
+            while index >= self.next_frame and not self.finished:
+                self._produce()
+            if index < self.first_frame:
+                return None
+            if index >= self.next_frame:
+                return b""
+            return self._ring[index - self.first_frame]
+
+
+    def close(self) -> None:
+        """Stops the decoder"""
+        with self._lock:
+            self.finished = True
+            self._ring.clear()
+            self._source.cleanup()
+
+
+    def _produce(self) -> None:
+        """Reads and encodes one frame into the ring; caller holds the lock"""
+        data = self._source.read()
+        if not data:
+            self.finished = True
+            return
+        if not self._source.is_opus():
+            if self._encoder is None:
+                self._encoder = discord.opus.Encoder()
+            data = self._encoder.encode(data, discord.opus.Encoder.SAMPLES_PER_FRAME)
+        self._ring.append(data)
+        if len(self._ring) > self.window:
+            self._ring.popleft()
+            self.first_frame += 1
+
+
+class BroadcastSource(discord.AudioSource):
+    """A listener's view of a broadcast stream, yielding already-encoded Opus packets"""
+    def __init__(self, hub: "BroadcastHub", stream: BroadcastStream, start_frame: int) -> None:
+        self._hub = hub
+        self._stream = stream
+        self._position = start_frame
+
+    def read(self) -> bytes:
+        if self._stream is None:
+            # already cleaned up
+            return b""
+        data = self._stream.frame(self._position)
+        if data is None:
+            # fell out of the shared window, e.g. while paused; carry on from a stream of our own
+            logger.info(
+                "Listener fell behind the %s stream at frame %s", self._stream.track_id,
+                self._position)
+            self._hub.release(self._stream)
+            self._stream = self._hub.acquire(self._stream.track_id, self._position)
+            data = self._stream.frame(self._position)
+        if data:
+            self._position += 1
+        return data or b""
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self) -> None:
+        if self._stream is not None:
+            self._hub.release(self._stream)
+            self._stream = None
+
+
+class BroadcastHub:
+    """Hands out listeners on shared streams, one decoder per (track, offset window)
+
+    A listener for a track joins a running stream of it when its start frame is within
+    that stream's window; otherwise a new stream (and decoder) is opened. A stream is
+    closed as soon as its last listener is cleaned up."""
+    def __init__(self, open_func: OpenSourceFunc, window: int = DEFAULT_WINDOW_FRAMES) -> None:
+        self.open_func = open_func
+        self.window = window
+        self._streams: dict[str, list[BroadcastStream]] = {}
+        self._lock = threading.Lock()
+
+
+    def subscribe(self, track_id: str, start_frame: int = 0) -> BroadcastSource:
+        """Returns a source playing a track from the given frame, sharing a decoder if possible"""
+        return BroadcastSource(self, self.acquire(track_id, start_frame), start_frame)
+
+
+    def acquire(self, track_id: str, start_frame: int) -> BroadcastStream:
+        """Returns a stream a listener at the given frame can read, counting the listener"""
+        with self._lock:
+            for stream in self._streams.get(track_id, ()):
+                if stream.can_join(start_frame):
+                    stream.subscribers += 1
+                    logger.debug(
+                        "Sharing the %s stream at frame %s with %s other listener(s)",
+                        track_id, start_frame, stream.subscribers - 1)
+                    return stream
+        # opening may spawn ffmpeg, so it happens outside the lock
+        logger.info("Opening broadcast stream for %s at frame %s", track_id, start_frame)
+        stream = BroadcastStream(
+            track_id, self.open_func(track_id, start_frame), start_frame, self.window)
+        stream.subscribers = 1
+        with self._lock:
+            self._streams.setdefault(track_id, []).append(stream)
+        return stream
+
+
+    def release(self, stream: BroadcastStream) -> None:
+        """Drops one listener from a stream, closing the stream after the last one"""
+        with self._lock:
+            stream.subscribers -= 1
+            if stream.subscribers > 0:
+                return
+            streams = self._streams.get(stream.track_id, [])
+            if stream in streams:
+                streams.remove(stream)
+            if not streams:
+                self._streams.pop(stream.track_id, None)
+        stream.close()
+
+
+    def stats(self) -> dict[str, int]:
+        """Returns the number of open streams and the listeners they serve"""
+        with self._lock:
+            streams = [stream for streams in self._streams.values() for stream in streams]
+        return {
+            "streams": len(streams),
+            "listeners": sum(stream.subscribers for stream in streams)
+        }
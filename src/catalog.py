@@ -0,0 +1,162 @@
+"""In-memory track catalog for Chester"""
+# src/catalog.py
+
+# first-party imports
+import bisect
+import sys
+from typing import Iterable, Iterator
+
+# local imports
+from search import TrigramIndex
+
+
+def parse_duration(duration_string: str) -> int:
+    """Converts a yt-dlp duration string such as "4:05" or "1:02:03" into seconds
+
+    Unparseable strings (e.g. for livestreams) count as zero seconds."""
+    seconds = 0
+    try:
+        for part in duration_string.split(":"):
+            seconds = seconds * 60 + int(part or 0)
+    except ValueError:
+        return 0
+    return seconds
+
+
+class Track:
+    """Metadata for a single track in the library"""
+    __slots__ = ("id", "title", "channel", "upload_date", "duration_string", "duration", "gain_db")
+
+    def __init__(
+            self,
+            id: str, # pylint: disable=redefined-builtin
+            title: str,
+            channel: str,
+            upload_date: str,
+            duration_string: str,
+            gain_db: float | None = None
+        ) -> None:
+        self.id = id
+        self.title = title
+        # channel names repeat across many tracks, so share one string object per channel
+        self.channel = sys.intern(channel)
+        self.upload_date = upload_date
+        self.duration_string = duration_string
+        self.duration = parse_duration(duration_string)
+        # loudness normalisation gain measured at ingest, None if never analysed
+        self.gain_db = gain_db
+
+    @classmethod
+    def from_dict(cls, metadata: dict) -> "Track":
+        """Builds a track from a metadata dict as stored in the library index"""
+        return cls(
+            metadata["id"],
+            metadata["title"],
+            metadata["channel"],
+            metadata["upload_date"],
+            metadata["duration_string"],
+            metadata.get("gain_db")
+        )
+
+    def __repr__(self) -> str:
+        return f"Track(id={self.id!r}, title={self.title!r})"
+
+
+class TrackCatalog:
+    """Hash-indexed collection of tracks with secondary indexes by channel, upload date,
+    duration and title/channel text
+
+    Iteration yields tracks in the order they were added. `version` increases on every
+    change, so derived data (e.g. rendered pages) can tell when it is stale."""
+    def __init__(self, tracks: Iterable[Track] = ()) -> None:
+        self.version = 0
+        self._tracks: dict[str, Track] = {}
+        # insertion order as an ordered dict, so removal is O(1); slice() reads it through
+        # a list rebuilt at most once per version, so pages don't walk the dict
+        self._order: dict[str, None] = {}
+        self._order_list: list[str] = []
+        self._order_version = 0
+        # dicts rather than sets so each channel keeps insertion order
+        self._by_channel: dict[str, dict[str, Track]] = {}
+        # sorted (upload_date, id) pairs for range queries
+        self._by_upload_date: list[tuple[str, str]] = []
+        # sorted (duration seconds, id) pairs for range queries
+        self._by_duration: list[tuple[int, str]] = []
+        # fuzzy text search over title and channel
+        self._search = TrigramIndex()
+        for track in tracks:
+            self.add(track)
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def __contains__(self, track_id: object) -> bool:
+        return track_id in self._tracks
+
+    def __iter__(self) -> Iterator[Track]:
+        return iter(self._tracks.values())
+
+    def get(self, track_id: str) -> Track | None:
+        """Returns the track with the given ID, or None if it isn't in the catalog"""
+        return self._tracks.get(track_id)
+
+    def add(self, track: Track) -> None:
+        """Adds a track, replacing any existing track with the same ID"""
+        if track.id in self._tracks:
+            self.remove(track.id)
+        self._tracks[track.id] = track
+        self._order[track.id] = None
+        self._by_channel.setdefault(track.channel, {})[track.id] = track
+        bisect.insort(self._by_upload_date, (track.upload_date, track.id))
+        bisect.insort(self._by_duration, (track.duration, track.id))
+        self._search.add(track.id, f"{track.title} {track.channel}")
+        self.version += 1
+
+    def remove(self, track_id: str) -> Track:
+        """Removes and returns the track with the given ID
+
+        Raises KeyError if the ID isn't in the catalog."""
+        track = self._tracks.pop(track_id)
+        del self._order[track_id]
+        channel_tracks = self._by_channel[track.channel]
+        del channel_tracks[track_id]
+        if not channel_tracks:
+            del self._by_channel[track.channel]
+        key = (track.upload_date, track_id)
+        del self._by_upload_date[bisect.bisect_left(self._by_upload_date, key)]
+        key = (track.duration, track_id)
+        del self._by_duration[bisect.bisect_left(self._by_duration, key)]
+        self._search.remove(track_id)
+        self.version += 1
+        return track
+
+    def slice(self, start: int, stop: int) -> list[Track]:
+        """Returns tracks start..stop-1 in insertion order"""
+        if self._order_version != self.version:
+            self._order_list = list(self._order)
+            self._order_version = self.version
+        return [self._tracks[track_id] for track_id in self._order_list[start:stop]]
+
+    def channels(self) -> list[str]:
+        """Returns every channel with at least one track"""
+        return list(self._by_channel)
+
+    def by_channel(self, channel: str) -> list[Track]:
+        """Returns the tracks uploaded by the given channel"""
+        return list(self._by_channel.get(channel, {}).values())
+
+    def uploaded_between(self, start: str, end: str) -> list[Track]:
+        """Returns tracks with start <= upload_date <= end (YYYYMMDD strings), oldest first"""
+        low = bisect.bisect_left(self._by_upload_date, (start, ""))
+        high = bisect.bisect_right(self._by_upload_date, (end, "\uffff"))
+        return [self._tracks[track_id] for _, track_id in self._by_upload_date[low:high]]
+
+    def duration_between(self, shortest: int, longest: int) -> list[Track]:
+        """Returns tracks with shortest <= duration <= longest seconds, shortest first"""
+        low = bisect.bisect_left(self._by_duration, (shortest, ""))
+        high = bisect.bisect_right(self._by_duration, (longest, "\uffff"))
+        return [self._tracks[track_id] for _, track_id in self._by_duration[low:high]]
+
+    def search(self, text: str, limit: int = 10) -> list[Track]:
+        """Returns up to `limit` tracks whose title or channel best match the text"""
+        return [self._tracks[track_id] for track_id, _ in self._search.query(text, limit)]
@@ -12,37 +12,49 @@ import dotenv
 import discord
 from discord.ext import commands
 
+# local imports
+from logsetup import setup_logging
+from startup import STARTUP
+
 # global variables
 DISCORD_API_VERSION = 10
 DISCORD_API_ENDPOINT_BASE_URL = f"https://discord.com/api/v{DISCORD_API_VERSION}"
 LOGGING_DESTINATION = "logs/chester.log"
 
+logger = logging.getLogger("chester")
+
 
 class Chester(commands.Bot):
     """Wrapper for commands.Bot"""
     def __init__(self, **kwargs: dict[str, Any]):
         super().__init__(**kwargs)
 
+    async def on_ready(self) -> None:
+        """Records when the gateway session is ready"""
+        STARTUP.mark("gateway ready")
+
 
 async def main():
     """Driver function to set up important config for Chester"""
-    # set up logging
-    filehandler = logging.FileHandler(LOGGING_DESTINATION, mode="w", encoding="utf8")
-    streamhandler = logging.StreamHandler()
-    logging.basicConfig(handlers=[filehandler, streamhandler], level=logging.INFO)
-
-    # create bot
-    intents = discord.Intents.default()
-    intents.message_content = True
-    bot = Chester(command_prefix=">", intents=intents)
-
-    # load cogs
-    await bot.load_extension("musiccog")
-    logging.info("registered commands: %s", [c.name for c in bot.commands])
-
-    # start the bot
-    token = os.environ["DISCORD_BOT_TOKEN"]
-    await bot.start(token)
+    # set up logging; records are written by a background thread, never the event loop
+    listener = setup_logging(LOGGING_DESTINATION)
+    STARTUP.mark("imports done")
+    try:
+        # create bot
+        intents = discord.Intents.default()
+        intents.message_content = True
+        bot = Chester(command_prefix=">", intents=intents)
+
+        # load cogs; the library is warmed in the background so this returns quickly
+        with STARTUP.phase("load musiccog"):
+            await bot.load_extension("musiccog")
+        logger.info("registered commands: %s", [c.name for c in bot.commands])
+
+        # start the bot
+        token = os.environ["DISCORD_BOT_TOKEN"]
+        await bot.start(token)
+    finally:
+        listener.stop()
 
 if __name__ == "__main__":
     dotenv.load_dotenv()
@@ -0,0 +1,300 @@
+"""Background download queue for Chester"""
+# src/downloads.py
+
+# first-party imports
+import logging
+import asyncio
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable
+
+# local imports
+from urlcache import UrlCache, normalise_url, video_id_from_url
+
+logger = logging.getLogger("chester.downloads")
+
+# callback used to push progress text back to whoever requested a download
+ProgressCallback = Callable[[str], Awaitable[Any]]
+# hook handed to the blocking download function, called from the worker thread
+ProgressHook = Callable[[dict[str, Any]], None]
+
+# optional second stage run on the event loop once a download has produced a track ID
+PostprocessFunc = Callable[[str], Awaitable[None]]
+
+PLAYLIST_PATTERN = re.compile(r"[?&]list=([A-Za-z0-9_-]+)")
+# number of in-progress items listed in an aggregated batch status line
+BATCH_STATUS_ITEMS = 3
+
+
+def video_key_from_url(url: str) -> str:
+    """Returns the key used to merge duplicate requests, preferring the video ID"""
+    return video_id_from_url(url) or normalise_url(url)
+
+
+def is_playlist_url(url: str) -> bool:
+    """Returns whether a URL names a playlist rather than a single video
+
+    A watch URL that also carries a playlist ID counts as the single video."""
+    return PLAYLIST_PATTERN.search(url) is not None and video_id_from_url(url) is None
+
+
+def describe_progress(status: dict[str, Any]) -> str | None:
+    """Turns a yt-dlp progress or postprocessor hook dict into a short status line"""
+    if "postprocessor" in status:
+        if status.get("status") == "started":
+            return f"Processing audio ({status['postprocessor']})"
+        return None
+    if status.get("status") == "downloading":
+        done = status.get("downloaded_bytes") or 0
+        total = status.get("total_bytes") or status.get("total_bytes_estimate")
+        if total:
+            return f"Downloading: {floor_percent(done, total)}%"
+        return f"Downloading: {done // 1024} KiB"
+    if status.get("status") == "finished":
+        return "Download finished"
+    return None
+
+
+def floor_percent(done: int, total: int) -> int:
+    """Returns done/total as a whole percentage clamped to 0-100"""
+    return max(0, min(100, int(done * 100 / total)))
+
+
+class DownloadJob:
+    """A single download, shared by every caller that requested the same video"""
+    def __init__(self, key: str, url: str) -> None:
+        self.key = key
+        self.url = url
+        self.listeners: list[ProgressCallback] = []
+        self.future: asyncio.Future | None = None
+        self.last_status: str | None = None
+        self.last_report: float = 0.0
+
+
+class BatchProgress:
+    """Folds the progress of several downloads into one status line
+
+    Each download reports through its own listener(); the combined line is passed to
+    `send` at most once per `interval`, plus once when the batch is finished."""
+    def __init__(
+            self,
+            urls: list[str],
+            send: ProgressCallback,
+            interval: float = 2.0
+        ) -> None:
+        self.send = send
+        self.interval = interval
+        self.statuses: dict[str, str] = dict.fromkeys(urls, "Queued")
+        self.finished: dict[str, bool] = {}
+        self._last_sent = 0.0
+        self._last_text: str | None = None
+
+
+    def listener(self, url: str) -> ProgressCallback:
+        """Returns the progress callback for one URL of the batch"""
+        async def _update(text: str) -> None:
+            self.statuses[url] = text
+            await self.flush()
+        return _update
+
+
+    async def finish(self, url: str, succeeded: bool) -> None:
+        """Records that one URL has finished, successfully or not"""
+        self.finished[url] = succeeded
+        self.statuses[url] = "Done" if succeeded else "Failed"
+        await self.flush(force=len(self.finished) == len(self.statuses))
+
+
+    def render(self) -> str:
+        """Returns the combined status; a batch of one just shows that download's status"""
+        if len(self.statuses) == 1:
+            return next(iter(self.statuses.values()))
+        failed = sum(1 for ok in self.finished.values() if not ok)
+        active = [
+            text for url, text in self.statuses.items()
+            if url not in self.finished and not text.startswith("Queued")
+        ]
+        parts = [f"{len(self.finished)}/{len(self.statuses)} finished"]
+        if failed:
+            parts.append(f"{failed} failed")
+        if active:
+            shown = "; ".join(active[:BATCH_STATUS_ITEMS])
+            if len(active) > BATCH_STATUS_ITEMS:
+                shown += f" and {len(active) - BATCH_STATUS_ITEMS} more"
+            parts.append(f"in progress: {shown}")
+        return ", ".join(parts)
+
+
+    async def flush(self, force: bool = False) -> None:
+        """Sends the combined status if it changed and the interval has passed"""
+        text = self.render()
+        now = time.monotonic()
+        if text == self._last_text or (not force and now - self._last_sent < self.interval):
+            return
+        self._last_text = text
+        self._last_sent = now
+        try:
+            await self.send(text)
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logger.error("Batch progress update failed: %s", e)
+
+
+class DownloadQueue:
+    """Runs blocking downloads on a bounded worker pool so the event loop never stalls
+
+    If a `postprocess_func` is given it is awaited with each downloaded track ID before
+    the download counts as finished, so post-processing doesn't hold a download worker.
+    With a `url_cache`, a URL that resolves to a track for which `available_func` is true
+    is answered without downloading, and a URL that failed recently fails straight away."""
+    def __init__(
+            self,
+            download_func: Callable[[str, ProgressHook], str],
+            max_concurrent: int = 2,
+            progress_interval: float = 2.0,
+            postprocess_func: PostprocessFunc | None = None,
+            url_cache: UrlCache | None = None,
+            available_func: Callable[[str], bool] | None = None
+        ) -> None:
+        if max_concurrent < 1:
+            raise ValueError(f"Download concurrency must be at least 1, got {max_concurrent}")
+        self.download_func = download_func
+        self.postprocess_func = postprocess_func
+        self.url_cache = url_cache
+        self.available_func = available_func
+        self.max_concurrent = max_concurrent
+        self.progress_interval = progress_interval
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrent,
+            thread_name_prefix="chester-download"
+        )
+        self._jobs: dict[str, DownloadJob] = {}
+
+
+    @property
+    def pending(self) -> int:
+        """Returns the number of distinct downloads queued or running"""
+        return len(self._jobs)
+
+
+    @property
+    def active_keys(self) -> set[str]:
+        """Returns the keys of the downloads queued or running; video IDs where known"""
+        return set(self._jobs)
+
+
+    async def download(self, url: str, on_progress: ProgressCallback | None = None) -> str:
+        """Downloads the given URL in the worker pool and returns the resulting track ID
+
+        Requests for a video that is already queued or downloading are attached to the
+        existing job instead of starting a second download."""
+        cached_id = self.url_cache.track_id(url) if self.url_cache is not None else None
+        available = self.available_func
+        if cached_id is not None and available is not None and available(cached_id):
+            logger.info("%s is already in the library as %s", url, cached_id)
+            if on_progress is not None:
+                await self._safe_notify(on_progress, "Already in the library")
+            return cached_id
+        error = self.url_cache.failure(url) if self.url_cache is not None else None
+        if error is not None:
+            logger.info("Not retrying %s, which failed recently: %s", url, error)
+            raise RuntimeError(f"Failed recently, try again later: {error}")
+        key = cached_id or video_key_from_url(url)
+        job = self._jobs.get(key)
+        if job is None:
+            logger.info("Queueing download for %s (key %s)", url, key)
+            job = self._start_job(key, url)
+            if on_progress is not None:
+                job.listeners.append(on_progress)
+                if self.pending > self.max_concurrent:
+                    await self._safe_notify(
+                        on_progress, f"Queued behind {self.pending - 1} other download(s)")
+        else:
+            logger.info("Merging duplicate download request for %s into job %s", url, key)
+            if on_progress is not None:
+                job.listeners.append(on_progress)
+                await self._safe_notify(
+                    on_progress, job.last_status or "Already queued by another request")
+        # shield so that one cancelled waiter doesn't cancel the download for everyone else
+        return await asyncio.shield(job.future)
+
+
+    def shutdown(self) -> None:
+        """Stops accepting work; running downloads are allowed to finish in the background"""
+        logger.info("Shutting down download queue with %s pending job(s)", self.pending)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+    def _start_job(self, key: str, url: str) -> DownloadJob:
+        """Creates a job and submits it to the worker pool"""
+        loop = asyncio.get_running_loop()
+        job = DownloadJob(key, url)
+        self._jobs[key] = job
+
+        def _hook(status: dict[str, Any]) -> None:
+            # called from the worker thread; hop back onto the loop to notify listeners
+            text = describe_progress(status)
+            now = time.monotonic()
+            if text is None or text == job.last_status:
+                return
+            throttled = now - job.last_report < self.progress_interval
+            if status.get("status") == "downloading" and throttled:
+                return
+            job.last_status = text
+            job.last_report = now
+            asyncio.run_coroutine_threadsafe(self._notify(job, text), loop)
+
+        def _finished(_: asyncio.Future) -> None:
+            if self._jobs.get(key) is job:
+                self._jobs.pop(key)
+            logger.info("Download job %s finished", key)
+
+        async def _run() -> str:
+            try:
+                track_id = await loop.run_in_executor(
+                    self._executor, self.download_func, url, _hook)
+            except Exception as e:
+                await self._cache_result(url, error=str(e))
+                raise
+            await self._cache_result(url, track_id=track_id)
+            if self.postprocess_func is not None:
+                _hook({"status": "started", "postprocessor": "Opus"})
+                await self.postprocess_func(track_id)
+            return track_id
+
+        job.future = loop.create_task(_run())
+        job.future.add_done_callback(_finished)
+        return job
+
+
+    async def _cache_result(
+            self,
+            url: str,
+            track_id: str | None = None,
+            error: str | None = None
+        ) -> None:
+        """Records a download's outcome in the URL cache and persists it"""
+        if self.url_cache is None:
+            return
+        if track_id is not None:
+            self.url_cache.remember(url, track_id)
+        else:
+            self.url_cache.remember_failure(url, error)
+        try:
+            await asyncio.to_thread(self.url_cache.save)
+        except OSError as e:
+            logger.error("Failed to save URL cache: %s", e)
+
+
+    async def _notify(self, job: DownloadJob, text: str) -> None:
+        """Sends a progress line to every listener attached to a job"""
+        for listener in list(job.listeners):
+            await self._safe_notify(listener, text)
+
+
+    async def _safe_notify(self, listener: ProgressCallback, text: str) -> None:
+        """Calls a progress listener, logging rather than propagating its failures"""
+        try:
+            await listener(text)
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logger.error("Download progress listener failed: %s", e)
@@ -0,0 +1,123 @@
+"""In-memory cache of encoded audio frames for Chester"""
+# src/framecache.py
+
+# first-party imports
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Sequence
+
+logger = logging.getLogger("chester.framecache")
+
+# rough per-packet cost of a bytes object on top of its payload
+PACKET_OVERHEAD_BYTES = 33
+
+Frames = tuple[bytes, ...]
+
+
+def frames_size(frames: Sequence[bytes]) -> int:
+    """Returns the approximate memory footprint of a sequence of packets in bytes"""
+    return sum(len(frame) for frame in frames) + PACKET_OVERHEAD_BYTES * len(frames)
+
+
+class FrameCache:
+    """Size-bounded LRU cache of encoded Opus packets keyed by track ID
+
+    Shared between the event loop and discord.py's audio player threads, so every
+    operation takes the cache lock."""
+    def __init__(self, budget_bytes: int) -> None:
+        if budget_bytes < 0:
+            raise ValueError(f"Frame cache budget must not be negative, got {budget_bytes}")
+        self.budget_bytes = budget_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, Frames] = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+    def __contains__(self, track_id: object) -> bool:
+        return track_id in self._entries
+
+
+    def get(self, track_id: str) -> Frames | None:
+        """Returns the cached frames for a track, marking it most recently used"""
+        with self._lock:
+            frames = self._entries.get(track_id)
+            if frames is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(track_id)
+            return frames
+
+
+    def put(self, track_id: str, frames: Sequence[bytes]) -> Frames:
+        """Caches the frames for a track, evicting least recently used tracks to fit
+
+        Tracks larger than the whole budget are returned but not cached."""
+        frames = tuple(frames)
+        size = frames_size(frames)
+        with self._lock:
+            self._discard(track_id)
+            if size > self.budget_bytes:
+                logger.info(
+                    "Not caching %s: %s bytes exceeds frame cache budget", track_id, size)
+                return frames
+            while self.current_bytes + size > self.budget_bytes:
+                evicted, _ = self._entries.popitem(last=False)
+                self.current_bytes -= self._sizes.pop(evicted)
+                self.evictions += 1
+                logger.info("Evicted %s from frame cache", evicted)
+            self._entries[track_id] = frames
+            self._sizes[track_id] = size
+            self.current_bytes += size
+        return frames
+
+
+    def get_or_load(self, track_id: str, loader: Callable[[], Sequence[bytes]]) -> Frames:
+        """Returns the cached frames for a track, loading and caching them on a miss"""
+        frames = self.get(track_id)
+        if frames is None:
+            logger.info("Frame cache miss for %s, loading frames", track_id)
+            frames = self.put(track_id, loader())
+        return frames
+
+
+    def invalidate(self, track_id: str) -> None:
+        """Drops a track from the cache, e.g. after its audio changed on disk"""
+        with self._lock:
+            self._discard(track_id)
+
+
+    def clear(self) -> None:
+        """Drops every cached track"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.current_bytes = 0
+
+
+    def stats(self) -> dict[str, int]:
+        """Returns hit/miss counters and current usage"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "tracks": len(self._entries),
+                "bytes": self.current_bytes,
+                "budget_bytes": self.budget_bytes
+            }
+
+
+    def _discard(self, track_id: str) -> None:
+        """Removes an entry if present; caller holds the lock"""
+        if self._entries.pop(track_id, None) is not None:
+            self.current_bytes -= self._sizes.pop(track_id)
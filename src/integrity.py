@@ -0,0 +1,259 @@
+"""Library integrity scanning for Chester"""
+# src/integrity.py
+
+# first-party imports
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+# local imports
+from catalog import parse_duration
+
+logger = logging.getLogger("chester.integrity")
+
+# audio that probes this many seconds shorter than its metadata is treated as truncated
+TRUNCATION_TOLERANCE_SECONDS = 2.0
+HASH_CHUNK_BYTES = 1024 * 1024
+# file suffixes that belong to a track, in the order they are checked
+AUDIO_SUFFIXES = (".m4a", ".opus")
+DERIVED_SUFFIXES = (".opus", ".seek")
+
+
+class Problem(NamedTuple):
+    """Something wrong with one file of the library"""
+    track_id: str
+    path: str
+    reason: str
+
+
+class ScanReport(NamedTuple):
+    """Outcome of a library scan"""
+    checked: int
+    unchanged: int
+    problems: list[Problem]
+    quarantined: list[str]
+    seconds: float
+
+    def summary(self, limit: int | None = None) -> str:
+        """Returns a short human-readable description of the scan, listing up to `limit` problems"""
+        lines = [
+            f"Checked {self.checked} file(s) ({self.unchanged} unchanged since the last scan) "
+            f"in {self.seconds:.1f}s; {len(self.problems)} problem(s) found."
+        ]
+        shown = self.problems if limit is None else self.problems[:limit]
+        lines.extend(f"{p.track_id}: {p.reason} ({os.path.basename(p.path)})" for p in shown)
+        if len(shown) < len(self.problems):
+            lines.append(f"...and {len(self.problems) - len(shown)} more")
+        if self.quarantined:
+            lines.append(f"Moved {len(self.quarantined)} file(s) to quarantine.")
+        return "\n".join(lines)
+
+
+def hash_file(path: str) -> str:
+    """Returns the hex SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file_handle:
+        while chunk := file_handle.read(HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def probe_duration(path: str) -> float:
+    """Returns the duration of an audio file in seconds according to ffprobe
+
+    Raises RuntimeError if the file can't be decoded."""
+    command = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        path
+    ]
+    try:
+        result = subprocess.run(command, check=True, capture_output=True, text=True)
+        return float(result.stdout.strip())
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"ffprobe could not read {path}: {e.stderr.strip()}") from e
+    except ValueError as e:
+        raise RuntimeError(f"ffprobe reported no duration for {path}") from e
+
+
+class LibraryScanner:
+    """Cross-checks metadata against audio files and verifies the audio itself
+
+    Every audio file is hashed and, when ffprobe is available, probed for its duration;
+    the results are kept in a JSON manifest keyed by path, so later scans only re-check
+    files whose mtime or size changed. In repair mode every file of a broken track is
+    moved to the quarantine directory, where the library index no longer sees it."""
+    def __init__(
+            self,
+            metadata_dir: str,
+            audio_dir: str,
+            manifest_path: str,
+            quarantine_dir: str,
+            workers: int | None = None
+        ) -> None:
+        self.metadata_dir = metadata_dir
+        self.audio_dir = audio_dir
+        self.manifest_path = manifest_path
+        self.quarantine_dir = quarantine_dir
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.can_probe = shutil.which("ffprobe") is not None
+        if not self.can_probe:
+            logger.warning("ffprobe not found; integrity scans will not check durations")
+
+
+    def scan(
+            self,
+            repair: bool = False,
+            evicted: set[str] = frozenset(),
+            busy: set[str] = frozenset()
+        ) -> ScanReport:
+        """Scans the library, returning what was found (and moved, if repairing)
+
+        Tracks in `evicted` had their audio removed on purpose and are not reported for
+        missing it. Tracks in `busy` are still being downloaded, so their files are left
+        alone entirely. Blocking; run it in a worker thread."""
+        start = time.perf_counter()
+        logger.info("Scanning library integrity (repair=%s)", repair)
+        manifest = self._load_manifest()
+        metadata_ids = self._ids(self.metadata_dir, ".json") - busy
+        audio_ids = self._ids(self.audio_dir, ".m4a") - busy
+        problems: list[Problem] = []
+
+        expected: dict[str, float] = {}
+        for track_id in sorted(metadata_ids):
+            path = os.path.join(self.metadata_dir, f"{track_id}.json")
+            try:
+                with open(path, "r", encoding="utf-8") as file_handle:
+                    expected[track_id] = parse_duration(json.load(file_handle)["duration_string"])
+            except (OSError, ValueError, KeyError) as e:
+                problems.append(Problem(track_id, path, f"invalid metadata ({e})"))
+                continue
+            if track_id not in audio_ids and track_id not in evicted:
+                problems.append(Problem(track_id, path, "metadata has no audio file"))
+        for track_id in sorted(audio_ids - metadata_ids):
+            problems.append(Problem(
+                track_id, os.path.join(self.audio_dir, f"{track_id}.m4a"), "orphaned audio"))
+        for suffix in DERIVED_SUFFIXES:
+            for track_id in sorted(self._ids(self.audio_dir, suffix) - audio_ids - busy):
+                problems.append(Problem(
+                    track_id, os.path.join(self.audio_dir, f"{track_id}{suffix}"),
+                    "orphaned rendition"))
+
+        # only files belonging to a healthy-looking track are worth hashing and probing
+        broken = {problem.track_id for problem in problems}
+        to_check = []
+        unchanged = 0
+        live_paths = set()
+        for track_id in sorted((metadata_ids & audio_ids) - broken):
+            for suffix in AUDIO_SUFFIXES:
+                path = os.path.join(self.audio_dir, f"{track_id}{suffix}")
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                live_paths.add(path)
+                entry = manifest.get(path)
+                if entry and (entry["mtime_ns"], entry["size"]) == (stat.st_mtime_ns, stat.st_size):
+                    unchanged += 1
+                else:
+                    to_check.append((track_id, path, stat, expected[track_id]))
+
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="chester-verify") as pool:
+            results = list(pool.map(lambda args: self._check_file(*args), to_check))
+        for (_, path, _, _), (entry, problem) in zip(to_check, results):
+            if problem is not None:
+                problems.append(problem)
+                manifest.pop(path, None)
+            else:
+                manifest[path] = entry
+        for path in list(manifest):
+            if path not in live_paths:
+                del manifest[path]
+
+        quarantined = self._quarantine(problems) if repair else []
+        self._write_manifest(manifest)
+        report = ScanReport(
+            len(to_check), unchanged, problems, quarantined, time.perf_counter() - start)
+        logger.info(
+            "Integrity scan finished: %s checked, %s unchanged, %s problem(s), %s quarantined",
+            report.checked, report.unchanged, len(problems), len(quarantined))
+        return report
+
+
+    def _check_file(
+            self,
+            track_id: str,
+            path: str,
+            stat: os.stat_result,
+            expected_seconds: float
+        ) -> tuple[dict, Problem | None]:
+        """Hashes and probes one audio file; runs in the scan's thread pool"""
+        entry = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        if stat.st_size == 0:
+            return entry, Problem(track_id, path, "empty audio file")
+        try:
+            entry["sha256"] = hash_file(path)
+            if self.can_probe:
+                entry["duration"] = probe_duration(path)
+        except (OSError, RuntimeError) as e:
+            return entry, Problem(track_id, path, f"unreadable audio ({e})")
+        duration = entry.get("duration")
+        if duration is not None and duration < expected_seconds - TRUNCATION_TOLERANCE_SECONDS:
+            return entry, Problem(
+                track_id, path, f"truncated audio ({duration:.0f}s of {expected_seconds:.0f}s)")
+        return entry, None
+
+
+    def _quarantine(self, problems: list[Problem]) -> list[str]:
+        """Moves the files of every broken track into the quarantine directory
+
+        A broken Opus rendition only takes the rendition and its seek index with it, since
+        playback can fall back to the m4a; anything else takes every file of the track."""
+        os.makedirs(self.quarantine_dir, exist_ok=True)
+        moved = []
+        for problem in problems:
+            if problem.path.endswith(".opus") or problem.reason == "orphaned rendition":
+                suffixes = DERIVED_SUFFIXES
+            else:
+                suffixes = (".json",) + AUDIO_SUFFIXES + (".seek",)
+            for suffix in suffixes:
+                directory = self.metadata_dir if suffix == ".json" else self.audio_dir
+                path = os.path.join(directory, f"{problem.track_id}{suffix}")
+                if os.path.exists(path):
+                    destination = os.path.join(self.quarantine_dir, os.path.basename(path))
+                    logger.warning("Quarantining %s: %s", path, problem.reason)
+                    os.replace(path, destination)
+                    moved.append(path)
+        return moved
+
+
+    def _ids(self, directory: str, suffix: str) -> set[str]:
+        """Returns the IDs of the files in a directory with a given suffix"""
+        with os.scandir(directory) as entries:
+            return {e.name[:-len(suffix)] for e in entries if e.name.endswith(suffix)}
+
+
+    def _load_manifest(self) -> dict[str, dict]:
+        """Reads the manifest, starting afresh if it is missing or unreadable"""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as file_handle:
+                return json.load(file_handle)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logger.error("Ignoring unreadable manifest %s: %s", self.manifest_path, e)
+            return {}
+
+
+    def _write_manifest(self, manifest: dict[str, dict]) -> None:
+        """Atomically replaces the manifest file"""
+        with open(self.manifest_path + ".part", "w", encoding="utf-8") as file_handle:
+            json.dump(manifest, file_handle, indent=1, sort_keys=True)
+        os.replace(self.manifest_path + ".part", self.manifest_path)
@@ -0,0 +1,246 @@
+"""Persisted metadata index for Chester's local library"""
+# src/libraryindex.py
+
+# first-party imports
+import logging
+import os
+import json
+import sqlite3
+import threading
+from typing import Callable
+
+logger = logging.getLogger("chester.libraryindex")
+
+# columns stored for every track, in the order the metadata JSON is flattened
+INDEX_COLUMNS: list[str] = [
+    "id",
+    "title",
+    "channel",
+    "upload_date",
+    "duration_string"
+]
+# columns filled in by ingest steps; older metadata files may not have them
+OPTIONAL_COLUMNS: list[str] = [
+    "loudness_lufs",
+    "true_peak_dbtp",
+    "gain_db"
+]
+# stat fields used to decide whether an indexed entry is still valid
+STAT_COLUMNS: list[str] = [
+    "metadata_mtime_ns",
+    "metadata_size",
+    "audio_mtime_ns",
+    "audio_size"
+]
+
+# order of the values in an index row as built by _parse_track
+ROW_COLUMNS: list[str] = INDEX_COLUMNS + OPTIONAL_COLUMNS + STAT_COLUMNS
+
+
+class LibraryIndex:
+    """SQLite-backed index of track metadata, validated against file mtime/size
+
+    Only metadata files that are new or whose stat (or whose audio file's stat) changed
+    since they were last indexed are opened and parsed again."""
+    def __init__(
+            self,
+            index_path: str,
+            metadata_dir: str,
+            audio_path_func: Callable[[str], str]
+        ) -> None:
+        self.index_path = index_path
+        self.metadata_dir = metadata_dir
+        self.audio_path_func = audio_path_func
+        # track ID -> reason for every entry the last refresh had to leave out
+        self.skipped: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(index_path, check_same_thread=False)
+        columns = ", ".join(
+            ["id TEXT PRIMARY KEY"]
+            + [f"{c} TEXT" for c in INDEX_COLUMNS[1:]]
+            + [f"{c} INTEGER" for c in STAT_COLUMNS]
+            + [f"{c} REAL" for c in OPTIONAL_COLUMNS]
+        )
+        with self._lock, self._connection:
+            self._connection.execute(f"CREATE TABLE IF NOT EXISTS tracks ({columns})")
+            existing = {row[1] for row in self._connection.execute("PRAGMA table_info(tracks)")}
+            for column in OPTIONAL_COLUMNS:
+                if column not in existing:
+                    logger.info("Adding column %s to library index", column)
+                    self._connection.execute(f"ALTER TABLE tracks ADD COLUMN {column} REAL")
+            # last play time per track, and whether its audio was evicted to save disk
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS storage "
+                "(id TEXT PRIMARY KEY, last_played REAL, evicted INTEGER NOT NULL DEFAULT 0)")
+
+
+    def metadata_path(self, track_id: str) -> str:
+        """Returns the metadata filepath for a given ID"""
+        return os.path.join(self.metadata_dir, f"{track_id}.json")
+
+
+    def refresh(self) -> list[dict[str, str | float | None]]:
+        """Brings the index in line with the metadata directory and returns every track
+
+        Entries whose audio file is missing or whose metadata can't be read are left out
+        of the index and recorded in self.skipped, rather than failing the whole load.
+        Tracks whose audio was deliberately evicted stay in, with zeroed audio stats."""
+        logger.info("Refreshing library index %s", self.index_path)
+        with self._lock:
+            evicted = {
+                row[0] for row in self._connection.execute("SELECT id FROM storage WHERE evicted")
+            }
+            stored = {
+                row[0]: row[1:]
+                for row in self._connection.execute(
+                    f"SELECT id, {', '.join(STAT_COLUMNS)} FROM tracks")
+            }
+            seen: set[str] = set()
+            changed: list[tuple] = []
+            self.skipped = {}
+            with os.scandir(self.metadata_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    track_id = entry.name[:-len(".json")]
+                    try:
+                        stats = self._stat_track(
+                            track_id, entry.stat(), allow_missing_audio=track_id in evicted)
+                        if stored.get(track_id) != stats:
+                            changed.append(self._parse_track(track_id, stats))
+                    except FileNotFoundError:
+                        self.skipped[track_id] = "missing audio"
+                        continue
+                    except (ValueError, KeyError) as e:
+                        logger.error("Could not read metadata for %s: %s", track_id, e)
+                        self.skipped[track_id] = "invalid metadata"
+                        continue
+                    seen.add(track_id)
+            removed = [(track_id,) for track_id in stored.keys() - seen]
+
+            with self._connection:
+                self._upsert(changed)
+                self._connection.executemany("DELETE FROM tracks WHERE id = ?", removed)
+            logger.info(
+                "Library index refreshed: %s track(s), %s reparsed, %s removed, %s skipped",
+                len(seen), len(changed), len(removed), len(self.skipped))
+        return self.tracks()
+
+
+    def update_track(self, track_id: str) -> dict[str, str | float | None]:
+        """Indexes (or re-indexes) a single track and returns its metadata"""
+        return self.update_tracks([track_id])[0]
+
+
+    def storage_state(self) -> tuple[dict[str, float], set[str]]:
+        """Returns the last play time of every track that has one, and the evicted IDs"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, last_played, evicted FROM storage").fetchall()
+        return (
+            {track_id: played for track_id, played, _ in rows if played is not None},
+            {track_id for track_id, _, evicted in rows if evicted}
+        )
+
+
+    def save_play_times(self, play_times: dict[str, float]) -> None:
+        """Records the last play time of several tracks in one transaction"""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO storage (id, last_played) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET last_played = excluded.last_played",
+                play_times.items())
+
+
+    def set_evicted(self, track_ids: list[str], evicted: bool) -> None:
+        """Marks tracks as having had their audio evicted, or as restored"""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO storage (id, evicted) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET evicted = excluded.evicted",
+                [(track_id, int(evicted)) for track_id in track_ids])
+
+
+    def clear_storage(self) -> None:
+        """Forgets every play time and eviction"""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM storage")
+
+
+    def update_tracks(self, track_ids: list[str]) -> list[dict[str, str | float | None]]:
+        """Indexes (or re-indexes) several tracks in one transaction and returns their metadata"""
+        logger.info("Updating library index entries for %s track(s)", len(track_ids))
+        rows = [
+            self._parse_track(track_id, self._stat_track(
+                track_id, os.stat(self.metadata_path(track_id))))
+            for track_id in track_ids
+        ]
+        with self._lock, self._connection:
+            self._upsert(rows)
+        return [dict(zip(ROW_COLUMNS, row)) for row in rows]
+
+
+    def remove_track(self, track_id: str) -> None:
+        """Drops a single track from the index"""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM tracks WHERE id = ?", (track_id,))
+
+
+    def tracks(self) -> list[dict[str, str | float | None]]:
+        """Returns the metadata of every indexed track"""
+        columns = INDEX_COLUMNS + OPTIONAL_COLUMNS
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(columns)} FROM tracks ORDER BY rowid").fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+
+    def close(self) -> None:
+        """Closes the underlying database connection"""
+        with self._lock:
+            self._connection.close()
+
+
+    def _stat_track(
+            self,
+            track_id: str,
+            metadata_stat: os.stat_result,
+            allow_missing_audio: bool = False
+        ) -> tuple[int, ...]:
+        """Returns the stat tuple stored alongside an entry to detect changes"""
+        audio_path = self.audio_path_func(track_id)
+        try:
+            audio_stat = os.stat(audio_path)
+        except FileNotFoundError as e:
+            if allow_missing_audio:
+                return (metadata_stat.st_mtime_ns, metadata_stat.st_size, 0, 0)
+            logger.error("Metadata for %s has no matching audio file", track_id)
+            raise FileNotFoundError(
+                f"Expected to find a matching audio file for metadata file "
+                f"{self.metadata_path(track_id)}") from e
+        return (
+            metadata_stat.st_mtime_ns,
+            metadata_stat.st_size,
+            audio_stat.st_mtime_ns,
+            audio_stat.st_size
+        )
+
+
+    def _parse_track(self, track_id: str, stats: tuple[int, ...]) -> tuple:
+        """Reads a metadata file into an index row"""
+        with open(self.metadata_path(track_id), "r", encoding="utf-8") as file_handle:
+            metadata_dict = json.load(file_handle)
+        return (
+            tuple(metadata_dict[key] for key in INDEX_COLUMNS)
+            + tuple(metadata_dict.get(key) for key in OPTIONAL_COLUMNS)
+            + stats
+        )
+
+
+    def _upsert(self, rows: list[tuple]) -> None:
+        """Inserts or replaces full index rows; caller holds the lock and transaction"""
+        placeholders = ", ".join("?" * len(ROW_COLUMNS))
+        self._connection.executemany(
+            f"INSERT OR REPLACE INTO tracks ({', '.join(ROW_COLUMNS)}) VALUES ({placeholders})",
+            rows
+        )
@@ -0,0 +1,162 @@
+"""Paginated library rendering for Chester"""
+# src/librarypages.py
+
+# first-party imports
+import logging
+from collections import OrderedDict
+from math import ceil
+from typing import Callable, NamedTuple
+
+# local imports
+from catalog import Track, TrackCatalog, parse_duration
+
+logger = logging.getLogger("chester.librarypages")
+
+# rows per page; keeps a page of truncated rows well inside Discord's 2000 character limit
+DEFAULT_PAGE_SIZE = 12
+# number of rendered pages kept across all filters
+DEFAULT_CACHED_PAGES = 256
+
+
+class LibraryFilter(NamedTuple):
+    """Optional restrictions on which tracks a library listing shows"""
+    channel: str | None = None
+    shortest: int | None = None
+    longest: int | None = None
+
+    def describe(self) -> str:
+        """Returns a short human-readable summary of the active filters"""
+        parts = []
+        if self.channel is not None:
+            parts.append(f"channel {self.channel}")
+        if self.shortest is not None:
+            parts.append(f"at least {self.shortest}s")
+        if self.longest is not None:
+            parts.append(f"at most {self.longest}s")
+        return ", ".join(parts)
+
+
+def parse_library_args(args: tuple[str, ...]) -> tuple[LibraryFilter, int]:
+    """Parses `>library` arguments into a filter and a zero-based page number
+
+    Accepts an optional page number plus `channel=NAME`, `min=M:SS` and `max=M:SS`.
+    Raises ValueError for anything it doesn't understand."""
+    channel = shortest = longest = None
+    page = 0
+    for arg in args:
+        key, sep, value = arg.partition("=")
+        if not sep:
+            if not arg.isdigit() or int(arg) < 1:
+                raise ValueError(f"Unrecognised library argument {arg!r}")
+            page = int(arg) - 1
+        elif key == "channel":
+            channel = value
+        elif key in ("min", "max") and all(p.isdigit() for p in value.split(":")):
+            if key == "min":
+                shortest = parse_duration(value)
+            else:
+                longest = parse_duration(value)
+        else:
+            raise ValueError(f"Unrecognised library argument {arg!r}")
+    return LibraryFilter(channel, shortest, longest), page
+
+
+class LibraryPages:
+    """Renders library listings page by page, caching results until the catalog changes
+
+    Unfiltered pages are sliced straight from the catalog; filtered listings are built
+    from the catalog's channel and duration indexes rather than a scan."""
+    def __init__(
+            self,
+            truncate: Callable[[str], str],
+            page_size: int = DEFAULT_PAGE_SIZE,
+            cached_pages: int = DEFAULT_CACHED_PAGES
+        ) -> None:
+        self.truncate = truncate
+        self.page_size = page_size
+        self.cached_pages = cached_pages
+        self._catalog: TrackCatalog | None = None
+        self._version = -1
+        self._matches: dict[LibraryFilter, list[Track]] = {}
+        self._pages: OrderedDict[tuple[LibraryFilter, int], str] = OrderedDict()
+
+
+    def page_count(self, catalog: TrackCatalog, library_filter: LibraryFilter) -> int:
+        """Returns the number of pages for a listing (at least one, even if empty)"""
+        self._check_fresh(catalog)
+        return max(1, ceil(self._match_count(catalog, library_filter) / self.page_size))
+
+
+    def render(self, catalog: TrackCatalog, library_filter: LibraryFilter, page: int) -> str:
+        """Returns the table for one page of a listing, clamping the page into range"""
+        page = max(0, min(page, self.page_count(catalog, library_filter) - 1))
+        key = (library_filter, page)
+        table = self._pages.get(key)
+        if table is not None:
+            self._pages.move_to_end(key)
+            return table
+
+        start = page * self.page_size
+        if library_filter == LibraryFilter():
+            tracks = catalog.slice(start, start + self.page_size)
+        else:
+            tracks = self._filtered(catalog, library_filter)[start:start + self.page_size]
+        # tabulate is slow to import, so it is loaded on the first render instead of at start-up
+        from tabulate import tabulate # pylint: disable=import-outside-toplevel
+        rows = [
+            (track.id, self.truncate(track.title), self.truncate(track.channel),
+             track.duration_string)
+            for track in tracks
+        ]
+        table = tabulate(rows, headers=["id", "title", "channel", "duration"],
+                        tablefmt="rounded_outline", disable_numparse=True)
+        self._pages[key] = table
+        if len(self._pages) > self.cached_pages:
+            self._pages.popitem(last=False)
+        return table
+
+
+    def _check_fresh(self, catalog: TrackCatalog) -> None:
+        """Drops every cached page if the catalog has changed since they were rendered"""
+        if catalog is not self._catalog or catalog.version != self._version:
+            logger.info("Library changed, invalidating rendered pages")
+            self._catalog = catalog
+            self._version = catalog.version
+            self._matches.clear()
+            self._pages.clear()
+
+
+    def _match_count(self, catalog: TrackCatalog, library_filter: LibraryFilter) -> int:
+        """Returns how many tracks a filter matches"""
+        if library_filter == LibraryFilter():
+            return len(catalog)
+        return len(self._filtered(catalog, library_filter))
+
+
+    def _filtered(self, catalog: TrackCatalog, library_filter: LibraryFilter) -> list[Track]:
+        """Returns (and memoises) the tracks matching a filter
+
+        Channel listings keep catalog order; duration-only listings are shortest first."""
+        matches = self._matches.get(library_filter)
+        if matches is not None:
+            return matches
+
+        candidates: list[Track] | None = None
+        if library_filter.channel is not None:
+            channel = library_filter.channel
+            if channel not in catalog.channels():
+                # fall back to a case-insensitive match against the (short) channel list
+                folded = channel.casefold()
+                channel = next(
+                    (c for c in catalog.channels() if c.casefold() == folded), channel)
+            candidates = catalog.by_channel(channel)
+        if library_filter.shortest is not None or library_filter.longest is not None:
+            shortest = library_filter.shortest or 0
+            longest = library_filter.longest if library_filter.longest is not None else 1 << 62
+            if candidates is None:
+                candidates = catalog.duration_between(shortest, longest)
+            else:
+                candidates = [t for t in candidates if shortest <= t.duration <= longest]
+
+        self._matches[library_filter] = candidates
+        return candidates
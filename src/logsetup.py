@@ -0,0 +1,166 @@
+"""Logging pipeline for Chester"""
+# src/logsetup.py
+
+# first-party imports
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+# size at which the log file is rotated, overridable with CHESTER_LOG_MAX_MB
+DEFAULT_LOG_MAX_MB = 10
+# rotated files kept alongside the live one, overridable with CHESTER_LOG_BACKUPS
+DEFAULT_LOG_BACKUPS = 5
+# per-logger levels, overridable with CHESTER_LOG_LEVELS, e.g. "chester=DEBUG,discord=WARNING"
+DEFAULT_LOG_LEVELS = "root=INFO,discord=INFO"
+# each distinct INFO/DEBUG message may be logged this many times per window before
+# further repeats are dropped, overridable with CHESTER_LOG_BURST
+DEFAULT_LOG_BURST = 20
+LOG_BURST_WINDOW_SECONDS = 10.0
+STREAM_FORMAT = "%(levelname)s:%(name)s:%(message)s"
+# attributes every LogRecord has; anything else was passed through `extra`
+STANDARD_RECORD_FIELDS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime"
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including any `extra` fields"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Drops repeats of the same INFO/DEBUG message beyond `burst` per window
+
+    Records are keyed by logger and unformatted message, so a hot-path message logged
+    with different arguments still counts as one message. Warnings and errors always
+    pass. The first record after a suppressed run carries a `suppressed` count. Expired
+    windows are swept once per window, so messages that stop recurring are forgotten."""
+    def __init__(self, burst: int, window: float = LOG_BURST_WINDOW_SECONDS) -> None:
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._windows: dict[tuple[str, str], list] = {}
+        self._next_sweep = time.monotonic() + window
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.burst <= 0:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state is not None else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+    def _sweep(self, now: float) -> None:
+        """Forgets expired windows; caller holds the lock
+
+        Windows that suppressed anything are kept for one more window, so a repeat soon
+        after can still report the count."""
+        self._windows = {
+            key: state for key, state in self._windows.items()
+            if now - state[0] < self.window * (2 if state[2] else 1)
+        }
+        self._next_sweep = now + self.window
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps exceptions and `extra` fields separate from the message
+
+    The stock handler merges everything into one pre-formatted string, which would
+    leave the JSON formatter on the other side of the queue nothing to structure."""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(spec: str) -> dict[str, int]:
+    """Parses "name=LEVEL,..." into logger levels; "root" names the root logger
+
+    Raises ValueError for malformed entries or unknown level names."""
+    levels = {}
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        name, sep, level = entry.partition("=")
+        level_number = logging.getLevelName(level.strip().upper())
+        if not sep or not name.strip() or not isinstance(level_number, int):
+            raise ValueError(f"Invalid log level setting {entry!r}")
+        levels[name.strip()] = level_number
+    return levels
+
+
+def setup_logging(path: str) -> logging.handlers.QueueListener:
+    """Routes all logging through a queue to a background writer thread
+
+    Callers only pay for putting a record on the queue; the listener thread formats it,
+    writes JSON lines to a size-rotated file at `path` and plain text to stderr.
+    Returns the started listener, which should be stopped on shutdown to flush it."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=int(os.environ.get("CHESTER_LOG_MAX_MB", DEFAULT_LOG_MAX_MB)) * 1024 * 1024,
+        backupCount=int(os.environ.get("CHESTER_LOG_BACKUPS", DEFAULT_LOG_BACKUPS)),
+        encoding="utf8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(STREAM_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(
+        RateLimitFilter(int(os.environ.get("CHESTER_LOG_BURST", DEFAULT_LOG_BURST))))
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, stream_handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    levels = parse_levels(os.environ.get("CHESTER_LOG_LEVELS", DEFAULT_LOG_LEVELS))
+    root.setLevel(levels.pop("root", logging.INFO))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    listener.start()
+    return listener
@@ -0,0 +1,245 @@
+"""Runtime performance metrics for Chester"""
+# src/metrics.py
+
+# first-party imports
+import bisect
+import math
+import os
+import threading
+from typing import Callable, Iterable
+
+# latency buckets in seconds, from sub-millisecond up to multi-second commands
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.04, 0.08, 0.16, 0.32, 0.64, 1.28, 2.56, 5.12
+)
+LabelValues = tuple[str, ...]
+
+
+def escape_label(value: str) -> str:
+    """Escapes a label value for the Prometheus text format"""
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    """Renders a {name="value",...} label set, or an empty string if there are no labels"""
+    pairs = [f'{name}="{escape_label(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    """Renders a sample value the way Prometheus expects"""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing count"""
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Adds to the counter"""
+        self.value += amount
+
+
+class Gauge:
+    """Value that can go up and down"""
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        """Sets the gauge"""
+        self.value = value
+
+
+class Histogram:
+    """Cumulative-bucket histogram
+
+    Observations come from audio player threads as well as the event loop; increments
+    are not locked, so under heavy contention a count may occasionally be lost. That
+    keeps observe() cheap enough to call for every 20ms frame."""
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1) # the last slot is the +Inf bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Records one observation"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def count_above(self, threshold: float) -> int:
+        """Returns how many observations fell in buckets entirely above the threshold"""
+        return sum(self.counts[bisect.bisect_right(self.buckets, threshold):])
+
+    def quantile(self, q: float) -> float | None:
+        """Estimates the q-quantile by interpolating within the bucket that contains it"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class MetricFamily:
+    """A named metric with zero or more labels, rendered as one Prometheus family"""
+    def __init__(
+            self,
+            kind: str,
+            name: str,
+            documentation: str,
+            label_names: tuple[str, ...],
+            factory: Callable[[], Counter | Gauge | Histogram],
+            function: Callable[[], float | dict[LabelValues, float]] | None = None
+        ) -> None:
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.function = function
+        self._factory = factory
+        self._children: dict[LabelValues, Counter | Gauge | Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> Counter | Gauge | Histogram:
+        """Returns the child metric for a set of label values, creating it if needed"""
+        if len(values) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._factory())
+        return child
+
+    def children(self) -> dict[LabelValues, Counter | Gauge | Histogram]:
+        """Returns a snapshot of every labelled child"""
+        with self._lock:
+            return dict(self._children)
+
+    def render(self) -> list[str]:
+        """Returns the Prometheus text-format lines for this family"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        if self.function is not None:
+            values = self.function()
+            if not isinstance(values, dict):
+                values = {(): values}
+            for label_values, value in values.items():
+                labels = format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}{labels} {format_value(value)}")
+            return lines
+
+        for label_values, child in sorted(self.children().items()):
+            if isinstance(child, Histogram):
+                cumulative = 0
+                bounds = [format_value(b) for b in child.buckets] + ["+Inf"]
+                for bound, bucket_count in zip(bounds, child.counts):
+                    cumulative += bucket_count
+                    labels = format_labels(self.label_names + ("le",), label_values + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}_sum{labels} {format_value(child.sum)}")
+                lines.append(f"{self.name}_count{labels} {child.count}")
+            else:
+                labels = format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}{labels} {format_value(child.value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metric families that can be rendered in the Prometheus text format
+
+    Unlabelled metrics are returned directly by the registration methods; labelled ones
+    return their family, whose labels() gives the per-label-set metric."""
+    def __init__(self) -> None:
+        self._families: dict[str, MetricFamily] = {}
+
+    def counter(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        """Registers a counter"""
+        return self._register("counter", name, documentation, labels, Counter)
+
+    def gauge(
+            self,
+            name: str,
+            documentation: str,
+            labels: tuple[str, ...] = (),
+            function: Callable[[], float | dict[LabelValues, float]] | None = None
+        ):
+        """Registers a gauge, optionally computed by `function` each time it is rendered"""
+        return self._register("gauge", name, documentation, labels, Gauge, function)
+
+    def histogram(
+            self,
+            name: str,
+            documentation: str,
+            labels: tuple[str, ...] = (),
+            buckets: Iterable[float] = LATENCY_BUCKETS
+        ):
+        """Registers a histogram"""
+        buckets = tuple(buckets)
+        return self._register(
+            "histogram", name, documentation, labels, lambda: Histogram(buckets))
+
+    def family(self, name: str) -> MetricFamily:
+        """Returns a registered family by name"""
+        return self._families[name]
+
+    def render_prometheus(self) -> str:
+        """Renders every family in the Prometheus text exposition format"""
+        lines = []
+        for family in self._families.values():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, kind, name, documentation, labels, factory, function=None):
+        """Creates a family and returns it, or its only child if it has no labels"""
+        if name in self._families:
+            raise ValueError(f"Metric {name} is already registered")
+        family = MetricFamily(kind, name, documentation, tuple(labels), factory, function)
+        self._families[name] = family
+        if labels or function is not None:
+            return family
+        return family.labels()
+
+
+def child_process_stats(executable: str) -> list[list[str]] | None:
+    """Returns the /proc stat fields of this process's live children running an executable
+
+    Each entry holds the fields after the command name, so index 1 is the parent PID and
+    11 and 12 the user and system CPU ticks. Returns None where /proc is missing."""
+    if not os.path.isdir("/proc"):
+        return None
+    parent = str(os.getpid())
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r", encoding="utf-8") as file_handle:
+                stat = file_handle.read()
+        except OSError:
+            continue
+        # the command name is parenthesised and may contain spaces, so split after it
+        name = stat[stat.find("(") + 1:stat.rfind(")")]
+        fields = stat[stat.rfind(")") + 2:].split()
+        if name == executable and len(fields) > 1 and fields[1] == parent:
+            children.append(fields)
+    return children
+
+
+def count_child_processes(executable: str) -> int | None:
+    """Counts this process's live children running the given executable
+
+    Reads /proc, so it sees every ffmpeg we spawn (playback, ingest or yt-dlp
+    postprocessing) without hooking each call site. Returns None where /proc is missing."""
+    children = child_process_stats(executable)
+    return None if children is None else len(children)
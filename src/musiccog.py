@@ -4,60 +4,175 @@
 # first-party imports
 import logging
 import os
-import asyncio
 import glob
 import json
-from typing import Any
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable
 from collections import defaultdict
-from math import floor
 
-# third-party imports
-import pandas as pd
-import yt_dlp
+# third-party imports; yt_dlp and tabulate are slow to import, so they are imported
+# where they are first used rather than here
 import discord
-from discord.ext import commands
-from tabulate import tabulate
-
-class AudioSourceTracked(discord.AudioSource):
-    """Class stolen from https://www.reddit.com/r/Discord_Bots/comments/q9jl5b/how_to_make_discordpy_bot_display_current_song/"""
-    def __init__(self, source: discord.AudioSource, already_elapsed: int = 0):
-        self._source = source
-        self.count_20ms = 0
-        self.already_elapsed = already_elapsed
-
-    def read(self) -> bytes:
-        data = self._source.read()
-        if data:
-            self.count_20ms += 1
-        return data
-
-    @property
-    def progress(self) -> int:
-        """Returns the progress of the tracked audio source in seconds"""
-        return self.already_elapsed + floor(self.count_20ms * 0.02) # count_20ms * 20ms
+from discord.ext import commands, tasks
+
+# local imports
+from downloads import BatchProgress, DownloadQueue, is_playlist_url
+from libraryindex import LibraryIndex
+from catalog import Track, TrackCatalog
+from audio import (
+    OPUS_FRAME_MS,
+    AudioSourceTracked,
+    OggOpusSource,
+    PacketSource,
+    frames_to_seconds,
+    load_opus_packets,
+    load_seek_index,
+    parse_timestamp,
+    ingest_audio,
+    seconds_to_frames
+)
+from framecache import FrameCache
+from breakstore import DEFAULT_SCOPE, BreakRegistry
+from librarypages import LibraryFilter, LibraryPages, parse_library_args
+from metrics import MetricsRegistry, count_child_processes
+from startup import STARTUP
+from session import VoiceSession
+from integrity import LibraryScanner
+from storage import DEFAULT_AUDIO_BUDGET_MB, AudioStore, youtube_url
+from broadcast import BroadcastHub
+from urlcache import DEFAULT_FAILURE_TTL_SECONDS, UrlCache
+
+logger = logging.getLogger("chester.musiccog")
+
+# default number of downloads allowed to run at once, overridable with CHESTER_MAX_DOWNLOADS
+DEFAULT_MAX_DOWNLOADS = 2
+# most tracks a single `>download` may queue, including expanded playlists
+DOWNLOAD_BATCH_LIMIT = 500
+LIBRARY_INDEX_PATH = "library/config/library.sqlite3"
+MANIFEST_PATH = "library/config/manifest.json"
+URL_CACHE_PATH = "library/config/urls.json"
+QUARANTINE_DIR = "library/quarantine"
+# problems listed by `>verify`; the rest are summarised to stay inside a message
+VERIFY_REPORT_LIMIT = 15
+# start opening the next queued track this long before the current one ends
+PREFETCH_SECONDS = 10
+# frames read ahead into a prefetched source
+PREBUFFER_FRAMES = 50
+# number of upcoming tracks listed by `>queue`
+QUEUE_DISPLAY_LIMIT = 15
+# number of rows shown by `>search`
+SEARCH_RESULTS = 10
+# seconds a `>library` message keeps responding to its page buttons
+LIBRARY_VIEW_TIMEOUT = 180
+# default memory budget for looped/break track frames, overridable with CHESTER_FRAME_CACHE_MB
+DEFAULT_FRAME_CACHE_MB = 256
+# seconds a voice connection may sit silent before it is disconnected,
+# overridable with CHESTER_IDLE_TIMEOUT
+DEFAULT_IDLE_TIMEOUT = 300
+IDLE_CHECK_SECONDS = 30
+# Prometheus text file rewritten periodically, overridable with CHESTER_METRICS_FILE
+# (set it empty to disable); point node_exporter's textfile collector at it
+DEFAULT_METRICS_FILE = "logs/metrics.prom"
+METRICS_WRITE_SECONDS = 15
+# frame lateness buckets in seconds; anything past one 20ms frame is audible jitter risk
+FRAME_LATENESS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.04, 0.08, 0.16, 0.32)
+# how often recorded play times are written to the library index
+PLAY_TIME_FLUSH_SECONDS = 60
+
+class LibraryView(discord.ui.View):
+    """Previous/next buttons for paging through a `>library` listing"""
+    def __init__(
+            self,
+            cog: "MusicCog",
+            author: discord.abc.User,
+            library_filter: LibraryFilter,
+            page: int
+        ) -> None:
+        super().__init__(timeout=LIBRARY_VIEW_TIMEOUT)
+        self.cog = cog
+        self.author = author
+        self.library_filter = library_filter
+        self.page = page
+        self.message: discord.Message | None = None
+
+    def render(self) -> str:
+        """Returns the message content for the current page, updating button states"""
+        page_count = self.cog.library_pages.page_count(self.cog.library, self.library_filter)
+        self.page = max(0, min(self.page, page_count - 1))
+        table = self.cog.library_pages.render(self.cog.library, self.library_filter, self.page)
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= page_count - 1
+        description = self.library_filter.describe()
+        heading = f"Available library ({description})" if description else "Available library"
+        return (
+            f"{self.author.mention} {heading}, page {self.page + 1}/{page_count}:\n"
+            f"```{table}```"
+        )
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """Only lets the member who asked for the listing page through it"""
+        if interaction.user.id == self.author.id:
+            return True
+        await interaction.response.send_message(
+            "Only the person who ran this `>library` can page through it; run your own.",
+            ephemeral=True)
+        return False
+
+    async def _turn(self, interaction: discord.Interaction, step: int) -> None:
+        """Moves by `step` pages and redraws the message"""
+        self.page += step
+        await interaction.response.edit_message(content=self.render(), view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, _: discord.ui.Button) -> None:
+        """Shows the previous page"""
+        await self._turn(interaction, -1)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, _: discord.ui.Button) -> None:
+        """Shows the next page"""
+        await self._turn(interaction, 1)
+
+    async def on_timeout(self) -> None:
+        if self.message is not None:
+            await self.message.edit(view=None)
+
 
 class MusicCog(commands.Cog):
     """Class to handle all audio/music functionality in Chester"""
     def __init__(self, bot: commands.Bot) -> None:
-        logging.info("Instantiating music cog")
+        logger.info("Instantiating music cog")
         self.bot: commands.Bot = bot
-        self.metadata_columns: list[str] = [
-            "id",
-            "title",
-            "channel",
-            "upload_date",
-            "duration_string"
-        ]
-        self.load_library()        # load the library of downloaded songs
+        self.setup_metrics()
+        # persisted index so start-up only re-parses metadata that changed
+        self.index = LibraryIndex(
+            LIBRARY_INDEX_PATH, "library/metadata", self.get_track_filepath)
+        # keeps audio within CHESTER_AUDIO_BUDGET_MB by evicting least recently played tracks
+        self.storage = AudioStore(
+            self.index,
+            self.get_audio_filepaths,
+            int(os.environ.get("CHESTER_AUDIO_BUDGET_MB", DEFAULT_AUDIO_BUDGET_MB)) * 1024 * 1024
+        )
+        # running re-downloads of evicted tracks by ID, referenced until they finish
+        self.restores: dict[str, asyncio.Task] = {}
+        # cross-checks metadata against audio; CHESTER_VERIFY_ON_START=check|repair runs it
+        # before the library is first loaded
+        self.scanner = LibraryScanner(
+            "library/metadata", "library/audio", MANIFEST_PATH, QUARANTINE_DIR)
+        self.verify_on_start = os.environ.get("CHESTER_VERIFY_ON_START", "").lower()
+        # the library is loaded by warm_up() once the cog is added; commands wait on ready
+        self.library = TrackCatalog()
+        self.ready = asyncio.Event()
+        self.warm_up_task: asyncio.Task | None = None
         self.max_column_width = 30 # set the max column width for library printing
-        # dict tracking break mode for each channel
-        self.break_mode: dict[str, bool] = {}
-        # dict tracking the saved track for each channel
-        self.saved_track: dict[str, dict[str, str]] = {}
-        # dict tracking loop mode for each channel
-        self.loop_enabled: dict[str, bool] = defaultdict(bool)
-        # dict tracking events per channel for play-overwrite behaviour
-        self.play_block_event: dict[str, asyncio.Event] = defaultdict(asyncio.Event)
+        self.library_pages = LibraryPages(self.truncate)
+        # playback state per guild voice connection, dropped when the connection ends
+        self.sessions: dict[int, VoiceSession] = {}
+        # seconds a connection may sit silent before it is closed (0 disables)
+        self.idle_timeout = float(os.environ.get("CHESTER_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT))
         self.ydl_options: dict[str, Any] = {
             'format': 'm4a/bestaudio/best',
             'postprocessors': [{
@@ -75,73 +190,464 @@ class MusicCog(commands.Cog):
             }
         }
         self.breakpath = "library/config/break.json"
-        logging.info("Finished instantiation of music cog")
+        # break registrations live in memory; disk writes are debounced and atomic
+        self.breaks = BreakRegistry(self.breakpath)
+        # worker processes for loudness analysis, transcoding and seek indexing; one per
+        # core by default, overridable with CHESTER_INGEST_WORKERS. Spawned rather than
+        # forked, since forking a process with running threads can deadlock the child
+        self.ingest_pool = ProcessPoolExecutor(
+            max_workers=int(os.environ.get("CHESTER_INGEST_WORKERS", os.cpu_count() or 1)),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        # worker pool for downloads so yt-dlp never runs on the event loop; URLs of tracks
+        # already in the library are answered from the URL cache without extraction
+        self.downloads = DownloadQueue(
+            self.download_m4a,
+            max_concurrent=int(os.environ.get("CHESTER_MAX_DOWNLOADS", DEFAULT_MAX_DOWNLOADS)),
+            postprocess_func=self.ingest_track,
+            url_cache=UrlCache(
+                URL_CACHE_PATH,
+                float(os.environ.get("CHESTER_DOWNLOAD_FAILURE_TTL", DEFAULT_FAILURE_TTL_SECONDS))
+            ),
+            available_func=self.has_audio
+        )
+        # encoded frames of looped and break tracks, so replays don't touch disk or ffmpeg
+        self.frame_cache = FrameCache(
+            int(os.environ.get("CHESTER_FRAME_CACHE_MB", DEFAULT_FRAME_CACHE_MB)) * 1024 * 1024
+        )
+        # one decoder per (track, offset window), shared by every guild listening to it
+        self.broadcasts = BroadcastHub(self.open_decoder)
+        self.metrics_path = os.environ.get("CHESTER_METRICS_FILE", DEFAULT_METRICS_FILE)
+        logger.info("Finished instantiation of music cog")
+
+
+    def setup_metrics(self) -> None:
+        """Registers the cog's runtime metrics"""
+        self.metrics = MetricsRegistry()
+        self.command_latency = self.metrics.histogram(
+            "chester_command_latency_seconds", "Time taken to run each command", ("command",))
+        self.frame_lateness = self.metrics.histogram(
+            "chester_frame_lateness_seconds",
+            "How late each 20ms audio frame read returned against its deadline",
+            buckets=FRAME_LATENESS_BUCKETS)
+        self.library_load_seconds = self.metrics.gauge(
+            "chester_library_load_seconds", "Duration of the most recent library load")
+        self.metrics.gauge(
+            "chester_library_tracks", "Tracks in the library",
+            function=lambda: len(self.library))
+        self.metrics.gauge(
+            "chester_ffmpeg_processes", "Live ffmpeg subprocesses",
+            function=lambda: count_child_processes("ffmpeg") or 0)
+        self.metrics.gauge(
+            "chester_voice_sessions", "Connected voice sessions per guild", ("guild",),
+            function=self.voice_sessions)
+        self.metrics.gauge(
+            "chester_session_objects", "Voice session state objects held by the cog",
+            function=lambda: len(self.sessions))
+        self.metrics.gauge(
+            "chester_downloads_pending", "Downloads queued or running",
+            function=lambda: self.downloads.pending)
+        self.metrics.gauge(
+            "chester_audio_evicted_tracks", "Tracks whose audio was evicted to fit the budget",
+            function=lambda: len(self.storage.evicted_ids()))
+        for field in ("streams", "listeners"):
+            self.metrics.gauge(
+                f"chester_broadcast_{field}", f"Shared decoder {field}",
+                function=lambda field=field: self.broadcasts.stats()[field])
+        for field in ("hits", "misses", "evictions", "bytes"):
+            self.metrics.gauge(
+                f"chester_frame_cache_{field}", f"Frame cache {field}",
+                function=lambda field=field: self.frame_cache.stats()[field])
+
+
+    def voice_sessions(self) -> dict[tuple[str], float]:
+        """Returns the number of connected voice clients per guild ID"""
+        sessions: dict[tuple[str], float] = defaultdict(float)
+        for voice in self.bot.voice_clients:
+            if voice.is_connected():
+                sessions[(str(voice.guild.id),)] += 1
+        return dict(sessions)
 
 
     def truncate(self, s: str) -> str:
         """Trims the given string s to the set max column width"""
         if not isinstance(s, str):
             raise TypeError(f"Given argument {s} is not a string")
-        logging.info("Truncating string %s", s)
+        logger.debug("Truncating string %s", s)
         return s if len(s) <= self.max_column_width else s[:self.max_column_width-1] + "…"
 
 
     def load_library(self) -> None:
-        """Loads the metadata of the local library, checking for mismatches"""
-        logging.info("Loading local music library metadata")
-        df = pd.DataFrame(columns=self.metadata_columns)
-        metadata_files = glob.glob('library/metadata/*.json')
-        logging.info("Found metadata files: %s", metadata_files)
-        metadata = []
-        for file_path in metadata_files:
-            logging.info("Handling metadata file %s", file_path)
-            track_id = file_path.split("/")[2].split(".")[0]
-            if not os.path.isfile(self.get_track_filepath(track_id)):
-                logging.error("Metadata file %s has no matching audio file", file_path)
-                raise FileNotFoundError(
-                    f"Expected to find a matching audio file for metadata file {file_path}")
-
-            with open(file_path, 'r', encoding="utf-8") as file_handle:
-                logging.info("Opened file %s", file_path)
-                file_data = file_handle.read()
-                metadata_dict = json.loads(file_data)
-                logging.info("Data loaded: %s", metadata_dict)
-                file_data_list = []
-                for key in self.metadata_columns:
-                    file_data_list.append(metadata_dict[key])
-                logging.info("Flattened to list: %s", file_data_list)
-                metadata.append(file_data_list)
-
-        logging.info("Metadata list: %s", metadata)
-        df = pd.DataFrame(metadata, columns=self.metadata_columns)
-        logging.info("Metadata dataframe:\n%s", df)
-        self.library = df
-        logging.info("Set self.library to above metadata dataframe")
+        """Loads the metadata of the local library from the persisted index
+
+        Only metadata files changed since the last index refresh are re-parsed."""
+        logger.info("Loading local music library metadata")
+        start = time.perf_counter()
+        tracks = self.index.refresh()
+        self.library = TrackCatalog(Track.from_dict(track) for track in tracks)
+        self.library_load_seconds.set(time.perf_counter() - start)
+        if self.index.skipped:
+            logger.warning(
+                "Left %s broken track(s) out of the library; run >verify repair to quarantine "
+                "them: %s", len(self.index.skipped), self.index.skipped)
+        logger.info("Set self.library to catalog of %s indexed tracks", len(self.library))
+
+
+    def add_to_library(self, track_id: str) -> None:
+        """Indexes a single (newly downloaded) track without reloading the whole library"""
+        self.add_tracks_to_library([track_id])
+
+
+    def add_tracks_to_library(self, track_ids: list[str]) -> None:
+        """Indexes a batch of newly downloaded tracks in one index transaction
+
+        Tracks whose files are gone by now, e.g. quarantined by a verify that ran during
+        the download, are logged and left out."""
+        logger.info("Adding %s track(s) to the library", len(track_ids))
+        present = [
+            track_id for track_id in track_ids
+            if os.path.isfile(self.index.metadata_path(track_id))
+            and os.path.isfile(self.get_track_filepath(track_id))
+        ]
+        missing = [track_id for track_id in track_ids if track_id not in present]
+        if missing:
+            logger.error(
+                "Not adding %s track(s) whose files disappeared: %s", len(missing), missing)
+        try:
+            tracks = self.index.update_tracks(present)
+        except FileNotFoundError:
+            # a file vanished after the check above; index the rest one at a time
+            tracks = []
+            for track_id in present:
+                try:
+                    tracks.extend(self.index.update_tracks([track_id]))
+                except FileNotFoundError as e:
+                    logger.error("Not adding %s, whose files disappeared: %s", track_id, e)
+        self.storage.mark_restored([track["id"] for track in tracks])
+        for track in tracks:
+            self.library.add(Track.from_dict(track))
+            self.frame_cache.invalidate(track["id"])
+
+
+    async def enforce_audio_budget(self, keep: set[str] = frozenset()) -> None:
+        """Evicts least recently played audio if the library is over its disk budget
+
+        Break tracks, anything a voice session is playing or has queued, and `keep` are
+        never evicted."""
+        pinned = self.breaks.track_ids() | keep
+        for session in self.sessions.values():
+            pinned |= session.track_ids()
+        evicted = await asyncio.to_thread(
+            self.storage.enforce, [track.id for track in self.library], pinned)
+        for track_id in evicted:
+            self.frame_cache.invalidate(track_id)
+
+
+    async def restore_track(self, track_id: str) -> None:
+        """Downloads the audio of an evicted track again and re-indexes it"""
+        logger.info("Restoring evicted track %s", track_id)
+        await self.downloads.download(youtube_url(track_id))
+        self.add_to_library(track_id)
+        if self.storage.is_evicted(track_id):
+            raise RuntimeError("its files disappeared before it could be added back")
+        await self.enforce_audio_budget(keep={track_id})
+
+
+    def schedule_restore(self, track_id: str) -> asyncio.Task:
+        """Starts downloading an evicted track again, or returns the download already running
+
+        Failures are logged here, so nobody has to await the task; those who do still
+        see the exception."""
+        task = self.restores.get(track_id)
+        if task is not None:
+            return task
+
+        def _finished(done: asyncio.Task) -> None:
+            self.restores.pop(track_id, None)
+            if not done.cancelled() and done.exception() is not None:
+                logger.error("Failed to restore evicted track %s: %s", track_id, done.exception())
+
+        task = self.restores[track_id] = asyncio.create_task(self.restore_track(track_id))
+        task.add_done_callback(_finished)
+        return task
+
+
+    def play_after_restore(
+            self,
+            voice: discord.VoiceClient,
+            track_id: str,
+            start_frame: int = 0
+        ) -> None:
+        """Starts an evicted track once its re-download finishes; runs on the event loop
+
+        If the download fails the queue moves on to the next track. If something else was
+        started in the meantime, the track goes back to the front of the queue instead."""
+        guild_id = voice.guild.id
+        session = self.get_session(guild_id)
+        logger.info("Waiting for evicted track %s to be restored in guild %s", track_id, guild_id)
+
+        def _restored(_: asyncio.Task) -> None:
+            if self.sessions.get(guild_id) is not session or not voice.is_connected():
+                return
+            if voice.is_playing() or voice.is_paused():
+                session.queue.appendleft(track_id)
+            elif self.storage.is_evicted(track_id):
+                logger.error("Skipping %s, which could not be downloaded again", track_id)
+                self.play_next_queued(voice, session)
+            else:
+                self.play_track(voice, track_id, start_frame)
+
+        self.schedule_restore(track_id).add_done_callback(_restored)
+
+
+    async def ensure_audio(self, ctx: commands.Context, track: Track) -> bool:
+        """Waits for an evicted track to be downloaded again; returns whether it has audio"""
+        if not self.storage.is_evicted(track.id):
+            return True
+        await ctx.send(f"Fetching `{track.title}` again, it will start in a moment...")
+        try:
+            # shielded, since other commands may be waiting on the same download
+            await asyncio.shield(self.schedule_restore(track.id))
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logger.error("Failed to restore evicted track %s: %s", track.id, e)
+            await ctx.send(f"{ctx.author.mention} Could not download `{track.title}` again: {e}")
+            return False
+        return True
+
+
+    def has_audio(self, track_id: str) -> bool:
+        """Returns whether a track is in the library with its audio on disk"""
+        return track_id in self.library and not self.storage.is_evicted(track_id)
 
 
     def get_title_from_id(self, given_id: str) -> str:
         """Gets the track title for a given metadata ID"""
-        logging.info("Getting title for id %s", given_id)
-        found = self.library.loc[self.library['id'] == given_id]["title"]
-        if len(found) == 0:
+        logger.debug("Getting title for id %s", given_id)
+        track = self.library.get(given_id)
+        if track is None:
             raise ValueError(f"The requested ID {given_id} was not found in the library")
-        found_title = found.iloc[0]
-        logging.info("Found title for id %s: %s", given_id, found_title)
+        found_title = track.title
+        logger.debug("Found title for id %s: %s", given_id, found_title)
         return found_title
 
 
-    def download_m4a(self, url: str) -> str:
-        """Downloads the m4a track for a given youtube URL"""
-        logging.info("Downloading m4a track for URL %s", url)
-        with yt_dlp.YoutubeDL(self.ydl_options) as ydl:
-            logging.info("Extracting info without download")
+    async def cog_load(self) -> None:
+        """Starts background tasks once the cog is added to the bot"""
+        self.warm_up_task = asyncio.create_task(self.warm_up())
+        if self.metrics_path:
+            self.write_metrics.start()
+        if self.idle_timeout > 0:
+            self.reap_idle_sessions.start()
+        self.flush_play_times.start()
+
+
+    async def warm_up(self) -> None:
+        """Loads the library in a worker thread, then lets waiting commands run"""
+        try:
+            if self.verify_on_start in ("check", "repair"):
+                with STARTUP.phase("integrity scan"):
+                    report = await asyncio.to_thread(
+                        self.scanner.scan,
+                        self.verify_on_start == "repair",
+                        self.storage.evicted_ids())
+                logger.info("Start-up integrity scan:\n%s", report.summary())
+            with STARTUP.phase("library warm-up"):
+                await asyncio.to_thread(self.load_library)
+            await self.enforce_audio_budget()
+        except Exception: # pylint: disable=broad-except
+            logger.exception("Library warm-up failed; starting with an empty library")
+        finally:
+            self.ready.set()
+            STARTUP.mark("library ready")
+
+
+    async def cog_unload(self) -> None:
+        """Cleans up background workers when the cog is removed"""
+        self.write_metrics.cancel()
+        self.reap_idle_sessions.cancel()
+        self.flush_play_times.cancel()
+        for guild_id in list(self.sessions):
+            self.end_session(guild_id)
+        if self.warm_up_task is not None:
+            # the index is in use until the warm-up thread finishes
+            await asyncio.gather(self.warm_up_task, return_exceptions=True)
+        self.downloads.shutdown()
+        self.ingest_pool.shutdown(wait=False, cancel_futures=True)
+        self.storage.flush()
+        self.index.close()
+        await self.breaks.flush()
+        logger.info("Frame cache stats at unload: %s", self.frame_cache.stats())
+
+
+    async def cog_before_invoke(self, ctx: commands.Context) -> None:
+        ctx.chester_started = time.perf_counter()
+        if not self.ready.is_set():
+            await ctx.send(f"{ctx.author.mention} Still loading the library, one moment...")
+            await self.ready.wait()
+
+
+    async def cog_after_invoke(self, ctx: commands.Context) -> None:
+        # runs even when the command raised, so failures are timed too
+        started = getattr(ctx, "chester_started", None)
+        if started is not None:
+            self.command_latency.labels(ctx.command.qualified_name).observe(
+                time.perf_counter() - started)
+
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(
+            self,
+            member: discord.Member,
+            before: discord.VoiceState,
+            after: discord.VoiceState
+        ) -> None:
+        """Tears down a guild's session when the bot leaves voice, however that happens"""
+        if member.id == self.bot.user.id and before.channel is not None and after.channel is None:
+            logger.info("Left voice in guild %s", member.guild.id)
+            self.end_session(member.guild.id)
+
+
+    @tasks.loop(seconds=IDLE_CHECK_SECONDS)
+    async def reap_idle_sessions(self) -> None:
+        """Disconnects voice connections that have been silent for longer than the timeout"""
+        for voice in list(self.bot.voice_clients):
+            session = self.get_session(voice.guild.id)
+            if voice.is_playing():
+                session.touch()
+            elif session.idle_seconds() > self.idle_timeout:
+                logger.info("Disconnecting idle voice session in guild %s", voice.guild.id)
+                self.end_session(voice.guild.id)
+                await voice.disconnect()
+        # sessions whose connection is already gone (e.g. a failed connect) go too
+        connected = {voice.guild.id for voice in self.bot.voice_clients}
+        for guild_id, session in list(self.sessions.items()):
+            if guild_id not in connected and session.idle_seconds() > self.idle_timeout:
+                self.end_session(guild_id)
+
+
+    @tasks.loop(seconds=PLAY_TIME_FLUSH_SECONDS)
+    async def flush_play_times(self) -> None:
+        """Persists recently recorded play times from a worker thread"""
+        await asyncio.to_thread(self.storage.flush)
+
+
+    @tasks.loop(seconds=METRICS_WRITE_SECONDS)
+    async def write_metrics(self) -> None:
+        """Renders and rewrites the Prometheus text file from a worker thread
+
+        Rendering samples the ffmpeg count by reading /proc, so it stays off the loop too."""
+        try:
+            await asyncio.to_thread(
+                lambda: self.write_metrics_file(self.metrics.render_prometheus()))
+        except OSError as e:
+            logger.error("Failed to write metrics to %s: %s", self.metrics_path, e)
+
+
+    def write_metrics_file(self, text: str) -> None:
+        """Atomically replaces the metrics file so scrapers never see a partial write"""
+        os.makedirs(os.path.dirname(self.metrics_path) or ".", exist_ok=True)
+        with open(self.metrics_path + ".part", "w", encoding="utf-8") as write_handle:
+            write_handle.write(text)
+        os.replace(self.metrics_path + ".part", self.metrics_path)
+
+
+    def format_stats(self) -> str:
+        """Returns a human-readable summary of the runtime metrics; blocking"""
+        def _ms(seconds: float | None) -> str:
+            return "n/a" if seconds is None else f"{seconds * 1000:.1f}ms"
+
+        ffmpeg = count_child_processes("ffmpeg")
+        sessions = self.voice_sessions()
+        cache = self.frame_cache.stats()
+        broadcasts = self.broadcasts.stats()
+        lateness = self.frame_lateness
+        lines = [
+            f"Library: {len(self.library)} tracks, "
+            f"loaded in {_ms(self.library_load_seconds.value)}",
+            f"Voice sessions: {int(sum(sessions.values()))} across {len(sessions)} guilds",
+            f"ffmpeg processes: {'n/a' if ffmpeg is None else ffmpeg}",
+            f"Downloads pending: {self.downloads.pending}",
+            f"Shared decoders: {broadcasts['streams']} serving {broadcasts['listeners']} listeners",
+            f"Frame cache: {cache['hits']} hits, {cache['misses']} misses, "
+            f"{cache['evictions']} evictions, {cache['bytes'] / 1048576:.1f}/"
+            f"{cache['budget_bytes'] / 1048576:.0f}MB",
+            f"Frame lateness over {lateness.count} frames: p50 {_ms(lateness.quantile(0.5))}, "
+            f"p95 {_ms(lateness.quantile(0.95))}, p99 {_ms(lateness.quantile(0.99))}, "
+            f"{lateness.count_above(OPUS_FRAME_MS / 1000)} over a frame late",
+            "Command latency (count, p50, p95):"
+        ]
+        for (name,), histogram in sorted(self.metrics.family(
+                "chester_command_latency_seconds").children().items()):
+            lines.append(
+                f"  {name}: {histogram.count}, {_ms(histogram.quantile(0.5))}, "
+                f"{_ms(histogram.quantile(0.95))}")
+        return "\n".join(lines)
+
+
+    async def ingest_track(self, track_id: str) -> None:
+        """Runs loudness analysis and Opus transcoding for a track in the ingest pool
+
+        Failure is not fatal; playback falls back to transcoding the m4a on the fly."""
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            self.ingest_pool,
+            ingest_audio,
+            self.get_track_filepath(track_id),
+            self.get_opus_filepath(track_id),
+            self.get_seek_index_filepath(track_id)
+        )
+        for error in result.errors:
+            logger.error("Ingest of %s: %s", track_id, error)
+        if result.metadata:
+            self.update_metadata(track_id, **result.metadata)
+
+
+    def list_playlist_urls(self, url: str) -> list[str]:
+        """Returns the video URLs of a playlist without downloading anything
+
+        Blocking; a single flat extraction, so it costs one request however long the
+        playlist is."""
+        import yt_dlp # pylint: disable=import-outside-toplevel
+        logger.info("Listing playlist %s", url)
+        with yt_dlp.YoutubeDL({"extract_flat": "in_playlist", "quiet": True}) as ydl:
+            info = ydl.extract_info(url, download=False)
+        return [
+            entry.get("url") or entry["id"]
+            for entry in info.get("entries") or ()
+            if entry # unavailable videos are listed as None
+        ]
+
+
+    def update_metadata(self, track_id: str, **fields: float) -> None:
+        """Adds fields to a track's metadata JSON, replacing the file atomically"""
+        metadata_path = self.index.metadata_path(track_id)
+        with open(metadata_path, "r", encoding="utf-8") as read_handle:
+            metadata = json.load(read_handle)
+        metadata.update(fields)
+        with open(metadata_path + ".part", "w", encoding="utf-8") as write_handle:
+            json.dump(metadata, write_handle, ensure_ascii=False)
+        os.replace(metadata_path + ".part", metadata_path)
+
+
+    def download_m4a(self, url: str, progress_hook: Callable[[dict], None] | None = None) -> str:
+        """Downloads the m4a track for a given youtube URL
+
+        Blocking; run through self.downloads rather than calling directly from a command."""
+        import yt_dlp # pylint: disable=import-outside-toplevel
+        logger.info("Downloading m4a track for URL %s", url)
+        options = dict(self.ydl_options)
+        if progress_hook is not None:
+            options["progress_hooks"] = [progress_hook]
+            options["postprocessor_hooks"] = [progress_hook]
+        with yt_dlp.YoutubeDL(options) as ydl:
+            logger.info("Extracting info without download")
             info = ydl.extract_info(url, download=False)
-            logging.info("Processing info & triggering download")
+            logger.info("Processing info & triggering download")
             ydl.process_info(info) # triggers download
-            logging.info("Getting track ID of downloaded content")
+            logger.info("Getting track ID of downloaded content")
             return ydl.prepare_filename(info).split("/")[2]
 
-        logging.error("File download failed for URL %s", url)
+        logger.error("File download failed for URL %s", url)
         raise RuntimeError(f"The file download failed for URL {url}")
 
 
@@ -150,18 +656,243 @@ class MusicCog(commands.Cog):
         return f"library/audio/{track_id}.m4a"
 
 
+    def get_audio_filepaths(self, track_id: str) -> list[str]:
+        """Returns every audio filepath kept for a given ID, the m4a first"""
+        return [
+            self.get_track_filepath(track_id),
+            self.get_opus_filepath(track_id),
+            self.get_seek_index_filepath(track_id)
+        ]
+
+
+    def get_opus_filepath(self, track_id: str) -> str:
+        """Returns the filepath of the pre-encoded Opus rendition for a given ID"""
+        return f"library/audio/{track_id}.opus"
+
+
+    def get_seek_index_filepath(self, track_id: str) -> str:
+        """Returns the filepath of the Opus rendition's seek index for a given ID"""
+        return f"library/audio/{track_id}.seek"
+
+
+    def open_audio_source(
+            self,
+            track_id: str,
+            start_frame: int = 0,
+            cached: bool = False
+        ) -> AudioSourceTracked:
+        """Opens a tracked audio source for a given ID, starting at the given 20ms frame
+
+        Uses the Opus rendition when one exists so playback needs no PCM transcoding, and
+        serves it from the frame cache when it is already there. With `cached`, a missing
+        track is loaded into the cache; use this for tracks that are about to be replayed,
+        e.g. loops and breaks. Otherwise the track is decoded through the broadcast hub, so
+        guilds playing the same track at nearly the same point share one decoder."""
+        source: discord.AudioSource | None = None
+        opus_path = self.get_opus_filepath(track_id)
+        if os.path.isfile(opus_path):
+            frames = None
+            # one-shot plays never fill the cache, so they only look it up when the track
+            # is already there; otherwise each would count as a miss
+            if cached or track_id in self.frame_cache:
+                frames = self.frame_cache.get(track_id)
+            if frames is None and cached:
+                frames = self.frame_cache.put(track_id, load_opus_packets(opus_path))
+            if frames is not None:
+                source = PacketSource(frames, start_frame)
+        if source is None:
+            source = self.broadcasts.subscribe(track_id, start_frame)
+        tracked = AudioSourceTracked(source, start_frame=start_frame)
+        tracked.frame_timer = self.frame_lateness
+        return tracked
+
+
+    def open_decoder(self, track_id: str, start_frame: int = 0) -> discord.AudioSource:
+        """Opens the underlying reader for a track: its Opus rendition, else ffmpeg
+
+        Called by the broadcast hub when no running stream can be shared."""
+        opus_path = self.get_opus_filepath(track_id)
+        if os.path.isfile(opus_path):
+            return OggOpusSource(
+                opus_path,
+                start_frame,
+                load_seek_index(self.get_seek_index_filepath(track_id))
+            )
+        logger.info("No Opus rendition for %s, transcoding on the fly", track_id)
+        options = []
+        if start_frame:
+            options.append(f"-ss {frames_to_seconds(start_frame):.3f}")
+        track = self.library.get(track_id)
+        if track is not None and track.gain_db:
+            options.append(f"-af volume={track.gain_db}dB")
+        return discord.FFmpegPCMAudio(
+            self.get_track_filepath(track_id), options=" ".join(options) or None)
+
+
+    def start_source(self, voice: discord.VoiceClient, source: AudioSourceTracked) -> None:
+        """Plays a source, swapping it in place if the voice client already has a player
+
+        Swapping keeps the running audio player (and its after callback), so transitions
+        made by commands never go through _after_playback."""
+        if voice.is_playing() or voice.is_paused():
+            # the player thread may be mid-read on the old source, so rather than closing
+            # it here the new source closes it from that thread on its first read
+            source.replace(voice.source)
+            voice.source = source
+            if voice.is_paused():
+                voice.resume()
+        else:
+            voice.play(source, after=lambda error: self._after_playback(voice, error))
+
+
+    def get_session(self, guild_id: int) -> VoiceSession:
+        """Returns the voice session for a guild, creating it on first use"""
+        session = self.sessions.get(guild_id)
+        if session is None:
+            session = self.sessions[guild_id] = VoiceSession(guild_id)
+        return session
+
+
+    def end_session(self, guild_id: int) -> None:
+        """Tears down a guild's voice session, if it has one"""
+        session = self.sessions.pop(guild_id, None)
+        if session is not None:
+            session.close()
+
+
+    def play_track(self, voice: discord.VoiceClient, track_id: str, start_frame: int = 0) -> None:
+        """Starts (or switches to) a track and arms prefetching of the next queued track
+
+        A track whose audio was evicted is started by play_after_restore once it has been
+        downloaded again, rather than opening files that aren't there."""
+        if self.storage.is_evicted(track_id):
+            self.bot.loop.call_soon_threadsafe(
+                self.play_after_restore, voice, track_id, start_frame)
+            return
+        guild_id = voice.guild.id
+        session = self.get_session(guild_id)
+        session.saved_track = {"track_id": track_id}
+        session.touch()
+        self.storage.record_play(track_id)
+        source = session.take_prefetched(track_id) if start_frame == 0 else None
+        if source is None:
+            source = self.open_audio_source(track_id, start_frame, cached=session.loop_enabled)
+        else:
+            logger.info("Starting %s from its prefetched source", track_id)
+        track = self.library.get(track_id)
+        if track is not None and track.duration:
+            source.near_end_frame = seconds_to_frames(max(0, track.duration - PREFETCH_SECONDS))
+            source.on_near_end = lambda: self.bot.loop.call_soon_threadsafe(
+                self.schedule_prefetch, guild_id)
+        self.start_source(voice, source)
+
+
+    def schedule_prefetch(self, guild_id: int) -> None:
+        """Prefetches a guild's next queued track in a worker thread"""
+        self.bot.loop.run_in_executor(None, self.prefetch_next, guild_id)
+
+
+    def prefetch_next(self, guild_id: int) -> None:
+        """Opens and pre-buffers the next queued track so the transition is gapless
+
+        Blocking; runs in a worker thread so neither the event loop nor the audio player
+        thread waits on file opens or ffmpeg start-up."""
+        session = self.sessions.get(guild_id)
+        if session is None or not session.queue or session.loop_enabled or session.break_mode:
+            return
+        track_id = session.queue[0]
+        if session.prefetched is not None and session.prefetched[0] == track_id:
+            return
+        if track_id not in self.library:
+            # dropped from the queue when its turn comes
+            return
+        if self.storage.is_evicted(track_id):
+            # still being downloaded again; it is opened when its turn comes
+            return
+        logger.info("Prefetching next track %s for guild %s", track_id, guild_id)
+        try:
+            source = self.open_audio_source(track_id)
+            source.prebuffer(PREBUFFER_FRAMES)
+        except (OSError, discord.ClientException) as e:
+            logger.error("Failed to prefetch %s: %s", track_id, e)
+            return
+        if self.sessions.get(guild_id) is not session:
+            # the connection ended while the source was opening
+            source.cleanup()
+            return
+        session.discard_prefetched()
+        session.prefetched = (track_id, source)
+
+
+    def _after_playback(self, voice: discord.VoiceClient, error: Exception | None) -> None:
+        """Picks what plays next when a source finishes; runs in the audio player thread"""
+        guild_id = voice.guild.id
+        if error is not None:
+            logger.error("Playback error in guild %s: %s", guild_id, error)
+        session = self.sessions.get(guild_id)
+        if session is None or not voice.is_connected():
+            return
+        skipped = session.skip_requested
+        session.skip_requested = False
+
+        if session.break_mode:
+            logger.info("Track has ended but break still enabled, looping break track")
+            self.start_source(voice, self.open_audio_source(session.break_track, cached=True))
+            return
+
+        current = session.saved_track
+        logger.debug("Checking loop flag for guild %s", guild_id)
+        if (current is not None and session.loop_enabled and not skipped
+                and current["track_id"] in self.library):
+            logger.info("Loop flag is set True, replaying track")
+            self.start_source(voice, self.open_audio_source(current["track_id"], cached=True))
+            return
+
+        self.play_next_queued(voice, session)
+
+
+    def play_next_queued(self, voice: discord.VoiceClient, session: VoiceSession) -> None:
+        """Plays the next queued track still in the library, if there is one
+
+        Queued tracks can leave the library after they were queued, e.g. when >verify
+        quarantines them; those are dropped from the queue instead of played."""
+        while session.queue:
+            track_id = session.queue.popleft()
+            if track_id in self.library:
+                logger.info("Advancing to the next queued track")
+                self.play_track(voice, track_id)
+                return
+            logger.warning("Skipping queued track %s, which is no longer in the library", track_id)
+
+
+    def resolve_track(self, query: str) -> Track | None:
+        """Returns the track with the given ID, else the best title/channel search match"""
+        query = query.strip()
+        track = self.library.get(query)
+        if track is None:
+            matches = self.library.search(query, limit=1)
+            track = matches[0] if matches else None
+            logger.info("Resolved search %r to %s", query, track)
+        return track
+
+
+    def get_break_scope(self, ctx: commands.Context) -> str:
+        """Returns the break registry scope for the guild a command was sent from"""
+        return str(ctx.guild.id) if ctx.guild else DEFAULT_SCOPE
+
+
     async def check_args_ok(self, ctx: commands.Context, args: tuple):
         """Checks if the given arguments to a command are valid"""
         if len(args) == 0:
             await ctx.send(
                 f"{ctx.message.author.mention} Please provide an argument to the command")
-            logging.error("No argument was provided to the command")
+            logger.error("No argument was provided to the command")
             return False
         return True
 
     async def join_caller_channel(self, ctx: commands.Context) -> discord.VoiceProtocol | None:
         """Joins the calling user's voice channel, if it exists"""
-        logging.info("Joining the calling user's channel")
+        logger.info("Joining the calling user's channel")
         channel = await self.get_caller_channel(ctx)
         if channel is None:
             return None
@@ -171,19 +902,19 @@ class MusicCog(commands.Cog):
             await voice.move_to(channel)
         else:
             voice = await channel.connect()
-        logging.info("Joined target user voice channel")
+        logger.info("Joined target user voice channel")
         return voice
 
     async def get_caller_channel(self, ctx: commands.Context) -> discord.VoiceChannel | None:
         """Gets the caller's voice channel object"""
-        logging.info("Getting the calling user's channel")
+        logger.debug("Getting the calling user's channel")
         try:
             channel = ctx.author.voice.channel
-            logging.info("Target user channel found")
+            logger.debug("Target user channel found")
             return channel
         except AttributeError:
             await ctx.send(f"{ctx.author.mention} You are not in a voice channel.")
-            logging.info("The caller is not in a voice channel")
+            logger.info("The caller is not in a voice channel")
             return None
 
 
@@ -191,31 +922,19 @@ class MusicCog(commands.Cog):
     @commands.command(name="registerbreak")
     async def cmd_registerbreak(self, ctx: commands.Context, *args: tuple) -> None:
         """Command to register a break track per user"""
-        logging.info("Registering break track")
+        logger.info("Registering break track")
         if not await self.check_args_ok(ctx, args):
             return
         given_id = "".join(args[0])
-        logging.info("Given break id: %s", given_id)
-        if given_id not in self.library["id"].values:
+        logger.info("Given break id: %s", given_id)
+        if given_id not in self.library:
             await ctx.send(
                 f"{ctx.author.mention} The ID `{given_id}` does not correspond to a known track.")
             return
         track_title = self.get_title_from_id(given_id)
-        logging.info("Given track ID %s corresponds to track titled %s", given_id, track_title)
-
-
-        if os.path.exists(self.breakpath):
-            logging.info("Break file record exists, opening")
-            with open(self.breakpath, "r", encoding="utf-8") as read_handle:
-                read_data = read_handle.read()
-                break_dict = json.loads(read_data)
-        else:
-            logging.info("Break record does not exist, starting new")
-            break_dict = {}
-        logging.info("Break record contents: %s", break_dict)
-
+        logger.info("Given track ID %s corresponds to track titled %s", given_id, track_title)
 
-        logging.info(
+        logger.info(
             "Adding track %s with id %s as user %s's break music (user id: %s)",
             track_title,
             given_id,
@@ -223,224 +942,436 @@ class MusicCog(commands.Cog):
             ctx.author.id
         )
 
-        break_dict[str(ctx.author.id)] = given_id
-        logging.info("Writing out updated break record")
-        with open(self.breakpath, "w+", encoding="utf-8") as write_handle:
-            json.dump(break_dict, write_handle, ensure_ascii=False)
+        self.breaks.register(self.get_break_scope(ctx), str(ctx.author.id), given_id)
+        if self.storage.is_evicted(given_id):
+            # break tracks are pinned, so fetch it back now rather than mid-break
+            self.schedule_restore(given_id)
 
         await ctx.send(f"Registered {ctx.author.mention}'s break music as `{track_title}`")
-        logging.info("Added track to break record")
+        logger.info("Added track to break record")
 
     # library
     @commands.command(name="library")
-    async def cmd_library(self, ctx: commands.Context) -> None:
-        """Command to display the available library"""
-        logging.info("Displaying available tracks in library")
-        library_display = self.library.copy()
-        library_display["duration"] = library_display["duration_string"]
-        library_display = library_display.drop(
-            labels=[
-                "upload_date",
-                "duration_string",
-                "channel",
-                "duration"
-            ], axis="columns"
-        )
-        library_display["title"] = library_display["title"].apply(self.truncate)
-        table = tabulate(library_display, headers="keys",
-                        tablefmt="rounded_outline",
-                        showindex=False)
+    async def cmd_library(self, ctx: commands.Context, *args: str) -> None:
+        """Command to display the available library
 
-        msg = (
-            f"{ctx.author.mention} Available library:\n"
-            f"```{table}```"
-        )
-        await ctx.send(msg)
-        logging.info("Sent message for library display")
+        Usage: `>library [page] [channel=NAME] [min=M:SS] [max=M:SS]`"""
+        logger.info("Displaying available tracks in library")
+        try:
+            library_filter, page = parse_library_args(args)
+        except ValueError:
+            await ctx.send(
+                f"{ctx.author.mention} Usage: `>library [page] [channel=NAME] "
+                "[min=M:SS] [max=M:SS]`")
+            return
+        view = LibraryView(self, ctx.author, library_filter, page)
+        view.message = await ctx.send(view.render(), view=view)
+        logger.info("Sent message for library display")
 
     # loop
     @commands.command(name="loop")
     async def cmd_loop(self, ctx: commands.Context) -> None:
         """Global loop toggle"""
-        logging.info("Toggling loop switch")
+        logger.info("Toggling loop switch")
         channel: discord.VoiceChannel = await self.get_caller_channel(ctx)
         if channel is None:
             return
-        self.loop_enabled[channel.id] = not self.loop_enabled[channel.id]
-        status = "enabled" if self.loop_enabled[channel.id] else "disabled"
-        logging.info("Toggle value to %s", self.loop_enabled[channel.id])
+        session = self.get_session(channel.guild.id)
+        session.loop_enabled = not session.loop_enabled
+        status = "enabled" if session.loop_enabled else "disabled"
+        logger.info("Toggle value to %s", session.loop_enabled)
         await ctx.send(f"{ctx.author.mention} Loop {status}")
 
     # download
     @commands.command(name="download")
-    async def cmd_download(self, ctx: commands.Context, *args: tuple) -> None:
-        """Downloads a track given a URL in the argument"""
+    async def cmd_download(self, ctx: commands.Context, *args: str) -> None:
+        """Downloads one or more tracks or playlists given their URLs"""
         if not await self.check_args_ok(ctx, args):
             return
-        logging.info(ctx.message.content)
-        link = "".join(args[0])
-        logging.info(link)
-        await ctx.send(
-            f" Attempting to download track at URL `{link}`.")
+        logger.info("Download requested: %s", ctx.message.content)
+        urls = []
         try:
-            track_id = self.download_m4a(link)
-        except RuntimeError as e:
+            for link in dict.fromkeys(args):
+                if is_playlist_url(link):
+                    urls.extend(await asyncio.to_thread(self.list_playlist_urls, link))
+                else:
+                    urls.append(link)
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logger.error("Failed to list playlist: %s", e)
+            await ctx.send(f"{ctx.author.mention} Could not read the playlist: {e}")
+            return
+        urls = list(dict.fromkeys(urls))
+        if len(urls) > DOWNLOAD_BATCH_LIMIT:
             await ctx.send(
-                f"{ctx.message.author.mention} An error occurred while downloading the file.")
-            raise RuntimeError(e) from e
-        self.load_library()
-        track_title = self.get_title_from_id(track_id)
-        await ctx.send(
-            "Successfully downloaded track"
-            + f"`{track_title}` and reloaded the library.")
-        logging.info("Downloaded track %s from URL %s", self.get_title_from_id(track_id), link)
+                f"{ctx.author.mention} Only the first {DOWNLOAD_BATCH_LIMIT} of "
+                f"{len(urls)} tracks will be downloaded.")
+            urls = urls[:DOWNLOAD_BATCH_LIMIT]
+        if not urls:
+            await ctx.send(f"{ctx.author.mention} There is nothing to download.")
+            return
+
+        heading = f"track at URL `{urls[0]}`" if len(urls) == 1 else f"{len(urls)} tracks"
+        status_message = await ctx.send(f" Attempting to download {heading}.")
+
+        async def _report(text: str) -> None:
+            await status_message.edit(content=f"Downloading {heading}: {text}")
+
+        progress = BatchProgress(urls, _report, self.downloads.progress_interval)
+
+        async def _fetch(url: str) -> str:
+            try:
+                track_id = await self.downloads.download(url, on_progress=progress.listener(url))
+            except Exception:
+                await progress.finish(url, succeeded=False)
+                raise
+            await progress.finish(url, succeeded=True)
+            return track_id
+
+        results = await asyncio.gather(*(_fetch(url) for url in urls), return_exceptions=True)
+        track_ids = list(dict.fromkeys(r for r in results if isinstance(r, str)))
+        failed = 0
+        for url, result in zip(urls, results):
+            if isinstance(result, BaseException):
+                failed += 1
+                logger.error("Download of %s failed: %s", url, result)
+        # tracks answered from the URL cache are already indexed
+        new_ids = [track_id for track_id in track_ids if not self.has_audio(track_id)]
+        if new_ids:
+            self.add_tracks_to_library(new_ids)
+            await self.enforce_audio_budget()
+        # anything that could not be indexed after all counts as failed
+        failed += len([track_id for track_id in track_ids if track_id not in self.library])
+        track_ids = [track_id for track_id in track_ids if track_id in self.library]
+
+        if len(urls) == 1:
+            if not track_ids:
+                await ctx.send(
+                    f"{ctx.message.author.mention} An error occurred while downloading the file.")
+                return
+            await ctx.send(
+                "Successfully downloaded track"
+                + f"`{self.get_title_from_id(track_ids[0])}` and added it to the library.")
+        else:
+            await ctx.send(
+                f"{ctx.author.mention} Downloaded {len(track_ids)} track(s) into the library"
+                + (f"; {failed} failed." if failed else "."))
+        logger.info("Downloaded %s of %s requested track(s)", len(track_ids), len(urls))
 
     # hardreset
     @commands.command(name="hardreset")
     async def cmd_hardreset(self, ctx: commands.Context) -> None:
         """Command to reset all data files"""
-        logging.info("Performing hard reset on database")
+        logger.info("Performing hard reset on database")
         await ctx.send(f"{ctx.message.author.mention} Attempting to hard reset library...")
-        library_files = glob.glob('library/audio/*.m4a')
+        library_files = (
+            glob.glob('library/audio/*.m4a')
+            + glob.glob('library/audio/*.opus')
+            + glob.glob('library/audio/*.seek')
+        )
         metadata_files = glob.glob('library/metadata/*.json')
         config_files = glob.glob('library/config/*.json')
         all_files = library_files + metadata_files + config_files
         for file_path in all_files:
             try:
-                logging.info("Removing file at %s", file_path)
+                logger.info("Removing file at %s", file_path)
                 os.remove(file_path)
             except RuntimeError as e:
-                logging.error("Failed to delete %s. Reason: %s", file_path, e)
+                logger.error("Failed to delete %s. Reason: %s", file_path, e)
+        self.storage.reset()
+        # nothing queued or held by a session exists any more
+        for session in self.sessions.values():
+            session.forget_tracks()
+        # otherwise the next save would write the wiped tracks' URLs straight back
+        self.downloads.url_cache.clear()
+        self.load_library()
+        self.frame_cache.clear()
+        self.breaks.clear()
         await ctx.send(f"{ctx.message.author.mention} Hard reset complete")
-        logging.info("Hard reset complete")
+        logger.info("Hard reset complete")
 
     # stop
     @commands.command(name="stop")
     async def cmd_stop(self, ctx: commands.Context) -> None:
         """Stops active playback"""
-        logging.info("Stopping playback")
+        logger.info("Stopping playback")
         voice = ctx.voice_client
         if voice and voice.is_connected():
+            # drop the session first so the player's after callback has nothing left to play
+            self.end_session(voice.guild.id)
             await voice.disconnect()
             await ctx.send(f"{ctx.message.author.mention} Left the channel.")
-            logging.info("Disconnected from voice")
-            if self.break_mode.get(voice.channel.id):
-                self.break_mode.pop(voice.channel.id)
-                self.saved_track.pop(voice.channel.id)
-                logging.info("Cleaned up active break after stop")
-            self.loop_enabled[voice.channel.id] = False
+            logger.info("Disconnected from voice")
         else:
             await ctx.send(f"{ctx.message.author.mention} There is no active track.")
-            logging.info("There is no channel to disconnect from.")
-        logging.info("Stopped playback")
+            logger.info("There is no channel to disconnect from.")
+        logger.info("Stopped playback")
 
     # play
     @commands.command(name="play")
     async def cmd_play(self, ctx: commands.Context, *args: tuple) -> None:
-        """Plays a track given an ID"""
+        """Plays a track given an ID, or the best search match for some text"""
         if not await self.check_args_ok(ctx, args):
             return
+        track = self.resolve_track(" ".join(args))
+        if track is None:
+            await ctx.send(f"{ctx.author.mention} No track in the library matches that.")
+            return
 
-        # 1. Join or move to the user's voice channel
-        logging.info("Playing track")
+        # 1. Join or move to the user's voice channel, fetching evicted audio meanwhile
+        logger.info("Playing track")
         voice: discord.VoiceProtocol = await self.join_caller_channel(ctx)
         if voice is None:
-            logging.error("Caller was not in a voice channel when break command was called")
-            return
-        if voice.is_playing():
-            logging.info("Track is already playing; stopping playback to be replaced")
-            voice.pause()
-
-        # 2. Build track path & stash for resume
-        track_id   = "".join(list(args[0]))
-        track_file = self.get_track_filepath(track_id)
-        self.saved_track[voice.channel.id] = {"track_id": track_id}
-
-        def _after_play(_):
-            logging.info("Checking loop flag for channel %s", voice.channel.id)
-            if self.loop_enabled[voice.channel.id]:
-                logging.info("Loop flag is set True, replaying track")
-                voice.play(AudioSourceTracked(discord.FFmpegPCMAudio(track_file)), after=_after_play)
-            else:
-                logging.info("Loop flag is set False, explicitly stopping voice playback")
-                voice.stop()
+            logger.error("Caller was not in a voice channel when break command was called")
+            return
+        if not await self.ensure_audio(ctx, track):
+            return
+        session = self.get_session(voice.guild.id)
+        if session.break_mode:
+            logger.info("Play requested during a break; ending break mode")
+            session.end_break()
+
+        # 2. Start playback, replacing whatever is playing
+        self.play_track(voice, track.id)
+        await ctx.send(f"Now playing `{track.title}`")
+
+    # queue
+    @commands.command(name="queue")
+    async def cmd_queue(self, ctx: commands.Context, *args: str) -> None:
+        """Adds a track (ID or search text) to the channel's queue, or shows the queue"""
+        if not args:
+            await self.show_queue(ctx)
+            return
+        track = self.resolve_track(" ".join(args))
+        if track is None:
+            await ctx.send(f"{ctx.author.mention} No track in the library matches that.")
+            return
+        voice = await self.join_caller_channel(ctx)
+        if voice is None:
+            return
+        if not (voice.is_playing() or voice.is_paused()):
+            if not await self.ensure_audio(ctx, track):
+                return
+            self.play_track(voice, track.id)
+            await ctx.send(f"Now playing `{track.title}`")
+            return
+
+        queue = self.get_session(voice.guild.id).queue
+        queue.append(track.id)
+        if self.storage.is_evicted(track.id):
+            # fetch it back while the tracks ahead of it play
+            self.schedule_restore(track.id)
+        source = voice.source
+        if len(queue) == 1 and isinstance(source, AudioSourceTracked) and source.near_end_fired:
+            # the current track is already in its final seconds, so prefetch right away
+            self.schedule_prefetch(voice.guild.id)
+        logger.info("Queued %s at position %s", track.id, len(queue))
+        await ctx.send(f"Queued `{track.title}` at position {len(queue)}")
 
-        # start playback
-        source = AudioSourceTracked(discord.FFmpegPCMAudio(track_file))
-        voice.play(source, after=_after_play)
-        await ctx.send(f"Now playing `{self.get_title_from_id(track_id)}`")
+    async def show_queue(self, ctx: commands.Context) -> None:
+        """Sends the current track and upcoming queue for the bot's voice channel"""
+        voice = ctx.voice_client
+        if not voice or not voice.is_connected():
+            await ctx.send(f"{ctx.author.mention} There is no active track.")
+            return
+        session = self.get_session(voice.guild.id)
+        lines = []
+        current = session.saved_track
+        track = self.library.get(current["track_id"]) if current is not None else None
+        if track is not None and (voice.is_playing() or voice.is_paused()):
+            lines.append(f"Now playing: {self.truncate(track.title)}")
+        # tracks quarantined or wiped since they were queued are skipped when reached
+        queue = [track_id for track_id in session.queue if track_id in self.library]
+        for position, track_id in enumerate(queue[:QUEUE_DISPLAY_LIMIT], start=1):
+            lines.append(f"{position}. {self.truncate(self.get_title_from_id(track_id))}")
+        if len(queue) > QUEUE_DISPLAY_LIMIT:
+            lines.append(f"...and {len(queue) - QUEUE_DISPLAY_LIMIT} more")
+        if not queue:
+            lines.append("The queue is empty.")
+        body = "\n".join(lines)
+        await ctx.send(f"{ctx.author.mention}\n```{body}```")
+
+    # skip
+    @commands.command(name="skip")
+    async def cmd_skip(self, ctx: commands.Context) -> None:
+        """Skips to the next queued track, ignoring loop mode"""
+        voice = ctx.voice_client
+        if not voice or not (voice.is_playing() or voice.is_paused()):
+            await ctx.send(f"{ctx.author.mention} There is no active track.")
+            return
+        session = self.get_session(voice.guild.id)
+        if session.break_mode:
+            await ctx.send(f"{ctx.author.mention} Skipping is not available during a break.")
+            return
+        logger.info("Skipping current track in guild %s", voice.guild.id)
+        session.skip_requested = True
+        voice.stop() # the after callback advances to the next queued track
+        if session.queue:
+            await ctx.send(f"{ctx.author.mention} Skipped to the next track.")
+        else:
+            await ctx.send(f"{ctx.author.mention} Skipped; the queue is now empty.")
+
+    # clear
+    @commands.command(name="clear")
+    async def cmd_clear(self, ctx: commands.Context) -> None:
+        """Empties the queue for the bot's voice channel"""
+        voice = ctx.voice_client
+        if not voice or not voice.is_connected():
+            await ctx.send(f"{ctx.author.mention} There is no queue to clear.")
+            return
+        session = self.get_session(voice.guild.id)
+        session.queue.clear()
+        session.discard_prefetched()
+        await ctx.send(f"{ctx.author.mention} Cleared the queue.")
+
+    # search
+    @commands.command(name="search")
+    async def cmd_search(self, ctx: commands.Context, *args: str) -> None:
+        """Lists the library tracks whose title or channel best match the given text"""
+        if not await self.check_args_ok(ctx, args):
+            return
+        query = " ".join(args)
+        logger.info("Searching library for %r", query)
+        matches = self.library.search(query, limit=SEARCH_RESULTS)
+        if not matches:
+            await ctx.send(f"{ctx.author.mention} No track in the library matches `{query}`.")
+            return
+        from tabulate import tabulate # pylint: disable=import-outside-toplevel
+        table = tabulate(
+            [(t.id, self.truncate(t.title), self.truncate(t.channel)) for t in matches],
+            headers=["id", "title", "channel"],
+            tablefmt="rounded_outline",
+            disable_numparse=True
+        )
+        await ctx.send(f"{ctx.author.mention} Best matches for `{query}`:\n```{table}```")
+
+    # seek
+    @commands.command(name="seek")
+    async def cmd_seek(self, ctx: commands.Context, *args: tuple) -> None:
+        """Jumps the current track to a timestamp such as 83, 1:23 or 1:23.5"""
+        if not await self.check_args_ok(ctx, args):
+            return
+        voice = ctx.voice_client
+        if not voice or not (voice.is_playing() or voice.is_paused()):
+            await ctx.send(f"{ctx.author.mention} There is no active track.")
+            return
+        session = self.get_session(voice.guild.id)
+        if session.break_mode:
+            await ctx.send(f"{ctx.author.mention} Seeking is not available during a break.")
+            return
+        if session.saved_track is None:
+            await ctx.send(f"{ctx.author.mention} There is no active track.")
+            return
+        try:
+            target = parse_timestamp("".join(args[0]))
+        except ValueError:
+            await ctx.send(
+                f"{ctx.author.mention} Please give a timestamp like `83`, `1:23` or `1:23.5`.")
+            return
+
+        track_id = session.saved_track["track_id"]
+        logger.info("Seeking track %s to %s seconds", track_id, target)
+        self.play_track(voice, track_id, start_frame=seconds_to_frames(target))
+        await ctx.send(f"Jumped to {target:.2f} seconds in `{self.get_title_from_id(track_id)}`")
 
     # break
     @commands.command(name="break")
     async def cmd_break(self, ctx: commands.Context):
         """Command to quickly switch to registered break music"""
         user_id = str(ctx.author.id)
-        logging.info("Switching to break music for user %s", ctx.author.display_name)
+        logger.info("Switching to break music for user %s", ctx.author.display_name)
 
-        # 1. load break.json
-        logging.info("Loading break configuration file")
-        with open("library/config/break.json", "r", encoding="utf-8") as f:
-            break_dict = json.load(f)
-        track_id = break_dict.get(user_id)
+        # 1. look up the registered break track
+        track_id = self.breaks.get(self.get_break_scope(ctx), user_id)
         if not track_id:
             await ctx.send(
                 f"{ctx.author.mention} Please register a break track to enable this command.")
             return
-        break_file = self.get_track_filepath(track_id)
+        break_id = track_id
 
-        logging.info("Getting voice client for target user channel")
+        logger.info("Getting voice client for target user channel")
         voice = await self.join_caller_channel(ctx)
         if voice is None:
-            logging.error("Caller was not in a voice channel when break command was called")
+            logger.error("Caller was not in a voice channel when break command was called")
             return
 
-        def _loop_break(_):
-            if self.break_mode.get(voice.channel.id):
-                logging.info("Track has ended but break still enabled, looping break track")
-                voice.play(AudioSourceTracked(discord.FFmpegPCMAudio(break_file)), after=_loop_break)
+        session = self.get_session(voice.guild.id)
+        session.touch()
 
         # toggle on/off logic
-        if self.break_mode.get(voice.channel.id):
+        if session.break_mode:
             # → turn OFF
-            self.break_mode[voice.channel.id] = False
-            voice.stop()
+            session.end_break()
 
-            original_track_info = self.saved_track.get(voice.channel.id)
-            if original_track_info:
-                logging.info("Found original track info: \n%s", original_track_info)
+            original_track_info = session.saved_track
+            if original_track_info and "frame" in original_track_info:
+                logger.info("Found original track info: \n%s", original_track_info)
                 track_id = original_track_info["track_id"]
                 track_title = self.get_title_from_id(track_id)
-                time_elapsed = original_track_info["timestamp"]
-
-                source = AudioSourceTracked(
-                    source = discord.FFmpegPCMAudio(
-                        source  = self.get_track_filepath(track_id),
-                        options = f"-ss {time_elapsed}"
-                    ),
-                    already_elapsed = time_elapsed
-                )
-                voice.play(source, after=lambda e: None)
+                resume_frame = original_track_info["frame"]
+
+                self.play_track(voice, track_id, start_frame=resume_frame)
                 await ctx.send(
-                    f"Resuming previous track `{track_title}` from {time_elapsed} seconds elapsed")
+                    f"Resuming previous track `{track_title}` from "
+                    f"{frames_to_seconds(resume_frame):.2f} seconds elapsed")
             else:
+                voice.stop() # the after callback moves on to the queue, if there is one
                 await ctx.send(
                     f"{ctx.message.author.mention} Ending break with no original track to resume.")
         else:
-            # → turn ON
-            logging.info("Enabling break mode")
-            self.break_mode[voice.channel.id] = True
-            if voice.is_playing():
-                logging.info("Break mode enabled when track playing; writing out timestamp")
-                voice.pause()
-                self.saved_track.get(voice.channel.id)["timestamp"] = voice.source.progress
-                logging.info("Wrote out timestamp %s", self.saved_track.get(voice.channel.id)["timestamp"])
+            # → turn ON, once the break track's audio is on disk
+            break_track = self.library.get(break_id)
+            if break_track is not None and not await self.ensure_audio(ctx, break_track):
+                return
+            logger.info("Enabling break mode")
+            session.break_mode = True
+            session.break_track = break_id
+            if (voice.is_playing() or voice.is_paused()) and session.saved_track is not None:
+                logger.info("Break mode enabled when track playing; writing out position")
+                session.saved_track["frame"] = voice.source.position
+                logger.info("Wrote out frame %s", session.saved_track["frame"])
+            else:
+                session.saved_track = None
+
+            self.start_source(voice, self.open_audio_source(break_id, cached=True))
+            await ctx.send(f"Playing break music `{self.get_title_from_id(break_id)}`")
+
+
+    # verify
+    @commands.command(name="verify")
+    @commands.has_permissions(administrator=True)
+    async def cmd_verify(self, ctx: commands.Context, *args: str) -> None:
+        """Checks the library for missing, orphaned or damaged files (administrators only)
+
+        Usage: `>verify [repair]`; repair moves broken tracks to the quarantine directory."""
+        if args not in ((), ("repair",)):
+            await ctx.send(f"{ctx.author.mention} Usage: `>verify [repair]`")
+            return
+        repair = bool(args)
+        logger.info("Verifying library (repair=%s)", repair)
+        status_message = await ctx.send(f"{ctx.author.mention} Verifying the library...")
+        # a running download may have written its metadata but not yet its audio
+        report = await asyncio.to_thread(
+            self.scanner.scan, repair, self.storage.evicted_ids(), self.downloads.active_keys)
+        if report.quarantined:
+            await asyncio.to_thread(self.load_library)
+            for problem in report.problems:
+                self.frame_cache.invalidate(problem.track_id)
+        await status_message.edit(
+            content=f"{ctx.author.mention}\n```{report.summary(VERIFY_REPORT_LIMIT)}```")
 
-            voice.play(AudioSourceTracked(discord.FFmpegPCMAudio(break_file)), after=_loop_break)
-            await ctx.send(f"Playing break music `{self.get_title_from_id(track_id)}`")
+    # stats
+    @commands.command(name="stats")
+    @commands.has_permissions(administrator=True)
+    async def cmd_stats(self, ctx: commands.Context) -> None:
+        """Shows runtime performance metrics (administrators only)"""
+        logger.info("Reporting runtime metrics")
+        # counting ffmpeg processes reads /proc, so the summary is built off the loop
+        stats = await asyncio.to_thread(self.format_stats)
+        await ctx.send(f"{ctx.author.mention}\n```{stats}```")
 
 
 async def setup(bot: commands.Bot) -> None:
     """Required function for adding a cog to a bot config"""
-    logging.info("Adding cog for music")
+    logger.info("Adding cog for music")
     await bot.add_cog(MusicCog(bot))
-    logging.info("Music cog added")
+    logger.info("Music cog added")
@@ -0,0 +1,83 @@
+"""Fuzzy text search for Chester"""
+# src/search.py
+
+# first-party imports
+import re
+import unicodedata
+from collections import Counter
+
+NON_WORD_PATTERN = re.compile(r"[^\w]+")
+
+
+def normalise(text: str) -> list[str]:
+    """Lowercases, strips accents and splits text into words"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return [word for word in NON_WORD_PATTERN.split(stripped.replace("_", " ")) if word]
+
+
+def trigrams(text: str) -> set[str]:
+    """Returns the set of padded character trigrams of every word in the text"""
+    grams = set()
+    for word in normalise(text):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Inverted index from character trigrams to document IDs
+
+    Documents are ranked by how much of the query's trigram set they contain, so typos
+    and partial words still find close matches; ties go to the document whose own
+    trigram set is most similar overall (Dice coefficient), i.e. the tighter match."""
+    def __init__(self) -> None:
+        self._postings: dict[str, set[str]] = {}
+        self._documents: dict[str, frozenset[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Indexes a document, replacing any previous text for the same ID"""
+        if doc_id in self._documents:
+            self.remove(doc_id)
+        grams = frozenset(trigrams(text))
+        self._documents[doc_id] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(doc_id)
+
+    def remove(self, doc_id: str) -> None:
+        """Removes a document from the index if present"""
+        grams = self._documents.pop(doc_id, frozenset())
+        for gram in grams:
+            posting = self._postings[gram]
+            posting.discard(doc_id)
+            if not posting:
+                del self._postings[gram]
+
+    def query(
+            self,
+            text: str,
+            limit: int = 10,
+            min_coverage: float = 0.5
+        ) -> list[tuple[str, float]]:
+        """Returns up to `limit` (doc ID, coverage) pairs, best first
+
+        Coverage is the fraction of the query's trigrams found in the document."""
+        query_grams = trigrams(text)
+        if not query_grams:
+            return []
+        hits: Counter[str] = Counter()
+        for gram in query_grams:
+            hits.update(self._postings.get(gram, ()))
+        threshold = min_coverage * len(query_grams)
+        ranked = [
+            (shared / len(query_grams),
+             2 * shared / (len(query_grams) + len(self._documents[doc_id])),
+             doc_id)
+            for doc_id, shared in hits.items()
+            if shared >= threshold
+        ]
+        ranked.sort(key=lambda entry: (-entry[0], -entry[1], entry[2]))
+        return [(doc_id, coverage) for coverage, _, doc_id in ranked[:limit]]
@@ -0,0 +1,87 @@
+"""Per-guild voice session state for Chester"""
+# src/session.py
+
+# first-party imports
+import logging
+import time
+from collections import deque
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from audio import AudioSourceTracked
+
+logger = logging.getLogger("chester.session")
+
+
+class VoiceSession:
+    """Playback state for one guild's voice connection
+
+    Owned by the cog from the first command that needs it until the bot leaves the
+    guild's voice channel, when close() releases anything still holding resources."""
+    def __init__(self, guild_id: int) -> None:
+        self.guild_id = guild_id
+        # whether break music is playing, and which track it is
+        self.break_mode = False
+        self.break_track: str | None = None
+        # the track being played, plus the frame to resume from after a break
+        self.saved_track: dict[str, str | int] | None = None
+        self.loop_enabled = False
+        # upcoming track IDs
+        self.queue: deque[str] = deque()
+        # the opened, pre-buffered source for the next queued track
+        self.prefetched: tuple[str, "AudioSourceTracked"] | None = None
+        # set when the current track was skipped, so looping shouldn't replay it
+        self.skip_requested = False
+        self.last_active = time.monotonic()
+
+    def touch(self) -> None:
+        """Marks the session as active now"""
+        self.last_active = time.monotonic()
+
+    def idle_seconds(self) -> float:
+        """Returns how long it has been since the session was last active"""
+        return time.monotonic() - self.last_active
+
+    def track_ids(self) -> set[str]:
+        """Returns the ID of every track the session is playing, holding or has queued"""
+        ids = set(self.queue)
+        if self.saved_track is not None:
+            ids.add(self.saved_track["track_id"])
+        if self.break_track is not None:
+            ids.add(self.break_track)
+        if self.prefetched is not None:
+            ids.add(self.prefetched[0])
+        return ids
+
+    def take_prefetched(self, track_id: str) -> "AudioSourceTracked | None":
+        """Returns the prefetched source if it is for the given track, else discards it"""
+        entry, self.prefetched = self.prefetched, None
+        if entry is None:
+            return None
+        if entry[0] != track_id:
+            entry[1].cleanup()
+            return None
+        return entry[1]
+
+    def discard_prefetched(self) -> None:
+        """Closes and forgets any prefetched source"""
+        entry, self.prefetched = self.prefetched, None
+        if entry is not None:
+            entry[1].cleanup()
+
+    def end_break(self) -> None:
+        """Leaves break mode without touching the saved track"""
+        self.break_mode = False
+        self.break_track = None
+
+    def forget_tracks(self) -> None:
+        """Drops the current, queued, prefetched and break tracks, e.g. after a library wipe"""
+        self.end_break()
+        self.saved_track = None
+        self.queue.clear()
+        self.discard_prefetched()
+
+    def close(self) -> None:
+        """Releases the session's resources; called when the voice connection ends"""
+        logger.info("Closing voice session for guild %s", self.guild_id)
+        self.forget_tracks()
@@ -0,0 +1,76 @@
+"""Start-up timing report for Chester"""
+# src/startup.py
+
+# first-party imports
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+logger = logging.getLogger("chester.startup")
+
+# milestones that must all be reached before the start-up report is logged
+STARTUP_MILESTONES = ("gateway ready", "library ready")
+
+
+def seconds_since_process_start() -> float | None:
+    """Returns how long this process has been running, including interpreter start-up
+
+    Reads /proc, so returns None on platforms without it."""
+    try:
+        with open("/proc/self/stat", "r", encoding="utf-8") as file_handle:
+            stat = file_handle.read()
+        with open("/proc/uptime", "r", encoding="utf-8") as file_handle:
+            uptime = float(file_handle.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    # field 22 (starttime, in clock ticks since boot) counted from after the command name
+    start_ticks = int(stat[stat.rfind(")") + 2:].split()[19])
+    return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+
+
+class StartupTimer:
+    """Records how long each start-up step took and when each milestone was reached
+
+    Times are measured from process start where the platform allows, otherwise from
+    when this module was imported. The report is logged once every milestone is in."""
+    def __init__(self, milestones: tuple[str, ...] = STARTUP_MILESTONES) -> None:
+        self.origin = time.perf_counter() - (seconds_since_process_start() or 0.0)
+        self.phases: dict[str, float] = {}
+        self.milestones: dict[str, float] = {}
+        self.pending = set(milestones)
+        self.reported = False
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Times the body of a with block as a named step"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def mark(self, name: str) -> None:
+        """Records a milestone, logging the report when the last expected one arrives"""
+        if name in self.milestones:
+            return
+        self.milestones[name] = time.perf_counter() - self.origin
+        self.pending.discard(name)
+        if not self.pending and not self.reported:
+            self.reported = True
+            logger.info("Start-up timing:\n%s", self.report())
+
+    def report(self) -> str:
+        """Returns the milestones (since process start) and step durations as a table"""
+        lines = ["milestones (seconds since start):"]
+        for name, seconds in sorted(self.milestones.items(), key=lambda item: item[1]):
+            lines.append(f"  {name:<24}{seconds:8.3f}s")
+        lines.append("steps:")
+        for name, seconds in self.phases.items():
+            lines.append(f"  {name:<24}{seconds:8.3f}s")
+        return "\n".join(lines)
+
+
+# shared timer for the running bot
+STARTUP = StartupTimer()
@@ -0,0 +1,162 @@
+"""Disk-budgeted audio storage for Chester"""
+# src/storage.py
+
+# first-party imports
+import logging
+import os
+import threading
+import time
+from typing import Callable, Iterable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from libraryindex import LibraryIndex
+
+logger = logging.getLogger("chester.storage")
+
+# default disk budget for library audio in MiB, overridable with CHESTER_AUDIO_BUDGET_MB;
+# 0 keeps every file
+DEFAULT_AUDIO_BUDGET_MB = 0
+
+
+def youtube_url(track_id: str) -> str:
+    """Returns the watch URL an evicted track can be downloaded from again"""
+    return f"https://www.youtube.com/watch?v={track_id}"
+
+
+class AudioStore:
+    """Keeps the library's audio files within a disk budget
+
+    Play times are held in memory and written to the library index in batches. When the
+    audio files of the library add up to more than `budget_bytes`, whole tracks are
+    evicted least recently played first; a track that was never played counts from when
+    its audio was downloaded. Evicted tracks keep their metadata, so they stay in the
+    catalog and can be downloaded again when they are next requested."""
+    def __init__(
+            self,
+            index: "LibraryIndex",
+            paths_func: Callable[[str], list[str]],
+            budget_bytes: int
+        ) -> None:
+        if budget_bytes < 0:
+            raise ValueError(f"Audio budget must not be negative, got {budget_bytes}")
+        self.index = index
+        self.paths_func = paths_func
+        self.budget_bytes = budget_bytes
+        self.evictions = 0
+        self._played, self._evicted = index.storage_state()
+        self._unsaved: dict[str, float] = {}
+        # play times are recorded from the event loop and the audio player threads
+        self._lock = threading.Lock()
+
+
+    def record_play(self, track_id: str) -> None:
+        """Marks a track as played now; persisted by the next flush()"""
+        now = time.time()
+        with self._lock:
+            self._played[track_id] = now
+            self._unsaved[track_id] = now
+
+
+    def is_evicted(self, track_id: str) -> bool:
+        """Returns whether a track's audio was evicted and has to be downloaded again"""
+        return track_id in self._evicted
+
+
+    def evicted_ids(self) -> set[str]:
+        """Returns the IDs of every evicted track"""
+        with self._lock:
+            return set(self._evicted)
+
+
+    def mark_restored(self, track_ids: list[str]) -> None:
+        """Records that tracks have audio on disk again"""
+        with self._lock:
+            restored = [track_id for track_id in track_ids if track_id in self._evicted]
+            self._evicted.difference_update(restored)
+        if restored:
+            logger.info("Restored audio for %s evicted track(s)", len(restored))
+            self.index.set_evicted(restored, False)
+
+
+    def flush(self) -> None:
+        """Writes play times recorded since the last flush to the index"""
+        with self._lock:
+            unsaved, self._unsaved = self._unsaved, {}
+        if unsaved:
+            self.index.save_play_times(unsaved)
+
+
+    def reset(self) -> None:
+        """Forgets every play time and eviction, e.g. after the library is wiped"""
+        with self._lock:
+            self._played.clear()
+            self._evicted.clear()
+            self._unsaved.clear()
+        self.index.clear_storage()
+
+
+    def usage(self, track_ids: Iterable[str]) -> dict[str, int]:
+        """Returns the bytes of audio on disk for each of the given tracks"""
+        sizes = {}
+        for track_id in track_ids:
+            size = 0
+            for path in self.paths_func(track_id):
+                try:
+                    size += os.path.getsize(path)
+                except FileNotFoundError:
+                    pass
+            sizes[track_id] = size
+        return sizes
+
+
+    def enforce(self, track_ids: Iterable[str], pinned: set[str]) -> list[str]:
+        """Evicts unpinned tracks, least recently played first, until usage fits the budget
+
+        Blocking; run it in a worker thread. Returns the IDs of the evicted tracks."""
+        self.flush()
+        if self.budget_bytes == 0:
+            return []
+        sizes = self.usage(track_ids)
+        total = sum(sizes.values())
+        if total <= self.budget_bytes:
+            return []
+        candidates = sorted(
+            (track_id for track_id, size in sizes.items() if size and track_id not in pinned),
+            key=self._last_used
+        )
+        evicted = []
+        for track_id in candidates:
+            if total <= self.budget_bytes:
+                break
+            # marked before its files go, so playback never opens one mid-removal
+            with self._lock:
+                self._evicted.add(track_id)
+            for path in self.paths_func(track_id):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= sizes[track_id]
+            evicted.append(track_id)
+        if evicted:
+            self.index.set_evicted(evicted, True)
+            self.evictions += len(evicted)
+            logger.info(
+                "Evicted audio for %s track(s) to fit the %s MiB budget: %s",
+                len(evicted), self.budget_bytes // (1024 * 1024), evicted)
+        if total > self.budget_bytes:
+            logger.warning(
+                "Library audio is %s MiB after eviction, over the %s MiB budget; the rest "
+                "is pinned or playing", total // (1024 * 1024), self.budget_bytes // (1024 * 1024))
+        return evicted
+
+
+    def _last_used(self, track_id: str) -> float:
+        """Returns when a track was last played, else when its audio was downloaded"""
+        played = self._played.get(track_id)
+        if played is not None:
+            return played
+        try:
+            return os.path.getmtime(self.paths_func(track_id)[0])
+        except FileNotFoundError:
+            return 0.0
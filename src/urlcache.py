@@ -0,0 +1,133 @@
+"""URL normalisation and URL-to-track cache for Chester"""
+# src/urlcache.py
+
+# first-party imports
+import logging
+import os
+import json
+import re
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger("chester.urlcache")
+
+YOUTUBE_ID_PATTERN = re.compile(
+    r"(?:[?&]v=|youtu\.be/|shorts/|embed/|live/)([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])")
+# query parameters that only track where a link was shared from
+TRACKING_PARAMS = {"si", "feature", "pp", "fbclid", "gclid", "ref", "ab_channel"}
+# seconds a failed URL is answered from the cache, overridable with CHESTER_DOWNLOAD_FAILURE_TTL
+DEFAULT_FAILURE_TTL_SECONDS = 900
+
+
+def video_id_from_url(url: str) -> str | None:
+    """Returns the YouTube video ID named by a URL, if it names one"""
+    match = YOUTUBE_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+def normalise_url(url: str) -> str:
+    """Returns a canonical form of a URL so equivalent links share a cache entry
+
+    YouTube video links of every form become a plain watch URL; anything else keeps its
+    path, loses tracking parameters and its fragment, and has its query sorted."""
+    url = url.strip()
+    video_id = video_id_from_url(url)
+    if video_id is not None:
+        return f"https://www.youtube.com/watch?v={video_id}"
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        return url
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in TRACKING_PARAMS and not key.startswith("utm_")
+    )
+    host = parts.netloc.lower().removeprefix("www.").removeprefix("m.")
+    return urlunsplit((parts.scheme.lower(), host, parts.path, urlencode(query), ""))
+
+
+class UrlCache:
+    """Persistent map from normalised URLs to the track IDs they were downloaded as
+
+    URLs whose download failed are remembered for `failure_ttl` seconds, so asking for a
+    dead link again fails straight away instead of waiting on another extraction. Changes
+    are written with save(), atomically, from a worker thread."""
+    def __init__(self, path: str, failure_ttl: float = DEFAULT_FAILURE_TTL_SECONDS) -> None:
+        self.path = path
+        self.failure_ttl = failure_ttl
+        self._track_ids: dict[str, str] = {}
+        # normalised URL -> (time the failure expires, error message)
+        self._failures: dict[str, tuple[float, str]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+
+    def track_id(self, url: str) -> str | None:
+        """Returns the track ID a URL resolves to, without touching the network"""
+        return video_id_from_url(url) or self._track_ids.get(normalise_url(url))
+
+
+    def failure(self, url: str) -> str | None:
+        """Returns the error of a recent failed download of a URL, if it hasn't expired"""
+        entry = self._failures.get(normalise_url(url))
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+
+
+    def remember(self, url: str, track_id: str) -> None:
+        """Records the track a URL downloaded as"""
+        key = normalise_url(url)
+        with self._lock:
+            self._track_ids[key] = track_id
+            self._failures.pop(key, None)
+
+
+    def remember_failure(self, url: str, error: str) -> None:
+        """Records that downloading a URL failed"""
+        if self.failure_ttl <= 0:
+            return
+        with self._lock:
+            self._failures[normalise_url(url)] = (time.time() + self.failure_ttl, error)
+
+
+    def clear(self) -> None:
+        """Forgets every URL and failure, e.g. after the library is wiped"""
+        with self._lock:
+            self._track_ids.clear()
+            self._failures.clear()
+
+
+    def save(self) -> None:
+        """Atomically writes the cache, dropping expired failures; blocking"""
+        now = time.time()
+        with self._lock:
+            self._failures = {
+                key: entry for key, entry in self._failures.items() if entry[0] >= now
+            }
+            payload = json.dumps({
+                "track_ids": self._track_ids,
+                "failures": self._failures
+            }, indent=1, sort_keys=True)
+            with open(self.path + ".part", "w", encoding="utf-8") as file_handle:
+                file_handle.write(payload)
+            os.replace(self.path + ".part", self.path)
+
+
+    def _load(self) -> None:
+        """Reads the cache file, starting empty if it is missing or unreadable"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as file_handle:
+                data = json.load(file_handle)
+            self._track_ids = dict(data["track_ids"])
+            self._failures = {
+                key: (float(expires), str(error))
+                for key, (expires, error) in data["failures"].items()
+            }
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error("Ignoring unreadable URL cache %s: %s", self.path, e)
+        logger.info(
+            "Loaded URL cache with %s track(s) and %s recent failure(s)",
+            len(self._track_ids), len(self._failures))
@@ -0,0 +1,7 @@
+# pylint: skip-file
+# makes the flat modules in src/ importable the same way chester.py sees them
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
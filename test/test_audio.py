@@ -0,0 +1,147 @@
+# pylint: skip-file
+
+import subprocess
+
+import pytest
+
+pytest.importorskip("discord")
+
+from audio import (
+    OGG_PAGE_HEADER,
+    AudioSourceTracked,
+    OggOpusSource,
+    PacketSource,
+    build_seek_index,
+    ingest_audio,
+    load_opus_packets,
+    load_seek_index,
+    normalisation_gain,
+    parse_timestamp,
+    seconds_to_frames,
+)
+
+
+def ogg_page(packets, flags=0):
+    segments = bytearray()
+    for packet in packets:
+        segments += b"\xff" * (len(packet) // 255) + bytes([len(packet) % 255])
+    header = OGG_PAGE_HEADER.pack(b"OggS", 0, flags, 0, 1, 0, 0, len(segments))
+    return header + bytes(segments) + b"".join(packets)
+
+
+def write_ogg(path, packet_count, per_page=7):
+    packets = [f"frame{i:04d}".encode() * 30 for i in range(packet_count)]
+    data = ogg_page([b"OpusHead" + b"\0" * 11]) + ogg_page([b"OpusTags" + b"\0" * 8])
+    for i in range(0, packet_count, per_page):
+        data += ogg_page(packets[i:i + per_page])
+    path.write_bytes(data)
+    return packets
+
+
+def test_parse_timestamp():
+    assert parse_timestamp("83") == 83
+    assert parse_timestamp("1:23.5") == 83.5
+    assert parse_timestamp("1:02:03") == 3723
+    assert seconds_to_frames(1.23) == 61
+    for bad in ["", "1::2", "a", "-3", "1:2:3:4"]:
+        with pytest.raises(ValueError):
+            parse_timestamp(bad)
+
+
+@pytest.mark.parametrize("start_frame", [0, 1, 6, 7, 8, 30, 49])
+def test_seek_lands_on_exact_frame(tmp_path, start_frame):
+    packets = write_ogg(tmp_path / "t.opus", 50)
+    build_seek_index(str(tmp_path / "t.opus"), str(tmp_path / "t.seek"))
+    index = load_seek_index(str(tmp_path / "t.seek"))
+    assert index[0][:3] == [0, 7, 14]
+
+    for seek_index in (index, None):
+        source = OggOpusSource(str(tmp_path / "t.opus"), start_frame, seek_index)
+        assert source.read() == packets[start_frame]
+        source.cleanup()
+
+
+def test_tracked_position_counts_frames():
+    source = AudioSourceTracked(PacketSource([b"a", b"b", b"c"], start_frame=1), start_frame=1)
+    assert source.is_opus()
+    while source.read():
+        pass
+    assert source.position == 3
+
+
+def test_replaced_sources_are_cleaned_up_by_the_next_read(tmp_path):
+    write_ogg(tmp_path / "t.opus", 10)
+    old = OggOpusSource(str(tmp_path / "t.opus"))
+    new = AudioSourceTracked(PacketSource([b"a"]))
+    new.replace(old)
+    assert old.read()
+    assert new.read() == b"a"
+    # a read still running on the old source when it was swapped out ends cleanly
+    assert old.read() == b""
+
+    never_read = OggOpusSource(str(tmp_path / "t.opus"))
+    swapped = AudioSourceTracked(PacketSource([]))
+    swapped.replace(never_read)
+    swapped.cleanup()
+    assert never_read.read() == b""
+
+
+def test_normalisation_gain_respects_peak_ceiling():
+    assert normalisation_gain(-20.0, -10.0) == 6.0
+    assert normalisation_gain(-20.0, -3.0) == 2.0
+    assert normalisation_gain(-8.0, 0.5) == -6.0
+    assert normalisation_gain(float("-inf"), -3.0) == 0.0
+
+
+def test_frame_timer_records_lateness_against_20ms_clock(monkeypatch):
+    clock = iter([0.0, 0.02, 0.05, 5.0])
+    monkeypatch.setattr("audio.time.perf_counter", lambda: next(clock))
+    observed = []
+    source = AudioSourceTracked(PacketSource([b"a", b"b", b"c", b"d"]))
+    source.frame_timer = type("Timer", (), {"observe": lambda self, v: observed.append(v)})()
+    for _ in range(4):
+        source.read()
+    # on time, on time, 10ms late, then a long stall restarts the clock
+    assert observed == pytest.approx([0.0, 0.0, 0.01, 0.0])
+
+
+LOUDNORM_REPORT = b"""[Parsed_loudnorm_0 @ 0x0]
+{
+    "input_i" : "-20.00",
+    "input_tp" : "-8.00"
+}
+"""
+
+
+def test_ingest_writes_normalised_rendition_and_seek_index(tmp_path, monkeypatch):
+    commands = []
+    packets = []
+
+    def run(command, **kwargs):
+        commands.append(command)
+        if "libopus" in command:
+            packets.extend(write_ogg(tmp_path / command[-1].rsplit("/", 1)[-1], 20))
+        return subprocess.CompletedProcess(command, 0, b"", LOUDNORM_REPORT)
+    monkeypatch.setattr("audio.subprocess.run", run)
+    opus, seek = tmp_path / "t.opus", tmp_path / "t.seek"
+
+    result = ingest_audio(str(tmp_path / "t.m4a"), str(opus), str(seek))
+    assert result.errors == []
+    assert result.metadata == {"loudness_lufs": -20.0, "true_peak_dbtp": -8.0, "gain_db": 6.0}
+    assert "volume=6.0dB" in commands[1]
+    assert commands[1][-1].endswith(".part") and not (tmp_path / "t.opus.part").exists()
+    assert load_opus_packets(str(opus)) == packets
+    assert load_seek_index(str(seek))[0][:3] == [0, 7, 14]
+
+
+def test_ingest_reports_failures_without_raising(tmp_path, monkeypatch):
+    def run(command, **kwargs):
+        (tmp_path / "t.opus.part").write_bytes(b"half")
+        raise subprocess.CalledProcessError(1, command, stderr=b"no such file")
+    monkeypatch.setattr("audio.subprocess.run", run)
+
+    result = ingest_audio(
+        str(tmp_path / "t.m4a"), str(tmp_path / "t.opus"), str(tmp_path / "t.seek"))
+    assert result.metadata == {}
+    assert len(result.errors) == 2 and "no such file" in result.errors[1]
+    assert not (tmp_path / "t.opus").exists() and not (tmp_path / "t.opus.part").exists()
@@ -0,0 +1,61 @@
+# pylint: skip-file
+
+import asyncio
+import json
+import os
+
+from breakstore import DEFAULT_SCOPE, BreakRegistry
+
+
+def test_writes_are_debounced_and_atomic(tmp_path, monkeypatch):
+    path = tmp_path / "break.json"
+    registry = BreakRegistry(str(path), write_delay=0.05)
+    writes = []
+    original = registry._write
+    monkeypatch.setattr(registry, "_write", lambda *a: writes.append(a) or original(*a))
+
+    async def run():
+        registry.register("1", "alice", "aaaaaaaaaaa")
+        registry.register("1", "bob", "bbbbbbbbbbb")
+        registry.register("2", "alice", "ccccccccccc")
+        assert not path.exists()
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert len(writes) == 1
+    assert json.loads(path.read_text()) == {
+        "1": {"alice": "aaaaaaaaaaa", "bob": "bbbbbbbbbbb"},
+        "2": {"alice": "ccccccccccc"},
+    }
+    assert os.listdir(tmp_path) == ["break.json"]
+
+
+def test_flush_writes_immediately(tmp_path):
+    path = tmp_path / "break.json"
+    registry = BreakRegistry(str(path), write_delay=60)
+
+    async def run():
+        registry.register("1", "alice", "aaaaaaaaaaa")
+        await registry.flush()
+
+    asyncio.run(run())
+    assert BreakRegistry(str(path)).get("1", "alice") == "aaaaaaaaaaa"
+
+
+def test_legacy_flat_record_becomes_default_scope(tmp_path):
+    path = tmp_path / "break.json"
+    path.write_text(json.dumps({"alice": "aaaaaaaaaaa"}))
+    registry = BreakRegistry(str(path))
+    assert registry.get("any guild", "alice") == "aaaaaaaaaaa"
+    assert registry.get(DEFAULT_SCOPE, "bob") is None
+    assert registry.track_ids() == {"aaaaaaaaaaa"}
+
+
+def test_corrupt_record_is_moved_aside(tmp_path):
+    path = tmp_path / "break.json"
+    for corrupt in ('{"alice": ', "[]"):
+        path.write_text(corrupt)
+        registry = BreakRegistry(str(path))
+        assert registry.track_ids() == set()
+        assert not path.exists()
+        assert (tmp_path / "break.json.corrupt").read_text() == corrupt
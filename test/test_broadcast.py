@@ -0,0 +1,80 @@
+# pylint: skip-file
+
+import pytest
+
+discord = pytest.importorskip("discord")
+
+from broadcast import BroadcastHub
+
+
+class CountingSource(discord.AudioSource):
+    def __init__(self, track_id, start_frame, length=20):
+        self.position = start_frame
+        self.length = length
+        self.reads = 0
+        self.closed = False
+
+    def read(self):
+        if self.position >= self.length:
+            return b""
+        self.reads += 1
+        self.position += 1
+        return bytes([self.position - 1])
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        self.closed = True
+
+
+@pytest.fixture
+def opened():
+    return []
+
+
+@pytest.fixture
+def hub(opened):
+    def _open(track_id, start_frame):
+        opened.append(CountingSource(track_id, start_frame))
+        return opened[-1]
+    return BroadcastHub(_open, window=5)
+
+
+def test_listeners_in_the_same_window_share_one_decoder(hub, opened):
+    first = hub.subscribe("track", 0)
+    assert [first.read() for _ in range(3)] == [b"\0", b"\1", b"\2"]
+    second = hub.subscribe("track", 1)
+    assert [second.read() for _ in range(4)] == [b"\1", b"\2", b"\3", b"\4"]
+    assert first.read() == b"\3"
+    assert len(opened) == 1 and opened[0].reads == 5
+    assert hub.stats() == {"streams": 1, "listeners": 2}
+
+    # a start point outside every window gets its own decoder
+    third = hub.subscribe("track", 15)
+    assert third.read() == bytes([15]) and len(opened) == 2
+
+    for source in (first, second, third):
+        source.cleanup()
+    assert all(source.closed for source in opened)
+    assert hub.stats() == {"streams": 0, "listeners": 0}
+    # a read racing the cleanup from the audio player thread just ends the source
+    assert first.read() == b""
+
+
+def test_listener_that_falls_out_of_the_window_continues_alone(hub, opened):
+    leader = hub.subscribe("track", 0)
+    paused = hub.subscribe("track", 0)
+    assert paused.read() == b"\0"
+    for _ in range(10):
+        leader.read()
+    assert paused.read() == b"\1"
+    assert len(opened) == 2 and opened[1].position == 2
+    assert hub.stats() == {"streams": 2, "listeners": 2}
+
+
+def test_finished_streams_are_not_joined(hub, opened):
+    source = hub.subscribe("track", 18)
+    assert [source.read() for _ in range(3)] == [bytes([18]), bytes([19]), b""]
+    assert hub.subscribe("track", 19).read() == bytes([19])
+    assert len(opened) == 2
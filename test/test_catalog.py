@@ -0,0 +1,67 @@
+# pylint: skip-file
+
+import pytest
+
+from catalog import Track, TrackCatalog
+
+
+def track(track_id, channel="chan", upload_date="20240101", title=None):
+    return Track(track_id, title or f"title {track_id}", channel, upload_date, "3:00")
+
+
+def test_lookup_and_iteration_order():
+    catalog = TrackCatalog([track("a"), track("b"), track("c")])
+    assert len(catalog) == 3
+    assert "b" in catalog and "z" not in catalog
+    assert catalog.get("b").title == "title b"
+    assert catalog.get("z") is None
+    assert [t.id for t in catalog] == ["a", "b", "c"]
+
+
+def test_secondary_indexes_follow_add_and_remove():
+    catalog = TrackCatalog([
+        track("a", "one", "20240301"),
+        track("b", "two", "20240101"),
+        track("c", "one", "20240201"),
+    ])
+    assert [t.id for t in catalog.by_channel("one")] == ["a", "c"]
+    assert [t.id for t in catalog.uploaded_between("20240101", "20240201")] == ["b", "c"]
+
+    catalog.add(track("a", "two", "20231231", title="moved"))
+    assert [t.id for t in catalog.by_channel("one")] == ["c"]
+    assert [t.id for t in catalog.by_channel("two")] == ["b", "a"]
+    assert [t.id for t in catalog.uploaded_between("00000000", "99999999")] == ["a", "b", "c"]
+
+    catalog.remove("c")
+    assert catalog.channels() == ["two"]
+    with pytest.raises(KeyError):
+        catalog.remove("c")
+
+
+def test_track_has_no_instance_dict():
+    with pytest.raises(AttributeError):
+        track("a").__dict__
+
+
+def test_duration_index_and_version():
+    catalog = TrackCatalog()
+    assert catalog.version == 0
+    catalog.add(Track("a", "t", "c", "20240101", "1:02:03"))
+    catalog.add(Track("b", "t", "c", "20240101", "45"))
+    catalog.add(Track("c", "t", "c", "20240101", "LIVE"))
+    assert catalog.version == 3
+    assert catalog.get("a").duration == 3723
+    assert [t.id for t in catalog.duration_between(0, 60)] == ["c", "b"]
+    assert [t.id for t in catalog.slice(1, 5)] == ["b", "c"]
+    catalog.remove("b")
+    catalog.add(Track("a", "t", "c", "20240101", "1:00"))
+    assert [t.id for t in catalog.slice(0, 5)] == ["c", "a"]
+
+
+def test_search_follows_catalog_changes():
+    catalog = TrackCatalog([track("a", "Lofi Girl", title="beats to relax to")])
+    assert [t.id for t in catalog.search("lofi beats")] == ["a"]
+    catalog.add(track("b", title="relaxing rain sounds"))
+    assert catalog.search("rain sound")[0].id == "b"
+    catalog.remove("a")
+    assert catalog.search("lofi beats") == []
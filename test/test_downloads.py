@@ -0,0 +1,162 @@
+# pylint: skip-file
+
+import asyncio
+import threading
+import time
+
+from downloads import BatchProgress, DownloadQueue, is_playlist_url, video_key_from_url
+
+
+def test_video_key_from_url():
+    assert video_key_from_url("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=3") == "dQw4w9WgXcQ"
+    assert video_key_from_url("https://youtu.be/dQw4w9WgXcQ?si=abc") == "dQw4w9WgXcQ"
+    assert video_key_from_url("https://youtube.com/shorts/dQw4w9WgXcQ") == "dQw4w9WgXcQ"
+    assert video_key_from_url(" https://example.com/a ") == "https://example.com/a"
+
+
+def test_is_playlist_url():
+    assert is_playlist_url("https://www.youtube.com/playlist?list=PL0123abc")
+    assert not is_playlist_url("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL0123abc")
+    assert not is_playlist_url("https://youtu.be/dQw4w9WgXcQ")
+
+
+def test_duplicate_requests_are_merged():
+    calls = []
+
+    def fake_download(url, hook):
+        calls.append(url)
+        time.sleep(0.05)
+        return "dQw4w9WgXcQ"
+
+    async def run():
+        queue = DownloadQueue(fake_download, max_concurrent=2)
+        results = await asyncio.gather(
+            queue.download("https://youtu.be/dQw4w9WgXcQ"),
+            queue.download("https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+        )
+        queue.shutdown()
+        return results
+
+    assert asyncio.run(run()) == ["dQw4w9WgXcQ", "dQw4w9WgXcQ"]
+    assert len(calls) == 1
+
+
+def test_concurrency_is_bounded_and_loop_stays_free():
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fake_download(url, hook):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        hook({"status": "finished"})
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return url[-11:]
+
+    async def run():
+        queue = DownloadQueue(fake_download, max_concurrent=2)
+        updates = []
+
+        async def listener(text):
+            updates.append(text)
+
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while queue.pending:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        urls = [f"https://youtu.be/{i:011d}" for i in range(5)]
+        tasks = [asyncio.create_task(queue.download(u, listener)) for u in urls]
+        await asyncio.sleep(0)
+        await ticker()
+        await asyncio.gather(*tasks)
+        queue.shutdown()
+        return updates, ticks
+
+    updates, ticks = asyncio.run(run())
+    assert peak == 2
+    assert ticks > 5
+    assert "Download finished" in updates
+
+
+def test_postprocess_runs_before_download_completes():
+    order = []
+
+    def fake_download(url, hook):
+        order.append("download")
+        return url[-11:]
+
+    async def postprocess(track_id):
+        await asyncio.sleep(0.01)
+        order.append(f"ingest {track_id}")
+
+    async def run():
+        queue = DownloadQueue(fake_download, postprocess_func=postprocess)
+        result = await queue.download("https://youtu.be/dQw4w9WgXcQ")
+        queue.shutdown()
+        return result
+
+    assert asyncio.run(run()) == "dQw4w9WgXcQ"
+    assert order == ["download", "ingest dQw4w9WgXcQ"]
+
+
+def test_batch_progress_aggregates_into_one_line():
+    sent = []
+
+    async def send(text):
+        sent.append(text)
+
+    async def run():
+        progress = BatchProgress(["a", "b", "c"], send, interval=0)
+        await progress.listener("a")("Downloading: 50%")
+        await progress.listener("b")("Queued behind 2 other download(s)")
+        await progress.finish("c", succeeded=False)
+        await progress.finish("a", succeeded=True)
+        await progress.finish("b", succeeded=True)
+
+    asyncio.run(run())
+    assert sent[0] == "0/3 finished, in progress: Downloading: 50%"
+    assert "1/3 finished, 1 failed, in progress: Downloading: 50%" in sent
+    assert sent[-1] == "3/3 finished, 1 failed"
+
+
+def test_url_cache_answers_known_tracks_and_recent_failures(tmp_path):
+    from urlcache import UrlCache
+    calls = []
+
+    def fake_download(url, hook):
+        calls.append(url)
+        if "gone" in url:
+            raise RuntimeError("HTTP Error 404")
+        return "dQw4w9WgXcQ"
+
+    async def run():
+        queue = DownloadQueue(
+            fake_download,
+            url_cache=UrlCache(str(tmp_path / "urls.json")),
+            available_func=lambda track_id: track_id == "aaaaaaaaaaa")
+        updates = []
+
+        async def listener(text):
+            updates.append(text)
+
+        assert await queue.download("https://youtu.be/aaaaaaaaaaa?si=x", listener) == "aaaaaaaaaaa"
+        assert updates == ["Already in the library"]
+        assert await queue.download("https://youtu.be/dQw4w9WgXcQ") == "dQw4w9WgXcQ"
+        for _ in range(2):
+            try:
+                await queue.download("https://example.com/gone")
+            except RuntimeError as e:
+                error = str(e)
+        queue.shutdown()
+        return error
+
+    assert asyncio.run(run()) == "Failed recently, try again later: HTTP Error 404"
+    assert calls == ["https://youtu.be/dQw4w9WgXcQ", "https://example.com/gone"]
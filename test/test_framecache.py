@@ -0,0 +1,44 @@
+# pylint: skip-file
+
+import pytest
+
+from framecache import FrameCache, frames_size
+
+
+def frames(n, size=100):
+    return [b"\0" * size] * n
+
+
+def test_hits_misses_and_lru_eviction():
+    one_track = frames_size(frames(10))
+    cache = FrameCache(budget_bytes=2 * one_track)
+    assert cache.get("a") is None
+    cache.put("a", frames(10))
+    cache.put("b", frames(10))
+    assert cache.get("a") is not None  # "a" is now most recently used
+    cache.put("c", frames(10))         # evicts "b"
+    assert "b" not in cache and "a" in cache and "c" in cache
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 1, 1)
+    assert stats["bytes"] == 2 * one_track
+
+
+def test_oversized_track_is_returned_but_not_cached():
+    cache = FrameCache(budget_bytes=10)
+    assert cache.put("a", frames(1)) == tuple(frames(1))
+    assert len(cache) == 0 and cache.current_bytes == 0
+
+
+def test_get_or_load_only_loads_once():
+    cache = FrameCache(budget_bytes=1 << 20)
+    loads = []
+    loader = lambda: loads.append(1) or frames(3)
+    first = cache.get_or_load("a", loader)
+    second = cache.get_or_load("a", loader)
+    assert first is second
+    assert len(loads) == 1
+
+
+def test_negative_budget_rejected():
+    with pytest.raises(ValueError):
+        FrameCache(-1)
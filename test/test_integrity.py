@@ -0,0 +1,88 @@
+# pylint: skip-file
+
+import json
+
+import pytest
+
+import integrity
+from integrity import LibraryScanner
+
+
+def make_track(root, track_id, audio=b"audio", duration="3:00"):
+    (root / "metadata" / f"{track_id}.json").write_text(
+        json.dumps({"id": track_id, "duration_string": duration}))
+    if audio is not None:
+        (root / "audio" / f"{track_id}.m4a").write_bytes(audio)
+
+
+@pytest.fixture
+def library(tmp_path):
+    for directory in ("metadata", "audio", "config"):
+        (tmp_path / directory).mkdir()
+    return tmp_path
+
+
+def make_scanner(root, probe=None):
+    scanner = LibraryScanner(
+        str(root / "metadata"), str(root / "audio"),
+        str(root / "config" / "manifest.json"), str(root / "quarantine"), workers=2)
+    scanner.can_probe = probe is not None
+    return scanner
+
+
+def test_scan_finds_problems_and_checks_only_changed_files(library, monkeypatch):
+    make_track(library, "good")
+    make_track(library, "short")
+    make_track(library, "nofile", audio=None)
+    make_track(library, "empty", audio=b"")
+    (library / "audio" / "orphan.m4a").write_bytes(b"x")
+    (library / "metadata" / "broken.json").write_text("{")
+    probed = []
+    monkeypatch.setattr(
+        integrity, "probe_duration",
+        lambda path: probed.append(path) or (60.0 if "short" in path else 180.0))
+    scanner = make_scanner(library, probe=True)
+
+    report = scanner.scan()
+    reasons = {(p.track_id, p.reason.split(" (")[0]) for p in report.problems}
+    assert reasons == {
+        ("short", "truncated audio"),
+        ("nofile", "metadata has no audio file"),
+        ("empty", "empty audio file"),
+        ("orphan", "orphaned audio"),
+        ("broken", "invalid metadata"),
+    }
+    assert report.quarantined == []
+    manifest = json.loads((library / "config" / "manifest.json").read_text())
+    assert list(manifest) == [str(library / "audio" / "good.m4a")]
+    assert len(manifest[str(library / "audio" / "good.m4a")]["sha256"]) == 64
+
+    probed.clear()
+    report = scanner.scan()
+    assert report.unchanged == 1
+    assert all("good" not in path for path in probed)
+
+
+def test_repair_quarantines_broken_tracks(library):
+    make_track(library, "good")
+    make_track(library, "empty", audio=b"")
+    (library / "audio" / "good.opus").write_bytes(b"")
+    (library / "audio" / "good.seek").write_bytes(b"index")
+    report = make_scanner(library).scan(repair=True)
+    quarantine = library / "quarantine"
+    assert sorted(p.name for p in quarantine.iterdir()) == [
+        "empty.json", "empty.m4a", "good.opus", "good.seek"]
+    assert (library / "audio" / "good.m4a").exists()
+    assert len(report.quarantined) == 4
+    assert "Moved 4 file(s) to quarantine." in report.summary()
+
+
+def test_repair_leaves_tracks_being_downloaded_alone(library):
+    # yt-dlp writes the metadata before the audio
+    make_track(library, "downloading", audio=None)
+    (library / "audio" / "downloading.opus").write_bytes(b"partial")
+    make_track(library, "nofile", audio=None)
+    report = make_scanner(library).scan(repair=True, busy={"downloading"})
+    assert {p.track_id for p in report.problems} == {"nofile"}
+    assert (library / "metadata" / "downloading.json").exists()
+    assert (library / "audio" / "downloading.opus").exists()
@@ -0,0 +1,95 @@
+# pylint: skip-file
+
+import json
+import os
+
+import pytest
+
+from libraryindex import LibraryIndex
+
+
+def make_track(tmp_path, track_id, title="title"):
+    (tmp_path / "metadata" / f"{track_id}.json").write_text(json.dumps({
+        "id": track_id,
+        "title": title,
+        "channel": "channel",
+        "upload_date": "20240101",
+        "duration_string": "3:00",
+    }))
+    (tmp_path / "audio" / f"{track_id}.m4a").write_bytes(b"\0" * 16)
+
+
+@pytest.fixture
+def index(tmp_path):
+    (tmp_path / "metadata").mkdir()
+    (tmp_path / "audio").mkdir()
+    idx = LibraryIndex(
+        str(tmp_path / "index.sqlite3"),
+        str(tmp_path / "metadata"),
+        lambda track_id: str(tmp_path / "audio" / f"{track_id}.m4a"))
+    yield idx
+    idx.close()
+
+
+def test_refresh_only_reparses_changed_files(tmp_path, index, monkeypatch):
+    make_track(tmp_path, "aaaaaaaaaaa")
+    make_track(tmp_path, "bbbbbbbbbbb")
+    assert {t["id"] for t in index.refresh()} == {"aaaaaaaaaaa", "bbbbbbbbbbb"}
+
+    parsed = []
+    original = index._parse_track
+    monkeypatch.setattr(index, "_parse_track", lambda i, s: parsed.append(i) or original(i, s))
+    make_track(tmp_path, "bbbbbbbbbbb", title="retitled")
+    os.utime(tmp_path / "metadata" / "bbbbbbbbbbb.json", ns=(1, 1))
+    os.remove(tmp_path / "metadata" / "aaaaaaaaaaa.json")
+
+    tracks = index.refresh()
+    assert parsed == ["bbbbbbbbbbb"]
+    assert tracks == [{
+        "id": "bbbbbbbbbbb",
+        "title": "retitled",
+        "channel": "channel",
+        "upload_date": "20240101",
+        "duration_string": "3:00",
+        "loudness_lufs": None,
+        "true_peak_dbtp": None,
+        "gain_db": None,
+    }]
+
+
+def test_refresh_skips_tracks_without_audio_or_valid_metadata(tmp_path, index):
+    make_track(tmp_path, "aaaaaaaaaaa")
+    make_track(tmp_path, "bbbbbbbbbbb")
+    make_track(tmp_path, "ccccccccccc")
+    os.remove(tmp_path / "audio" / "aaaaaaaaaaa.m4a")
+    (tmp_path / "metadata" / "ccccccccccc.json").write_text("{truncated")
+    assert [t["id"] for t in index.refresh()] == ["bbbbbbbbbbb"]
+    assert index.skipped == {"aaaaaaaaaaa": "missing audio", "ccccccccccc": "invalid metadata"}
+    with pytest.raises(FileNotFoundError):
+        index.update_track("aaaaaaaaaaa")
+
+
+def test_update_track_is_persisted(tmp_path, index):
+    make_track(tmp_path, "aaaaaaaaaaa")
+    assert index.update_track("aaaaaaaaaaa")["title"] == "title"
+    reopened = LibraryIndex(index.index_path, index.metadata_dir, index.audio_path_func)
+    assert [t["id"] for t in reopened.tracks()] == ["aaaaaaaaaaa"]
+    reopened.close()
+
+
+def test_update_tracks_indexes_a_batch(tmp_path, index):
+    for track_id in ("aaaaaaaaaaa", "bbbbbbbbbbb"):
+        make_track(tmp_path, track_id)
+    updated = index.update_tracks(["aaaaaaaaaaa", "bbbbbbbbbbb"])
+    assert [t["id"] for t in updated] == ["aaaaaaaaaaa", "bbbbbbbbbbb"]
+    assert [t["id"] for t in index.tracks()] == ["aaaaaaaaaaa", "bbbbbbbbbbb"]
+
+
+def test_optional_columns_are_indexed(tmp_path, index):
+    make_track(tmp_path, "aaaaaaaaaaa")
+    path = tmp_path / "metadata" / "aaaaaaaaaaa.json"
+    metadata = json.loads(path.read_text())
+    path.write_text(json.dumps(
+        dict(metadata, loudness_lufs=-20.5, true_peak_dbtp=-3.0, gain_db=2.0)))
+    assert index.update_track("aaaaaaaaaaa")["gain_db"] == 2.0
+    assert index.tracks()[0]["loudness_lufs"] == -20.5
@@ -0,0 +1,48 @@
+# pylint: skip-file
+
+import pytest
+
+pytest.importorskip("tabulate")
+
+from catalog import Track, TrackCatalog
+from librarypages import LibraryFilter, LibraryPages, parse_library_args
+
+
+def make_catalog(n):
+    return TrackCatalog(
+        Track(f"{i:011d}", f"title {i}" * 10, f"channel {i % 3}", "20240101", f"{i % 7}:00")
+        for i in range(n)
+    )
+
+
+def test_parse_library_args():
+    assert parse_library_args(()) == (LibraryFilter(), 0)
+    assert parse_library_args(("3", "channel=abc", "min=1:00", "max=4:30")) == (
+        LibraryFilter("abc", 60, 270), 2)
+    for bad in [("0",), ("x",), ("min=abc",), ("colour=red",)]:
+        with pytest.raises(ValueError):
+            parse_library_args(bad)
+
+
+def test_pages_fit_in_a_discord_message_and_are_cached():
+    catalog = make_catalog(1000)
+    pages = LibraryPages(lambda s: s if len(s) <= 30 else s[:29] + "…")
+    assert pages.page_count(catalog, LibraryFilter()) == 84
+    first = pages.render(catalog, LibraryFilter(), 0)
+    assert len(first) < 1900
+    assert "00000000000" in first and "00000000012" not in first
+    assert pages.render(catalog, LibraryFilter(), 0) is first
+    assert "00000000999" in pages.render(catalog, LibraryFilter(), 500)
+
+    catalog.remove("00000000000")
+    assert pages.render(catalog, LibraryFilter(), 0) is not first
+
+
+def test_filters_use_indexes():
+    catalog = make_catalog(30)
+    pages = LibraryPages(str)
+    both = LibraryFilter("CHANNEL 1", 60, 120)
+    table = pages.render(catalog, both, 0)
+    ids = [t.id for t in catalog if t.channel == "channel 1" and 60 <= t.duration <= 120]
+    assert ids and all(i in table for i in ids)
+    assert pages.page_count(catalog, LibraryFilter(longest=0)) == 1
@@ -0,0 +1,75 @@
+# pylint: skip-file
+
+import json
+import logging
+
+import pytest
+
+from logsetup import JsonFormatter, RateLimitFilter, parse_levels, setup_logging
+
+
+def make_record(msg, *args, level=logging.INFO, name="chester.test"):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def test_json_formatter_includes_extra_fields():
+    record = make_record("Playing %s", "abc")
+    record.guild = 9
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "Playing abc"
+    assert entry["level"] == "INFO" and entry["logger"] == "chester.test"
+    assert entry["guild"] == 9
+
+
+def test_rate_limit_drops_repeats_and_reports_suppressed(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("logsetup.time.monotonic", lambda: now[0])
+    limiter = RateLimitFilter(burst=2, window=10)
+    passed = [limiter.filter(make_record("Frame %s", i)) for i in range(5)]
+    assert passed == [True, True, False, False, False]
+    assert limiter.filter(make_record("Other message"))
+    assert limiter.filter(make_record("Frame %s", 9, level=logging.ERROR))
+    now[0] = 10.0
+    record = make_record("Frame %s", 10)
+    assert limiter.filter(record) and record.suppressed == 3
+
+
+def test_rate_limit_forgets_expired_windows(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("logsetup.time.monotonic", lambda: now[0])
+    limiter = RateLimitFilter(burst=2, window=10)
+    for i in range(100):
+        limiter.filter(make_record(f"Distinct message {i}"))
+    assert len(limiter._windows) == 100
+    now[0] = 10.0
+    assert limiter.filter(make_record("Later message"))
+    assert len(limiter._windows) == 1
+
+
+def test_parse_levels():
+    assert parse_levels("root=WARNING, chester.audio=debug") == {
+        "root": logging.WARNING, "chester.audio": logging.DEBUG}
+    with pytest.raises(ValueError):
+        parse_levels("chester=LOUD")
+
+
+def test_setup_logging_writes_json_lines_from_background_thread(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHESTER_LOG_LEVELS", "root=INFO,chester.quiet=ERROR")
+    root = logging.getLogger()
+    saved_handlers, saved_level = list(root.handlers), root.level
+    path = tmp_path / "logs" / "chester.log"
+    listener = setup_logging(str(path))
+    try:
+        logging.getLogger("chester.quiet").info("hidden")
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            logging.getLogger("chester.test").exception("Failed %s", "thing")
+    finally:
+        listener.stop()
+        root.handlers[:] = saved_handlers
+        root.setLevel(saved_level)
+        logging.getLogger("chester.quiet").setLevel(logging.NOTSET)
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [e["message"] for e in entries] == ["Failed thing"]
+    assert "RuntimeError: boom" in entries[0]["exception"]
@@ -0,0 +1,62 @@
+# pylint: skip-file
+
+import os
+import subprocess
+
+import pytest
+
+from metrics import Histogram, MetricsRegistry, child_process_stats, count_child_processes
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram(buckets=(0.01, 0.02, 0.04))
+    for value in (0.005, 0.015, 0.015, 0.03, 1.0):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1, 1]
+    assert histogram.count == 5
+    assert histogram.count_above(0.02) == 2
+    assert histogram.quantile(0.5) == pytest.approx(0.01 + 0.01 * 1.5 / 2)
+    assert histogram.quantile(1.0) == 0.04
+    assert Histogram().quantile(0.5) is None
+
+
+def test_render_prometheus_text_format():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", ("command",), buckets=(0.1,))
+    latency.labels('say "hi"').observe(0.05)
+    latency.labels('say "hi"').observe(0.5)
+    registry.counter("plays_total", "Plays").inc(3)
+    registry.gauge("sessions", "Sessions", ("guild",), function=lambda: {("1",): 2})
+    lines = registry.render_prometheus().splitlines()
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{command="say \\"hi\\"",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{command="say \\"hi\\"",le="+Inf"} 2' in lines
+    assert 'latency_seconds_count{command="say \\"hi\\""} 2' in lines
+    assert "plays_total 3.0" in lines
+    assert 'sessions{guild="1"} 2.0' in lines
+
+
+def test_registry_rejects_duplicates_and_bad_labels():
+    registry = MetricsRegistry()
+    family = registry.counter("events_total", "Events", ("kind",))
+    with pytest.raises(ValueError):
+        registry.gauge("events_total", "Again")
+    with pytest.raises(ValueError):
+        family.labels("a", "b")
+
+
+def test_count_child_processes_ignores_other_executables():
+    assert count_child_processes("definitely-not-running") in (0, None)
+
+
+def test_child_process_stats_sees_our_children():
+    if not os.path.isdir("/proc"):
+        pytest.skip("needs /proc")
+    child = subprocess.Popen(["sleep", "5"])
+    try:
+        stats = child_process_stats("sleep")
+        assert [fields[1] for fields in stats] == [str(os.getpid())]
+        assert count_child_processes("sleep") == 1
+    finally:
+        child.kill()
+        child.wait()
@@ -0,0 +1,307 @@
+# pylint: skip-file
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+discord = pytest.importorskip("discord")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dev"))
+
+from fakes import FakeBot, FakeContext, FakeGuild, FakeVoiceClient, make_library, write_ogg_opus
+from audio import build_seek_index, load_opus_packets, seconds_to_frames
+from librarypages import LibraryFilter
+from urlcache import UrlCache
+import musiccog
+
+TRACK_SECONDS = 1
+TRACK_FRAMES = seconds_to_frames(TRACK_SECONDS)
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    track_ids = make_library(str(tmp_path), 4, opus_seconds=TRACK_SECONDS)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CHESTER_METRICS_FILE", "")
+    monkeypatch.setenv("CHESTER_INGEST_WORKERS", "1")
+    # a one second track plays in 50ms
+    monkeypatch.setattr(FakeVoiceClient, "frame_seconds", 0.001)
+    return track_ids
+
+
+async def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+def run_cog(test):
+    """Runs an async test against a warmed-up cog and a context in one fake guild"""
+    async def _main():
+        bot = FakeBot(asyncio.get_running_loop())
+        cog = musiccog.MusicCog(bot)
+        await cog.warm_up()
+        guild = FakeGuild(bot, 1)
+        try:
+            await test(cog, FakeContext(guild, user_id=1))
+        finally:
+            cog.end_session(guild.id)
+            if guild.voice_client is not None:
+                await guild.voice_client.disconnect()
+            await cog.cog_unload()
+    asyncio.run(_main())
+
+
+def playing(cog, ctx):
+    session = cog.sessions.get(ctx.guild.id)
+    voice = ctx.voice_client
+    if session is None or session.saved_track is None or not voice.is_playing():
+        return None
+    return session.saved_track["track_id"]
+
+
+def idle(ctx):
+    return not ctx.voice_client.is_playing() and not ctx.voice_client.is_paused()
+
+
+def test_queued_evicted_track_plays_once_restored(library):
+    first, evicted = library[0], library[1]
+
+    async def test(cog, ctx):
+        cog.storage.budget_bytes = 1
+        assert cog.storage.enforce([evicted], pinned=set()) == [evicted]
+        cog.storage.budget_bytes = 0
+        restored = asyncio.Event()
+
+        async def download(url, on_progress=None):
+            await restored.wait()
+            audio_path = os.path.join("library/audio", evicted)
+            with open(audio_path + ".m4a", "wb") as file_handle:
+                file_handle.write(b"audio")
+            write_ogg_opus(audio_path + ".opus", TRACK_FRAMES)
+            build_seek_index(audio_path + ".opus", audio_path + ".seek")
+            return evicted
+        cog.downloads.download = download
+
+        await cog.cmd_play.callback(cog, ctx, first)
+        await cog.cmd_queue.callback(cog, ctx, evicted)
+        # the first track ends while the evicted one is still downloading
+        await wait_for(lambda: idle(ctx))
+        await asyncio.sleep(0.05)
+        assert idle(ctx) and cog.storage.is_evicted(evicted)
+
+        restored.set()
+        await wait_for(lambda: playing(cog, ctx) == evicted)
+        await wait_for(lambda: idle(ctx))
+        assert ctx.voice_client.frame_counts()[0] == 2 * TRACK_FRAMES
+
+    run_cog(test)
+
+
+def test_downloads_whose_files_disappeared_are_left_out(library):
+    async def test(cog, ctx):
+        for track_id in ("fresh", "quarantined"):
+            with open(f"library/metadata/{track_id}.json", "w", encoding="utf-8") as file_handle:
+                json.dump({"id": track_id, "title": track_id, "channel": "channel",
+                           "upload_date": "20240101", "duration_string": "0:01"}, file_handle)
+        with open("library/audio/fresh.m4a", "wb") as file_handle:
+            file_handle.write(b"audio")
+
+        cog.add_tracks_to_library(["fresh", "quarantined"])
+        assert "fresh" in cog.library
+        assert "quarantined" not in cog.library
+
+    run_cog(test)
+
+
+def record_plays(cog):
+    played = []
+    record_play = cog.storage.record_play
+    cog.storage.record_play = lambda track_id: played.append(track_id) or record_play(track_id)
+    return played
+
+
+def test_queue_advances_in_order(library):
+    async def test(cog, ctx):
+        played = record_plays(cog)
+        await cog.cmd_play.callback(cog, ctx, library[0])
+        for track_id in library[1:3]:
+            await cog.cmd_queue.callback(cog, ctx, track_id)
+        await wait_for(lambda: len(played) == 3 and idle(ctx))
+        assert played == library[:3]
+        assert ctx.voice_client.frame_counts()[0] == 3 * TRACK_FRAMES
+        assert cog.broadcasts.stats()["streams"] == 0
+
+    run_cog(test)
+
+
+def test_skip_and_play_over_a_running_track(library, monkeypatch):
+    # slow enough that the commands land while the first track is still playing
+    monkeypatch.setattr(FakeVoiceClient, "frame_seconds", 0.005)
+
+    async def test(cog, ctx):
+        played = record_plays(cog)
+        await cog.cmd_play.callback(cog, ctx, library[0])
+        await cog.cmd_queue.callback(cog, ctx, library[1])
+        await cog.cmd_skip.callback(cog, ctx)
+        await wait_for(lambda: playing(cog, ctx) == library[1])
+        # swapping the source keeps the player; the old source is closed by the player thread
+        await cog.cmd_play.callback(cog, ctx, library[2])
+        await wait_for(lambda: idle(ctx))
+        assert played == library[:3]
+        assert ctx.voice_client.frame_counts()[0] < 3 * TRACK_FRAMES
+        assert cog.broadcasts.stats()["streams"] == 0
+
+    run_cog(test)
+
+
+def test_clear_empties_the_queue(library):
+    async def test(cog, ctx):
+        played = record_plays(cog)
+        await cog.cmd_play.callback(cog, ctx, library[0])
+        for track_id in library[1:3]:
+            await cog.cmd_queue.callback(cog, ctx, track_id)
+        await cog.cmd_clear.callback(cog, ctx)
+        await wait_for(lambda: idle(ctx))
+        assert played == library[:1]
+        assert not cog.sessions[ctx.guild.id].queue
+
+    run_cog(test)
+
+
+def test_loop_replays_until_disabled(library):
+    async def test(cog, ctx):
+        played = record_plays(cog)
+        await cog.cmd_play.callback(cog, ctx, library[0])
+        await cog.cmd_loop.callback(cog, ctx)
+        await wait_for(lambda: ctx.voice_client.frame_counts()[0] > 2 * TRACK_FRAMES)
+        await cog.cmd_loop.callback(cog, ctx)
+        await wait_for(lambda: idle(ctx))
+        frames = ctx.voice_client.frame_counts()[0]
+        assert frames >= 3 * TRACK_FRAMES and frames % TRACK_FRAMES == 0
+        assert played == library[:1]
+
+    run_cog(test)
+
+
+def test_opus_renditions_play_without_ffmpeg(library, monkeypatch):
+    spawned = []
+    monkeypatch.setattr(
+        discord, "FFmpegPCMAudio", lambda path, options=None: spawned.append((path, options)))
+
+    async def test(cog, ctx):
+        source = cog.open_audio_source(library[0])
+        assert source.is_opus()
+        packets = []
+        while data := source.read():
+            packets.append(data)
+        source.cleanup()
+        assert packets == load_opus_packets(f"library/audio/{library[0]}.opus")
+        assert not spawned
+
+        # without a rendition the m4a is transcoded, with the track's gain applied
+        os.remove(f"library/audio/{library[1]}.opus")
+        cog.update_metadata(library[1], gain_db=-3.5)
+        cog.add_to_library(library[1])
+        cog.open_decoder(library[1], start_frame=50)
+        assert spawned == [(f"library/audio/{library[1]}.m4a", "-ss 1.000 -af volume=-3.5dB")]
+
+    run_cog(test)
+
+
+def test_hardreset_forgets_cached_urls(library):
+    async def test(cog, ctx):
+        url_cache = cog.downloads.url_cache
+        url_cache.remember("https://example.com/song", library[0])
+        url_cache.remember_failure("https://example.com/gone", "HTTP Error 404")
+        url_cache.save()
+
+        await cog.cmd_hardreset.callback(cog, ctx)
+        url_cache.save()
+        assert url_cache.track_id("https://example.com/song") is None
+        assert url_cache.failure("https://example.com/gone") is None
+        assert UrlCache(url_cache.path).track_id("https://example.com/song") is None
+        assert not cog.library
+
+    run_cog(test)
+
+
+def test_metrics_are_rendered_off_the_event_loop(library, tmp_path):
+    async def test(cog, ctx):
+        loop_thread = threading.get_ident()
+        rendered_in = []
+        render = cog.metrics.render_prometheus
+        cog.metrics.render_prometheus = (
+            lambda: rendered_in.append(threading.get_ident()) or render())
+        cog.metrics_path = str(tmp_path / "metrics.prom")
+
+        await cog.write_metrics()
+        await cog.cmd_stats.callback(cog, ctx)
+        assert rendered_in and loop_thread not in rendered_in
+        assert "chester_ffmpeg_processes" in (tmp_path / "metrics.prom").read_text()
+        assert "ffmpeg processes" in ctx.sent[-1]
+
+    run_cog(test)
+
+
+def test_tracks_that_left_the_library_are_skipped(library):
+    async def test(cog, ctx):
+        played = record_plays(cog)
+        await cog.cmd_play.callback(cog, ctx, library[0])
+        for track_id in library[1:3]:
+            await cog.cmd_queue.callback(cog, ctx, track_id)
+        # e.g. quarantined by >verify repair after it was queued
+        cog.library.remove(library[1])
+        await cog.cmd_queue.callback(cog, ctx)
+        assert "1. Synthetic track 2" in ctx.sent[-1] and "track 1" not in ctx.sent[-1]
+        await wait_for(lambda: len(played) == 2 and idle(ctx))
+        assert played == [library[0], library[2]]
+
+    run_cog(test)
+
+
+def test_hardreset_forgets_queued_tracks(library):
+    async def test(cog, ctx):
+        await cog.cmd_play.callback(cog, ctx, library[0])
+        await cog.cmd_queue.callback(cog, ctx, library[1])
+        await cog.cmd_hardreset.callback(cog, ctx)
+        session = cog.sessions[ctx.guild.id]
+        assert not session.queue and session.saved_track is None
+        await cog.cmd_queue.callback(cog, ctx)
+        assert "The queue is empty." in ctx.sent[-1]
+
+    run_cog(test)
+
+
+def test_one_shot_plays_do_not_count_as_frame_cache_misses(library):
+    async def test(cog, ctx):
+        cog.open_audio_source(library[0]).cleanup()
+        assert cog.frame_cache.stats()["misses"] == 0
+        cog.open_audio_source(library[0], cached=True).cleanup()
+        cog.open_audio_source(library[0]).cleanup()
+        stats = cog.frame_cache.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    run_cog(test)
+
+
+def test_only_the_author_can_page_a_library_listing(library):
+    async def test(cog, ctx):
+        view = musiccog.LibraryView(cog, ctx.author, LibraryFilter(), 0)
+        author = MagicMock()
+        author.user.id = ctx.author.id
+        assert await view.interaction_check(author)
+        other = MagicMock()
+        other.user.id = ctx.author.id + 1
+        other.response.send_message = AsyncMock()
+        assert not await view.interaction_check(other)
+        assert other.response.send_message.await_args.kwargs["ephemeral"]
+
+    run_cog(test)
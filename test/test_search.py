@@ -0,0 +1,44 @@
+# pylint: skip-file
+
+import random
+import string
+import time
+
+from search import TrigramIndex, trigrams
+
+
+def test_trigrams_ignore_case_accents_and_punctuation():
+    assert trigrams("Beyoncé!") == trigrams("beyonce")
+    assert trigrams("") == set()
+
+
+def test_ranking_prefers_closest_match_and_tolerates_typos():
+    index = TrigramIndex()
+    index.add("a", "Never Gonna Give You Up RickAstleyVEVO")
+    index.add("b", "Never Gonna Let You Down Some Channel")
+    index.add("c", "Completely Unrelated Lofi Mix")
+    assert [doc for doc, _ in index.query("never gona give")][0] == "a"
+    assert index.query("lofi")[0][0] == "c"
+    assert index.query("zzzzqqq") == []
+
+
+def test_incremental_updates():
+    index = TrigramIndex()
+    index.add("a", "first title")
+    index.add("a", "second title")
+    assert index.query("first") == []
+    assert index.query("second")[0][0] == "a"
+    index.remove("a")
+    assert len(index) == 0
+    assert index.query("second") == []
+
+
+def test_query_is_fast_on_large_index():
+    rng = random.Random(0)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(3000)]
+    index = TrigramIndex()
+    for i in range(20000):
+        index.add(str(i), " ".join(rng.choices(words, k=8)))
+    start = time.perf_counter()
+    index.query(" ".join(words[:3]))
+    assert time.perf_counter() - start < 0.5
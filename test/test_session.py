@@ -0,0 +1,41 @@
+# pylint: skip-file
+
+from unittest.mock import MagicMock
+
+from session import VoiceSession
+
+
+def test_take_prefetched_only_returns_matching_track():
+    session = VoiceSession(1)
+    source = MagicMock()
+    session.prefetched = ("a", source)
+    assert session.take_prefetched("b") is None
+    source.cleanup.assert_called_once()
+    assert session.prefetched is None
+
+    session.prefetched = ("a", source)
+    assert session.take_prefetched("a") is source
+    assert session.prefetched is None
+
+
+def test_close_releases_everything():
+    session = VoiceSession(1)
+    source = MagicMock()
+    session.break_mode, session.break_track = True, "b"
+    session.saved_track = {"track_id": "a", "frame": 10}
+    session.queue.extend(["c", "d"])
+    session.prefetched = ("c", source)
+    session.close()
+    assert not session.break_mode and session.break_track is None
+    assert session.saved_track is None and not session.queue
+    source.cleanup.assert_called_once()
+
+
+def test_idle_seconds_resets_on_touch(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("session.time.monotonic", lambda: now[0])
+    session = VoiceSession(1)
+    now[0] = 130.0
+    assert session.idle_seconds() == 30.0
+    session.touch()
+    assert session.idle_seconds() == 0.0
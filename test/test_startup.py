@@ -0,0 +1,25 @@
+# pylint: skip-file
+
+import logging
+
+from startup import StartupTimer, seconds_since_process_start
+
+
+def test_report_is_logged_once_all_milestones_are_reached(caplog):
+    timer = StartupTimer(milestones=("gateway ready", "library ready"))
+    with timer.phase("load musiccog"):
+        pass
+    with caplog.at_level(logging.INFO, logger="chester.startup"):
+        timer.mark("gateway ready")
+        assert not caplog.records
+        timer.mark("library ready")
+        timer.mark("library ready")
+    assert len(caplog.records) == 1
+    report = timer.report()
+    assert "gateway ready" in report and "load musiccog" in report
+    assert timer.milestones["gateway ready"] <= timer.milestones["library ready"]
+
+
+def test_process_age_is_positive_where_available():
+    age = seconds_since_process_start()
+    assert age is None or age >= 0
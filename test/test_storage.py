@@ -0,0 +1,95 @@
+# pylint: skip-file
+
+import json
+import os
+
+import pytest
+
+from integrity import LibraryScanner
+from libraryindex import LibraryIndex
+from storage import AudioStore
+
+
+def make_track(root, track_id, size, mtime):
+    (root / "metadata" / f"{track_id}.json").write_text(json.dumps({
+        "id": track_id,
+        "title": track_id,
+        "channel": "channel",
+        "upload_date": "20240101",
+        "duration_string": "3:00",
+    }))
+    for suffix in (".m4a", ".opus"):
+        path = root / "audio" / f"{track_id}{suffix}"
+        path.write_bytes(b"\0" * size)
+        os.utime(path, (mtime, mtime))
+
+
+def audio_paths(root):
+    return lambda track_id: [
+        str(root / "audio" / f"{track_id}{suffix}") for suffix in (".m4a", ".opus", ".seek")]
+
+
+@pytest.fixture
+def index(tmp_path):
+    (tmp_path / "metadata").mkdir()
+    (tmp_path / "audio").mkdir()
+    idx = LibraryIndex(
+        str(tmp_path / "index.sqlite3"), str(tmp_path / "metadata"),
+        lambda track_id: str(tmp_path / "audio" / f"{track_id}.m4a"))
+    yield idx
+    idx.close()
+
+
+def test_enforce_evicts_least_recently_used_unpinned_tracks(tmp_path, index):
+    for number, track_id in enumerate(("old", "pinned", "played", "new")):
+        make_track(tmp_path, track_id, 100, mtime=1000 + number)
+    store = AudioStore(index, audio_paths(tmp_path), budget_bytes=450)
+    store.record_play("played")
+
+    assert store.enforce(["old", "pinned", "played", "new"], pinned={"pinned"}) == ["old", "new"]
+    assert not (tmp_path / "audio" / "old.m4a").exists()
+    assert (tmp_path / "audio" / "pinned.opus").exists()
+    assert store.is_evicted("old") and not store.is_evicted("played")
+    assert store.enforce(["old", "pinned", "played", "new"], pinned=set()) == []
+
+    # evicted tracks keep their metadata in the catalog, and the state survives a restart
+    assert {t["id"] for t in index.refresh()} == {"old", "pinned", "played", "new"}
+    reopened = AudioStore(index, audio_paths(tmp_path), budget_bytes=450)
+    assert reopened.evicted_ids() == {"old", "new"}
+    assert "played" in index.storage_state()[0]
+
+
+def test_restored_tracks_are_no_longer_evicted(tmp_path, index):
+    make_track(tmp_path, "aaaaaaaaaaa", 100, mtime=1000)
+    store = AudioStore(index, audio_paths(tmp_path), budget_bytes=1)
+    assert store.enforce(["aaaaaaaaaaa"], pinned=set()) == ["aaaaaaaaaaa"]
+
+    scanner = LibraryScanner(
+        str(tmp_path / "metadata"), str(tmp_path / "audio"),
+        str(tmp_path / "manifest.json"), str(tmp_path / "quarantine"), workers=1)
+    scanner.can_probe = False
+    assert scanner.scan(evicted=store.evicted_ids()).problems == []
+
+    make_track(tmp_path, "aaaaaaaaaaa", 100, mtime=2000)
+    store.mark_restored(["aaaaaaaaaaa"])
+    assert index.storage_state()[1] == set()
+    os.remove(tmp_path / "audio" / "aaaaaaaaaaa.m4a")
+    index.refresh()
+    assert index.skipped == {"aaaaaaaaaaa": "missing audio"}
+
+
+def test_zero_budget_keeps_everything(tmp_path, index):
+    make_track(tmp_path, "aaaaaaaaaaa", 100, mtime=1000)
+    store = AudioStore(index, audio_paths(tmp_path), budget_bytes=0)
+    assert store.enforce(["aaaaaaaaaaa"], pinned=set()) == []
+
+
+def test_tracks_are_marked_evicted_before_their_files_go(tmp_path, index, monkeypatch):
+    make_track(tmp_path, "old", 100, mtime=1000)
+    store = AudioStore(index, audio_paths(tmp_path), budget_bytes=1)
+    seen = []
+    remove = os.remove
+    monkeypatch.setattr(
+        "storage.os.remove", lambda path: seen.append(store.is_evicted("old")) or remove(path))
+    assert store.enforce(["old"], pinned=set()) == ["old"]
+    assert seen and all(seen)
@@ -0,0 +1,36 @@
+# pylint: skip-file
+
+import json
+import time
+
+from urlcache import UrlCache, normalise_url
+
+
+def test_normalise_url():
+    watch = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    assert normalise_url("https://youtu.be/dQw4w9WgXcQ?si=abc&t=3") == watch
+    assert normalise_url("https://m.youtube.com/watch?feature=share&v=dQw4w9WgXcQ") == watch
+    assert normalise_url(" https://youtube.com/shorts/dQw4w9WgXcQ?pp=x ") == watch
+    assert (normalise_url("https://WWW.Example.com/a?b=2&utm_source=x&a=1#top")
+            == "https://example.com/a?a=1&b=2")
+    assert normalise_url("not a url") == "not a url"
+
+
+def test_cache_persists_ids_and_expires_failures(tmp_path):
+    path = str(tmp_path / "urls.json")
+    cache = UrlCache(path, failure_ttl=60)
+    assert cache.track_id("https://youtu.be/dQw4w9WgXcQ") == "dQw4w9WgXcQ"
+    cache.remember("https://example.com/song?utm_medium=chat", "example-song")
+    cache.remember_failure("https://example.com/gone", "HTTP Error 404")
+    cache.save()
+
+    reloaded = UrlCache(path, failure_ttl=60)
+    assert reloaded.track_id("https://www.example.com/song") == "example-song"
+    assert reloaded.failure("https://example.com/gone") == "HTTP Error 404"
+    reloaded.remember("https://example.com/gone", "back")
+    assert reloaded.failure("https://example.com/gone") is None
+
+    data = json.loads(open(path).read())
+    data["failures"]["https://example.com/gone"][0] = time.time() - 1
+    open(path, "w").write(json.dumps(data))
+    assert UrlCache(path).failure("https://example.com/gone") is None